@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Fake ExifTool - a stand-in executable for scale and latency testing
+
+Speaks enough of the ExifTool command line and ``-stay_open`` protocol for
+the app's bulk paths (reads, date/GPS writes, sanitise) without touching any
+files, so schedulers can be load-tested against 100k "files" that don't
+exist. Point the app at it with:
+
+    EXIFTOOL_CMD="python benchmarks/fake_exiftool.py"
+
+Behaviour is configured with environment variables:
+
+    FAKE_EXIFTOOL_STARTUP      Process start-up delay in seconds (default 0)
+    FAKE_EXIFTOOL_LATENCY      Per-file write latency distribution (default none)
+    FAKE_EXIFTOOL_READ_LATENCY Per-file read latency distribution (default none)
+    FAKE_EXIFTOOL_FAIL_RATE    Fraction of files that fail with an error (default 0)
+    FAKE_EXIFTOOL_CRASH_RATE   Probability that a command crashes the process (default 0)
+    FAKE_EXIFTOOL_MISSING_RATE Fraction of files with no date/GPS on read (default 0.2)
+    FAKE_EXIFTOOL_CHECK_FILES  If 1, report "File not found" for missing files
+    FAKE_EXIFTOOL_SEED         Random seed (default 0)
+
+Latency distributions are written as ``kind:params``:
+
+    none | fixed:S | uniform:LO,HI | exponential:MEAN | lognormal:MEDIAN,SIGMA
+
+Failures and missing tags are decided by hashing the file name with the
+seed, so the same files fail in every process and every run; latency and
+crashes are random.
+"""
+
+import hashlib
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import time
+from pathlib import Path
+
+
+VERSION = "12.70"
+
+
+def parse_distribution(spec):
+    """Return a function that samples a delay in seconds from a spec string."""
+    spec = (spec or 'none').strip()
+    kind, _, params = spec.partition(':')
+    values = [float(v) for v in params.split(',') if v.strip()]
+
+    if kind == 'none':
+        return lambda rng: 0.0
+    if kind == 'fixed':
+        return lambda rng: values[0]
+    if kind == 'uniform':
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == 'exponential':
+        return lambda rng: rng.expovariate(1.0 / values[0])
+    if kind == 'lognormal':
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class Settings:
+    def __init__(self, env=os.environ):
+        self.startup = float(env.get('FAKE_EXIFTOOL_STARTUP', 0))
+        self.write_latency = parse_distribution(env.get('FAKE_EXIFTOOL_LATENCY'))
+        self.read_latency = parse_distribution(env.get('FAKE_EXIFTOOL_READ_LATENCY'))
+        self.fail_rate = float(env.get('FAKE_EXIFTOOL_FAIL_RATE', 0))
+        self.crash_rate = float(env.get('FAKE_EXIFTOOL_CRASH_RATE', 0))
+        self.missing_rate = float(env.get('FAKE_EXIFTOOL_MISSING_RATE', 0.2))
+        self.check_files = env.get('FAKE_EXIFTOOL_CHECK_FILES') == '1'
+        self.seed = int(env.get('FAKE_EXIFTOOL_SEED', 0))
+        self.rng = random.Random(f"{self.seed}-{os.getpid()}-{time.time_ns()}")
+
+    def unit(self, name, salt):
+        """Deterministic number in [0, 1) for a file name."""
+        digest = hashlib.sha1(f"{self.seed}:{salt}:{name}".encode('utf-8')).digest()
+        return int.from_bytes(digest[:8], 'big') / 2 ** 64
+
+
+def fake_tags(settings, file_name):
+    """Deterministic tag values for a file."""
+    tags = {}
+    if settings.unit(file_name, 'date') >= settings.missing_rate:
+        offset = int(settings.unit(file_name, 'when') * 3 * 365 * 86400)
+        stamp = time.gmtime(1609459200 + offset)
+        value = time.strftime("%Y:%m:%d %H:%M:%S", stamp)
+        tags.update(DateTimeOriginal=value, CreateDate=value, ModifyDate=value)
+    if settings.unit(file_name, 'gps') >= settings.missing_rate:
+        lat = -45 + settings.unit(file_name, 'lat') * 35
+        lon = 110 + settings.unit(file_name, 'lon') * 45
+        tags.update(GPSLatitude=abs(lat), GPSLatitudeRef='S' if lat < 0 else 'N',
+                    GPSLongitude=abs(lon), GPSLongitudeRef='E' if lon >= 0 else 'W')
+    return tags
+
+
+# Options that take a value in the next argument
+VALUE_OPTIONS = {'-o', '-charset', '-tagsfromfile', '-d', '-p', '-api', '-ext', '-if', '-w'}
+
+
+def parse_command(args):
+    """Split an ExifTool argument list into options, reads, writes and files."""
+    parsed = {'reads': [], 'writes': [], 'files': [], 'echo': [], 'flags': set(),
+              'output': None}
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        lower = arg.lower()
+        if lower.startswith('-echo') and i + 1 < len(args):
+            parsed['echo'].append((lower[5:] or '1', args[i + 1]))
+            i += 2
+            continue
+        if lower == '-@' and i + 1 < len(args):
+            with open(args[i + 1], encoding='utf-8') as f:
+                args[i + 2:i + 2] = [line.rstrip('\r\n') for line in f if line.strip()]
+            i += 2
+            continue
+        if lower in VALUE_OPTIONS and i + 1 < len(args):
+            if lower == '-o':
+                parsed['output'] = args[i + 1]
+            i += 2
+            continue
+        if arg.startswith('-') and len(arg) > 1:
+            if '=' in arg or '<' in arg:
+                parsed['writes'].append(arg)
+            elif arg[1:].lower() in ('overwrite_original', 's3', 's', 'n', 'j', 'json', 'b',
+                                     'a', 'g1', 'g', 'struct', 'p', 'q', 'm', 'f', 'fast',
+                                     'fast2', 'ver'):
+                parsed['flags'].add(arg[1:].lower())
+            else:
+                parsed['reads'].append(arg[1:].split(':')[-1])
+        else:
+            parsed['files'].append(arg)
+        i += 1
+    return parsed
+
+
+def format_output_path(fmt, source):
+    """Expand the %d/%f/%e codes of an ``-o`` argument."""
+    path = Path(source)
+    directory = str(path.parent) + os.sep if str(path.parent) not in ('', '.') else ''
+    return (fmt.replace('%d', directory).replace('%f', path.stem)
+            .replace('%e', path.suffix.lstrip('.')))
+
+
+def run_command(settings, args, out, err):
+    """Execute one command, writing to the given streams. Returns exit status."""
+    parsed = parse_command(list(args))
+
+    for num, text in parsed['echo']:
+        if num in ('1', '2'):
+            (out if num == '1' else err).write(text + '\n')
+
+    if settings.rng.random() < settings.crash_rate:
+        out.flush()
+        err.write("Simulated crash\n")
+        err.flush()
+        os._exit(134)
+
+    status = 0
+    writing = bool(parsed['writes'])
+    results = []
+    updated = failed = 0
+
+    for file_name in parsed['files']:
+        time.sleep((settings.write_latency if writing else settings.read_latency)(settings.rng))
+
+        if settings.check_files and not os.path.exists(file_name):
+            err.write(f"Error: File not found - {file_name}\n")
+            failed += 1
+            status = 1
+            continue
+
+        if settings.unit(file_name, 'fail') < settings.fail_rate:
+            err.write(f"Error: Simulated failure - {file_name}\n")
+            failed += 1
+            status = 1
+            continue
+
+        if writing:
+            if parsed['output'] and os.path.exists(file_name):
+                shutil.copyfile(file_name, format_output_path(parsed['output'], file_name))
+            updated += 1
+            continue
+
+        tags = fake_tags(settings, os.path.basename(file_name))
+        wanted = {name: tags[name] for name in parsed['reads'] if name in tags}
+        if 'j' in parsed['flags'] or 'json' in parsed['flags']:
+            results.append(dict(SourceFile=file_name, **wanted))
+        elif 's3' in parsed['flags']:
+            for value in wanted.values():
+                out.write(f"{value}\n")
+        else:
+            for name, value in wanted.items():
+                out.write(f"{name:<32}: {value}\n")
+
+    if 'ver' in parsed['flags']:
+        out.write(VERSION + '\n')
+    elif writing:
+        out.write(f"    {updated} image files updated\n")
+        if failed:
+            out.write(f"    {failed} files weren't updated due to errors\n")
+    elif results:
+        out.write(json.dumps(results, indent=2) + '\n')
+
+    for num, text in parsed['echo']:
+        if num in ('3', '4'):
+            (out if num == '3' else err).write(text + '\n')
+
+    return status
+
+
+def stay_open(settings, common_args):
+    """Serve commands from stdin until ``-stay_open False``."""
+    args = []
+    while True:
+        line = sys.stdin.readline()
+        if not line:
+            break
+        line = line.rstrip('\r\n')
+        if not line:
+            continue
+        if line.lower().startswith('-execute'):
+            number = line[len('-execute'):]
+            run_command(settings, args + common_args, sys.stdout, sys.stderr)
+            sys.stdout.write(f"{{ready{number}}}\n")
+            sys.stdout.flush()
+            sys.stderr.flush()
+            args = []
+        elif line.lower() == '-stay_open':
+            continue
+        elif line.lower() == 'false' and args == []:
+            return 0
+        else:
+            args.append(line)
+    return 0
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    settings = Settings()
+    time.sleep(settings.startup)
+
+    lowered = [a.lower() for a in argv]
+    if '-stay_open' in lowered:
+        i = lowered.index('-stay_open')
+        if i + 1 < len(argv) and argv[i + 1].lower() in ('true', '1'):
+            common_args = []
+            if '-common_args' in lowered:
+                common_args = argv[lowered.index('-common_args') + 1:]
+            return stay_open(settings, common_args)
+
+    return run_command(settings, argv, sys.stdout, sys.stderr)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
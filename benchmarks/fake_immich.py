@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Fake Immich - a local stand-in server for testing Immich push mode
+
+Serves the few API endpoints push mode uses, over keep-alive HTTP/1.1, for
+an in-memory library built from a directory of files:
+
+    GET  /api/server/ping
+    POST /api/assets/bulk-upload-check   match by checksum
+    POST /api/search/metadata            match by originalPath
+    PUT  /api/assets                     bulk update dateTimeOriginal/lat/lon
+    GET  /stats                          request and connection counts, updates
+
+Run it and point the app at it:
+
+    python benchmarks/fake_immich.py --library /tmp/exif-corpus --server-root /photos
+    IMMICH_URL=http://127.0.0.1:2283 IMMICH_API_KEY=test IMMICH_PUSH=after python src/main.py
+
+Checksums are computed once at startup, so edits made afterwards still
+match the original assets (as they would in Immich until it rescans).
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+
+API_KEY = 'test'
+
+
+class Library:
+    """Assets keyed by id, with checksum and path indexes."""
+
+    def __init__(self, directory=None, server_root=None):
+        self.assets = {}
+        self.by_checksum = {}
+        self.by_path = {}
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.connections = 0
+        self.updated = Counter()
+        if directory:
+            self.add_directory(Path(directory), server_root)
+
+    def add_directory(self, directory, server_root=None):
+        for root, dirs, files in os.walk(directory):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            for name in files:
+                if name.startswith('.') or name.endswith('.json'):
+                    continue
+                path = Path(root) / name
+                digest = hashlib.sha1(path.read_bytes()).hexdigest()
+                if server_root:
+                    original_path = server_root.rstrip('/') + '/' + path.relative_to(directory).as_posix()
+                else:
+                    original_path = str(path)
+                self.add(original_path, digest)
+
+    def add(self, original_path, checksum):
+        asset_id = str(uuid.uuid4())
+        self.assets[asset_id] = {'id': asset_id, 'originalPath': original_path, 'checksum': checksum}
+        self.by_checksum[checksum] = asset_id
+        self.by_path[original_path] = asset_id
+        return asset_id
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; don't let Nagle hold the body
+    disable_nagle_algorithm = True
+    library = None
+    latency = 0.0
+
+    def setup(self):
+        super().setup()
+        with self.library.lock:
+            self.library.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return json.loads(self.rfile.read(length)) if length else {}
+
+    def _authorised(self):
+        if self.headers.get('x-api-key') != API_KEY:
+            self._send(401, {'message': 'Invalid API key'})
+            return False
+        return True
+
+    def _route(self, method):
+        library = self.library
+        with library.lock:
+            library.requests[f"{method} {self.path}"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        if method == 'GET' and self.path == '/stats':
+            with library.lock:
+                return self._send(200, {
+                    'requests': dict(library.requests),
+                    'connections': library.connections,
+                    'updated': dict(library.updated),
+                })
+        if method == 'GET' and self.path == '/api/server/ping':
+            return self._send(200, {'res': 'pong'})
+        if not self._authorised():
+            return
+
+        body = self._body()
+        if method == 'POST' and self.path == '/api/assets/bulk-upload-check':
+            results = []
+            for item in body.get('assets', []):
+                asset_id = library.by_checksum.get(item.get('checksum'))
+                if asset_id:
+                    results.append({'id': item['id'], 'action': 'reject',
+                                    'reason': 'duplicate', 'assetId': asset_id})
+                else:
+                    results.append({'id': item['id'], 'action': 'accept'})
+            return self._send(200, {'results': results})
+
+        if method == 'POST' and self.path == '/api/search/metadata':
+            asset_id = library.by_path.get(body.get('originalPath'))
+            items = [library.assets[asset_id]] if asset_id else []
+            return self._send(200, {'assets': {'total': len(items), 'count': len(items), 'items': items}})
+
+        if method == 'PUT' and self.path == '/api/assets':
+            ids = body.pop('ids', [])
+            unknown = [asset_id for asset_id in ids if asset_id not in library.assets]
+            if unknown:
+                return self._send(400, {'message': f"Unknown asset ids: {unknown[:3]}"})
+            with library.lock:
+                for asset_id in ids:
+                    library.assets[asset_id].update(body)
+                    library.updated[asset_id] += 1
+            self.send_response(204)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self._send(404, {'message': f"Not found: {method} {self.path}"})
+
+    def do_GET(self):
+        self._route('GET')
+
+    def do_POST(self):
+        self._route('POST')
+
+    def do_PUT(self):
+        self._route('PUT')
+
+
+def serve(library, host='127.0.0.1', port=2283, latency=0.0):
+    """Start a server in a background thread; returns the server."""
+    handler = type('BoundHandler', (Handler,), {'library': library, 'latency': latency})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--library', help='Directory whose files become assets')
+    parser.add_argument('--server-root',
+                        help='Path prefix for originalPath (default: the local paths)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2283)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds added to every request')
+    args = parser.parse_args()
+
+    library = Library(args.library, args.server_root)
+    server = serve(library, args.host, args.port, args.latency)
+    print(f"Fake Immich on http://{args.host}:{server.server_port} "
+          f"with {len(library.assets)} assets (API key: {API_KEY})", file=sys.stderr)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""
+Synthetic photo-library generator
+
+Builds a deterministic corpus of JPEG/PNG/TIFF files with a mix of EXIF
+layouts (with/without dates, with/without GPS, camera identity) plus a few
+large files. The same seed always produces byte-identical files, so benchmark
+results from different runs can be compared.
+
+Usage:
+    python benchmarks/generate_corpus.py OUTPUT_DIR [--count 200] [--large 4] [--seed 1234]
+"""
+
+import argparse
+import json
+import random
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from PIL import Image
+
+
+CORPUS_VERSION = 1
+
+# (profile name, format, extension, has date, has GPS)
+PROFILES = [
+    ("jpeg_full", "JPEG", ".jpg", True, True),
+    ("jpeg_date", "JPEG", ".jpg", True, False),
+    ("jpeg_gps", "JPEG", ".jpeg", False, True),
+    ("jpeg_bare", "JPEG", ".jpg", False, False),
+    ("png_date", "PNG", ".png", True, False),
+    ("png_bare", "PNG", ".png", False, False),
+    ("tiff_full", "TIFF", ".tif", True, True),
+    ("tiff_bare", "TIFF", ".tiff", False, False),
+]
+
+CAMERAS = [
+    ("Canon", "Canon EOS R6"),
+    ("NIKON CORPORATION", "NIKON Z 6_2"),
+    ("Apple", "iPhone 14 Pro"),
+    ("SONY", "ILCE-7M3"),
+]
+
+BASE_DATE = datetime(2021, 3, 14, 9, 0, 0)
+
+# Small files stay small so the corpus is dominated by per-file overhead;
+# the large ones exercise bandwidth.
+SMALL_SIZES = [(640, 480), (800, 600), (1024, 768)]
+LARGE_SIZE = (6000, 4000)
+
+
+def _to_dms(value):
+    """Convert decimal degrees to an EXIF (deg, min, sec) tuple."""
+    value = abs(value)
+    degrees = int(value)
+    minutes_float = (value - degrees) * 60
+    minutes = int(minutes_float)
+    seconds = round((minutes_float - minutes) * 60, 4)
+    return (float(degrees), float(minutes), seconds)
+
+
+def build_exif(rng, has_date, has_gps):
+    """Build a Pillow Exif object for one corpus file."""
+    exif = Image.Exif()
+    make, model = rng.choice(CAMERAS)
+    exif[0x010F] = make
+    exif[0x0110] = model
+    exif[0x0131] = "immich-exif-editor corpus"
+
+    if has_date:
+        dt = BASE_DATE + timedelta(seconds=rng.randrange(0, 3 * 365 * 24 * 3600))
+        dt_str = dt.strftime("%Y:%m:%d %H:%M:%S")
+        exif[0x0132] = dt_str
+        exif_ifd = exif.get_ifd(0x8769)
+        exif_ifd[0x9003] = dt_str
+        exif_ifd[0x9004] = dt_str
+
+    if has_gps:
+        lat = rng.uniform(-45.0, -10.0)
+        lon = rng.uniform(110.0, 155.0)
+        gps_ifd = exif.get_ifd(0x8825)
+        gps_ifd[1] = 'N' if lat >= 0 else 'S'
+        gps_ifd[2] = _to_dms(lat)
+        gps_ifd[3] = 'E' if lon >= 0 else 'W'
+        gps_ifd[4] = _to_dms(lon)
+
+    # Round-trip through bytes so TIFF can write the nested IFDs
+    loaded = Image.Exif()
+    loaded.load(exif.tobytes())
+    return loaded
+
+
+def build_image(rng, size):
+    """Build a deterministic image: a gradient with some noise on top."""
+    width, height = size
+    img = Image.linear_gradient('L').resize(size).convert('RGB')
+    noise = Image.frombytes('RGB', size, rng.randbytes(width * height * 3))
+    return Image.blend(img, noise, 0.35)
+
+
+def generate(output_dir, count=200, large=4, seed=1234):
+    """Generate the corpus and return its manifest.
+
+    Args:
+        output_dir: Directory to write into (created if missing)
+        count: Number of regular files
+        large: Number of additional large JPEGs
+        seed: Random seed
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+
+    files = []
+    for i in range(count):
+        profile, fmt, ext, has_date, has_gps = PROFILES[i % len(PROFILES)]
+        files.append((f"IMG_{i:05d}{ext}", profile, fmt, has_date, has_gps,
+                      rng.choice(SMALL_SIZES)))
+
+    for i in range(large):
+        files.append((f"LARGE_{i:03d}.jpg", "jpeg_large", "JPEG", True, i % 2 == 0,
+                      LARGE_SIZE))
+
+    manifest = {
+        'version': CORPUS_VERSION,
+        'seed': seed,
+        'count': count,
+        'large': large,
+        'files': []
+    }
+
+    for name, profile, fmt, has_date, has_gps, size in files:
+        img = build_image(rng, size)
+        exif = build_exif(rng, has_date, has_gps)
+        path = output_dir / name
+
+        save_kwargs = {'exif': exif}
+        if fmt == 'JPEG':
+            save_kwargs['quality'] = 90
+        img.save(path, fmt, **save_kwargs)
+
+        manifest['files'].append({
+            'name': name,
+            'profile': profile,
+            'format': fmt,
+            'has_date': has_date,
+            'has_gps': has_gps,
+            'size': path.stat().st_size
+        })
+
+    with open(output_dir / 'corpus.json', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic photo library")
+    parser.add_argument('output_dir')
+    parser.add_argument('--count', type=int, default=200, help="Number of regular files")
+    parser.add_argument('--large', type=int, default=4, help="Number of large JPEGs")
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args(argv)
+
+    manifest = generate(args.output_dir, args.count, args.large, args.seed)
+    total = sum(f['size'] for f in manifest['files'])
+    print(f"Generated {len(manifest['files'])} files ({total / 1_000_000:.1f} MB) in {args.output_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
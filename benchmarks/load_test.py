@@ -0,0 +1,125 @@
+"""
+Scheduler load test against the fake ExifTool
+
+Runs the bulk paths (date write, GPS write, sanitise) through
+``jobs.run_batch`` - the same scheduler the GUI uses - over a large number of
+synthetic file names, with ExifTool replaced by ``fake_exiftool.py``. Reports
+throughput, error aggregation and how quickly a cancellation takes effect.
+
+Usage:
+    python benchmarks/load_test.py --files 100000 --op gps \\
+        --latency lognormal:0.02,0.5 --fail-rate 0.01 --crash-rate 0.0005
+    python benchmarks/load_test.py --files 20000 --cancel-after 3
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / 'src'))
+
+import exif_ops  # noqa: E402
+import jobs  # noqa: E402
+
+
+OPERATIONS = {
+    'datetime': lambda path: exif_ops.write_datetime(
+        path, datetime(2022, 6, 1, 12, 0, 0), ['DateTimeOriginal', 'CreateDate']),
+    'gps': lambda path: exif_ops.write_gps(path, -31.95991, 116.030874),
+    'sanitise': exif_ops.sanitise,
+    'read': exif_ops.read_datetime_original,
+}
+
+
+def configure_fake(args):
+    """Point exif_ops at the fake ExifTool with the requested behaviour."""
+    os.environ['EXIFTOOL_CMD'] = f'"{sys.executable}" "{BENCH_DIR / "fake_exiftool.py"}"'
+    os.environ['FAKE_EXIFTOOL_STARTUP'] = str(args.startup)
+    os.environ['FAKE_EXIFTOOL_LATENCY'] = args.latency
+    os.environ['FAKE_EXIFTOOL_READ_LATENCY'] = args.latency
+    os.environ['FAKE_EXIFTOOL_FAIL_RATE'] = str(args.fail_rate)
+    os.environ['FAKE_EXIFTOOL_CRASH_RATE'] = str(args.crash_rate)
+    os.environ['FAKE_EXIFTOOL_SEED'] = str(args.seed)
+    exif_ops.exiftool_command.cache_clear()
+
+
+def error_summary(errors):
+    """Group error messages by their text with the file name removed."""
+    def category(message):
+        return message.split(' - ')[0].strip() or 'unknown'
+    return Counter(category(message) for _, message in errors).most_common()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the batch scheduler")
+    parser.add_argument('--files', type=int, default=10000)
+    parser.add_argument('--op', choices=sorted(OPERATIONS), default='gps')
+    parser.add_argument('--workers', type=int, default=jobs.DEFAULT_WORKERS)
+    parser.add_argument('--latency', default='lognormal:0.01,0.5',
+                        help="Per-file latency distribution (see fake_exiftool.py)")
+    parser.add_argument('--startup', type=float, default=0.3, help="Fake process start-up delay")
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    parser.add_argument('--crash-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cancel-after', type=float, default=None,
+                        help="Cancel the job after this many seconds")
+    parser.add_argument('--output', default=None, help="Write the results as JSON")
+    args = parser.parse_args(argv)
+
+    configure_fake(args)
+    tasks = [(Path(f"/fake/library/IMG_{i:07d}.jpg"),) for i in range(args.files)]
+
+    cancel_event = threading.Event()
+    cancel_time = [None]
+    if args.cancel_after is not None:
+        def cancel():
+            cancel_time[0] = time.perf_counter()
+            cancel_event.set()
+        threading.Timer(args.cancel_after, cancel).start()
+
+    last_report = [0.0]
+
+    def on_progress(done, total, name):
+        now = time.perf_counter()
+        if now - last_report[0] >= 1.0:
+            last_report[0] = now
+            print(f"  {done}/{total} ({done / (now - start):.0f} files/s)", flush=True)
+
+    start = time.perf_counter()
+    completed, errors, cancelled = jobs.run_batch(
+        OPERATIONS[args.op], tasks, args.workers, on_progress, cancel_event, name=args.op)
+    end = time.perf_counter()
+
+    processed = completed + len(errors)
+    results = {
+        'op': args.op,
+        'files': args.files,
+        'workers': args.workers,
+        'latency': args.latency,
+        'fail_rate': args.fail_rate,
+        'crash_rate': args.crash_rate,
+        'wall_s': end - start,
+        'throughput_per_s': processed / (end - start) if end > start else None,
+        'completed': completed,
+        'failed': len(errors),
+        'cancelled': cancelled,
+        'cancel_latency_s': (end - cancel_time[0]) if cancel_time[0] else None,
+        'errors_by_type': error_summary(errors)
+    }
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+"""
+End-to-end benchmark suite
+
+Times the operations the GUI performs - directory load, thumbnail
+generation, date read, date write, GPS write and sanitise - through the same
+``exif_ops`` functions ``ExifEditor`` calls, and writes the results as JSON.
+Write stages run with the same ThreadPoolExecutor fan-out as the GUI and
+operate on a scratch copy of the corpus, so the corpus itself is never
+modified.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--corpus DIR] [--output results.json]
+    python benchmarks/run_benchmarks.py --compare baseline.json results.json
+"""
+
+import argparse
+import json
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+import exif_ops  # noqa: E402
+from version import __version__  # noqa: E402
+from generate_corpus import generate  # noqa: E402
+
+
+RESULTS_VERSION = 1
+
+# Matches the worker count used by the bulk operations in main.py
+DEFAULT_WORKERS = 8
+
+STAGES = ['directory_load', 'thumbnail', 'date_read', 'date_write', 'gps_write', 'sanitise']
+
+
+def summarise(durations, wall):
+    """Summarise per-item durations (seconds) and the stage wall time."""
+    durations = sorted(durations)
+    count = len(durations)
+    if not count:
+        return {'count': 0, 'wall_s': wall}
+
+    p95 = durations[min(count - 1, int(round(0.95 * (count - 1))))]
+    return {
+        'count': count,
+        'wall_s': wall,
+        'throughput_per_s': count / wall if wall else None,
+        'mean_ms': statistics.fmean(durations) * 1000,
+        'median_ms': statistics.median(durations) * 1000,
+        'p95_ms': p95 * 1000,
+        'min_ms': durations[0] * 1000,
+        'max_ms': durations[-1] * 1000
+    }
+
+
+def run_stage(func, items, workers):
+    """Run ``func`` over ``items`` and return (per-item durations, wall, errors)."""
+    def timed(item):
+        start = time.perf_counter()
+        func(item)
+        return time.perf_counter() - start
+
+    durations = []
+    errors = []
+    start = time.perf_counter()
+    if workers <= 1:
+        for item in items:
+            try:
+                durations.append(timed(item))
+            except Exception as e:
+                errors.append(f"{item}: {e}")
+    else:
+        with ThreadPoolExecutor(max_workers=min(workers, len(items)) or 1) as executor:
+            futures = [executor.submit(timed, item) for item in items]
+            for item, future in zip(items, futures):
+                try:
+                    durations.append(future.result())
+                except Exception as e:
+                    errors.append(f"{item}: {e}")
+    return durations, time.perf_counter() - start, errors
+
+
+def exiftool_version():
+    try:
+        result = exif_ops.run_exiftool(['-ver'])
+        return result.stdout.strip() if result.returncode == 0 else None
+    except Exception:
+        return None
+
+
+def run_benchmarks(corpus_dir, workers=DEFAULT_WORKERS, repeat=3, stages=None):
+    """Run the benchmark stages against a corpus and return the results dict."""
+    corpus_dir = Path(corpus_dir)
+    stages = stages or STAGES
+    with open(corpus_dir / 'corpus.json', encoding='utf-8') as f:
+        corpus = json.load(f)
+
+    results = {
+        'version': RESULTS_VERSION,
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'app_version': __version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'exiftool_command': exif_ops.exiftool_command(),
+            'exiftool_version': exiftool_version(),
+            'workers': workers,
+            'repeat': repeat,
+            'corpus': {k: corpus[k] for k in ('version', 'seed', 'count', 'large')}
+        },
+        'stages': {}
+    }
+
+    with tempfile.TemporaryDirectory(prefix='exif-bench-') as scratch:
+        work_dir = Path(scratch) / 'library'
+        shutil.copytree(corpus_dir, work_dir)
+        files = exif_ops.list_image_files(work_dir)
+
+        stage_funcs = {
+            # Directory load is the listing + filtering done by load_directory()
+            'directory_load': (lambda _: exif_ops.list_image_files(work_dir), list(range(repeat)), 1),
+            'thumbnail': (exif_ops.make_thumbnail, files, workers),
+            'date_read': (exif_ops.read_datetime_original, files, workers),
+            'date_write': (lambda p: exif_ops.write_datetime(
+                p, datetime(2022, 6, 1, 12, 0, 0), ['DateTimeOriginal', 'CreateDate', 'ModifyDate']
+            ), files, workers),
+            'gps_write': (lambda p: exif_ops.write_gps(p, -31.95991, 116.030874), files, workers),
+            'sanitise': (exif_ops.sanitise, files, workers),
+        }
+
+        for name in stages:
+            func, items, stage_workers = stage_funcs[name]
+            print(f"  {name:<15} {len(items):>6} items ...", end='', flush=True)
+            durations, wall, errors = run_stage(func, items, stage_workers)
+            summary = summarise(durations, wall)
+            summary['errors'] = len(errors)
+            if errors:
+                summary['first_errors'] = errors[:5]
+            results['stages'][name] = summary
+            print(f" {wall:8.2f}s" + (f"  ({len(errors)} errors)" if errors else ""))
+
+    return results
+
+
+def compare(baseline_path, current_path):
+    """Print a per-stage comparison of two result files."""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(current_path, encoding='utf-8') as f:
+        current = json.load(f)
+
+    print(f"{'stage':<15} {'base wall':>10} {'new wall':>10} {'change':>8} "
+          f"{'base p50':>9} {'new p50':>9}")
+    for name in STAGES:
+        old = baseline['stages'].get(name)
+        new = current['stages'].get(name)
+        if not old or not new:
+            continue
+        change = ((new['wall_s'] - old['wall_s']) / old['wall_s'] * 100) if old['wall_s'] else 0
+        print(f"{name:<15} {old['wall_s']:>9.2f}s {new['wall_s']:>9.2f}s {change:>+7.1f}% "
+              f"{old.get('median_ms', 0):>7.1f}ms {new.get('median_ms', 0):>7.1f}ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Immich EXIF Editor operations")
+    parser.add_argument('--corpus', default=None,
+                        help="Corpus directory (generated into a temp dir if omitted)")
+    parser.add_argument('--count', type=int, default=200, help="Files to generate if no corpus")
+    parser.add_argument('--large', type=int, default=4, help="Large files to generate if no corpus")
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--repeat', type=int, default=3, help="Repetitions of the directory load")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=None)
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help="Compare two result files instead of running")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    if not exif_ops.check_exiftool():
+        print(exif_ops.exiftool_missing_reason(), file=sys.stderr)
+        return 1
+
+    with tempfile.TemporaryDirectory(prefix='exif-corpus-') as tmp:
+        corpus_dir = Path(args.corpus) if args.corpus else Path(tmp)
+        if not (corpus_dir / 'corpus.json').exists():
+            print(f"Generating corpus in {corpus_dir} ...")
+            generate(corpus_dir, args.count, args.large, args.seed)
+
+        print("Running benchmarks:")
+        results = run_benchmarks(corpus_dir, args.workers, args.repeat, args.stages)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
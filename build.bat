@@ -27,10 +27,6 @@ python -m PyInstaller --onefile ^
     --hidden-import=tkcalendar ^
     --hidden-import=babel ^
     --hidden-import=babel.numbers ^
-    --hidden-import=win32timezone ^
-    --hidden-import=pywintypes ^
-    --hidden-import=win32file ^
-    --hidden-import=win32con ^
     src\main.py
 
 if errorlevel 1 (
@@ -30,10 +30,6 @@ python -m PyInstaller --onefile ^
     --clean ^
     --noconfirm ^
     --collect-all customtkinter ^
-    --hidden-import=pywintypes ^
-    --hidden-import=win32file ^
-    --hidden-import=win32con ^
-    --hidden-import=win32api ^
     --hidden-import=PIL ^
     --hidden-import=PIL.Image ^
     --hidden-import=PIL.ImageTk ^
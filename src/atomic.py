@@ -0,0 +1,149 @@
+"""Atomic Writes - crash-safe replacement of files rewritten by a job
+
+ExifTool writes each new file to a temp file next to the original (``-o``),
+and the temp file is renamed over the original only when it is committed.
+Commits are grouped: a group of files is fsynced, renamed into place, and
+each directory touched is fsynced once, so durability costs a few syncs per
+group instead of several per file. If the app dies mid-job, every original
+is either untouched or fully replaced; leftover temp files are removed when
+the job is resumed.
+"""
+
+import os
+import platform
+import shutil
+import threading
+from pathlib import Path
+
+import filetimes
+import timing
+
+
+# Files committed per group
+GROUP_SIZE = 64
+
+TEMP_MARKER = '.immich-tmp'
+
+# The process umask, for the mode of new files written through a temp file
+# (read once: setting it to read it isn't thread-safe)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def temp_path(file_path):
+    """Return the temp path a rewrite of ``file_path`` is written to.
+
+    The temp file is hidden, in the same directory (so the rename is atomic)
+    and keeps the extension so ExifTool writes the same format.
+    """
+    file_path = Path(file_path)
+    return file_path.with_name(f".{file_path.name}{TEMP_MARKER}{file_path.suffix}")
+
+
+def remove_temp_files(file_paths):
+    """Delete leftover temp files for the given files (after a crash)."""
+    for file_path in file_paths:
+        try:
+            temp_path(file_path).unlink()
+        except FileNotFoundError:
+            pass
+
+
+def copy_mode(file_path, temp):
+    """Give ``temp`` the permissions of ``file_path``, or a new file's if there isn't one.
+
+    ``tempfile.mkstemp`` creates owner-only files, which other users (e.g.
+    Immich reading a share) couldn't read once renamed into place.
+    """
+    try:
+        shutil.copymode(file_path, temp)
+    except FileNotFoundError:
+        os.chmod(temp, 0o666 & ~_UMASK)
+
+
+def fsync_file(path):
+    with open(path, 'rb+') as f:
+        os.fsync(f.fileno())
+
+
+def fsync_dir(path):
+    """Make renames in a directory durable. Not possible (or needed) on Windows."""
+    if platform.system() == 'Windows':
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def preserve_creation_time(original, temp):
+    """Copy the creation time of ``original`` to ``temp``.
+
+    The renamed temp file replaces the original, so without this every
+    rewritten file would get a new creation date. A no-op where creation
+    times can't be set (``filetimes.CAN_SET_CREATED``).
+    """
+    if filetimes.CAN_SET_CREATED:
+        filetimes.set_times(temp, created=filetimes.created_time(original))
+
+
+class GroupCommitter:
+    """Collects finished rewrites and commits them in groups.
+
+    Args:
+        group_size: Files per commit group
+        before_commit: Optional callback run before a group is renamed into
+            place (e.g. syncing the undo journal)
+    """
+
+    def __init__(self, group_size=GROUP_SIZE, before_commit=None):
+        self.group_size = group_size
+        self.before_commit = before_commit
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def add(self, key, file_path):
+        """Queue a finished file. Returns flush() results if the group is full, else []."""
+        with self._lock:
+            self._pending.append((key, Path(file_path)))
+            if len(self._pending) < self.group_size:
+                return []
+        return self.flush()
+
+    def flush(self):
+        """Commit every queued file.
+
+        Returns:
+            List of (key, file path, error message or None)
+        """
+        with self._lock:
+            group, self._pending = self._pending, []
+        if not group:
+            return []
+
+        with timing.span('commit.group', files=len(group)):
+            if self.before_commit:
+                self.before_commit()
+
+            results = []
+            directories = set()
+            for key, file_path in group:
+                temp = temp_path(file_path)
+                try:
+                    # Nothing was rewritten (e.g. only OS timestamps changed)
+                    if temp.exists():
+                        with timing.span('commit.fsync'):
+                            fsync_file(temp)
+                        # ExifTool's -o output has default permissions; keep the original's
+                        shutil.copymode(file_path, temp)
+                        os.replace(temp, file_path)
+                        directories.add(file_path.parent)
+                    results.append((key, file_path, None))
+                except OSError as e:
+                    results.append((key, file_path, f"Commit failed: {e}"))
+
+            for directory in directories:
+                with timing.span('commit.fsync_dir'):
+                    fsync_dir(directory)
+        return results
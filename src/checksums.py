@@ -0,0 +1,123 @@
+"""Checksums - old -> new SHA-1 manifest of the files a job rewrote
+
+Immich identifies assets by the SHA-1 of the file, so a rewritten original
+looks like a new asset. For every file a job commits, the checksum before
+and after the write is recorded in ``<data dir>/checksums``:
+
+    <job>.csv    path,old_sha1,new_sha1 - appended as files are committed,
+                 so an interrupted job still leaves a usable manifest
+    <job>.json   the same, plus the job name and start time, written when
+                 the job ends
+
+Each file is hashed by the worker that writes it: the original just before
+the write (so ExifTool then reads it from the OS cache rather than the
+share again) and the new file straight after it was written, while it is
+still cached.
+"""
+
+import csv
+import hashlib
+import json
+import re
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import config
+
+
+HASH_CHUNK = 1024 * 1024
+
+
+def checksum_dir():
+    path = config.data_dir() / 'checksums'
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def sha1_file(file_path):
+    """SHA-1 of a file as hex, the checksum Immich identifies assets by."""
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_CHUNK)
+            if not chunk:
+                return digest.hexdigest()
+            digest.update(chunk)
+
+
+class ChecksumLog:
+    """Checksum manifest for one job. Safe to use from worker threads.
+
+    Call ``before`` and ``after`` around each write, then ``commit`` once the
+    new files are in place (or ``discard`` if a write failed).
+    """
+
+    def __init__(self, job_name):
+        self.job_name = job_name
+        self.started = datetime.now()
+        stem = re.sub(r'[^\w.-]+', '_', f"{self.started:%Y%m%d-%H%M%S}-{job_name}")
+        self.csv_path = checksum_dir() / f"{stem}.csv"
+        self.json_path = self.csv_path.with_suffix('.json')
+        self._pending = {}
+        self._rows = []
+        self._lock = threading.Lock()
+        self._file = open(self.csv_path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(['path', 'old_sha1', 'new_sha1'])
+
+    def before(self, file_path, source=None):
+        """Hash a file before it is rewritten (``source``: an identical local copy to hash instead)."""
+        old = sha1_file(file_path if source is None else source)
+        with self._lock:
+            self._pending[str(file_path)] = old
+
+    def after(self, file_path, written):
+        """Hash the new file (``written``: the temp file, or the file itself)."""
+        with self._lock:
+            old = self._pending.get(str(file_path))
+        # Nothing written (e.g. only OS timestamps changed): same checksum
+        new = sha1_file(written) if Path(written).exists() else old
+        with self._lock:
+            self._pending[str(file_path)] = (old, new)
+
+    def discard(self, file_path):
+        with self._lock:
+            self._pending.pop(str(file_path), None)
+
+    def commit(self, file_paths):
+        """Record files whose new version is now in place."""
+        with self._lock:
+            for file_path in file_paths:
+                pair = self._pending.pop(str(file_path), None)
+                if not isinstance(pair, tuple):
+                    continue
+                row = [str(file_path), pair[0], pair[1]]
+                self._rows.append(row)
+                self._writer.writerow(row)
+            self._file.flush()
+
+    def close(self):
+        """Finish the CSV and write the JSON manifest.
+
+        Returns:
+            Number of files recorded
+        """
+        with self._lock:
+            self._file.close()
+            data = {
+                'job': self.job_name,
+                'started': self.started.isoformat(timespec='seconds'),
+                'files': [{'path': path, 'old_sha1': old, 'new_sha1': new}
+                          for path, old, new in self._rows],
+            }
+        with open(self.json_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=1)
+        return len(self._rows)
+
+
+def start(job_name):
+    """Return a ChecksumLog for a job, or None if disabled (``IMMICH_EXIF_CHECKSUMS=0``)."""
+    if not config.checksum_manifests():
+        return None
+    return ChecksumLog(job_name)
@@ -0,0 +1,156 @@
+"""Configuration - settings read from environment variables (or the .env file)"""
+
+import os
+import platform
+import shlex
+from pathlib import Path
+
+
+def _split_command(value):
+    """Split a command line into arguments, honouring quotes on every platform."""
+    if platform.system() == 'Windows':
+        return [part.strip('"') for part in shlex.split(value, posix=False)]
+    return shlex.split(value)
+
+
+def exiftool_command_override():
+    """Return the ExifTool command from ``EXIFTOOL_CMD`` as a list, or None.
+
+    The value is a full command line, e.g. ``C:\\Tools\\exiftool.exe`` or
+    ``python benchmarks/fake_exiftool.py`` for load testing.
+    """
+    value = os.getenv('EXIFTOOL_CMD', '').strip()
+    if not value:
+        return None
+    return _split_command(value)
+
+
+def data_dir():
+    """Return the folder for app data (profiles, journals, caches).
+
+    ``IMMICH_EXIF_DATA_DIR`` overrides the default ``~/.immich-exif-editor``.
+    """
+    value = os.getenv('IMMICH_EXIF_DATA_DIR', '').strip()
+    path = Path(value) if value else Path.home() / '.immich-exif-editor'
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def immich_server():
+    """Return (base URL, API key) from ``IMMICH_URL``/``IMMICH_API_KEY``, or None."""
+    url = os.getenv('IMMICH_URL', '').strip().rstrip('/')
+    key = os.getenv('IMMICH_API_KEY', '').strip()
+    if not url or not key:
+        return None
+    return url, key
+
+
+def immich_push_mode():
+    """Default Immich push mode: 'off', 'after' (edit files, then push) or 'only'."""
+    value = os.getenv('IMMICH_PUSH', 'off').strip().lower()
+    return value if value in ('off', 'after', 'only') else 'off'
+
+
+def immich_path_map():
+    """Return [(local prefix, server prefix)] from ``IMMICH_PATH_MAP``.
+
+    The value is a ``;``-separated list of ``local=server`` pairs, e.g.
+    ``Z:/photos=/mnt/media/photos``. Used to match files to Immich assets by
+    path when checksums aren't wanted.
+    """
+    pairs = []
+    for item in os.getenv('IMMICH_PATH_MAP', '').split(';'):
+        if '=' in item:
+            local, server = item.split('=', 1)
+            pairs.append((local.strip(), server.strip()))
+    return pairs
+
+
+def immich_match():
+    """How files are matched to assets: 'checksum' or 'path'.
+
+    Defaults to 'path' when ``IMMICH_PATH_MAP`` is set (no file reads needed),
+    otherwise 'checksum'. ``IMMICH_MATCH`` overrides.
+    """
+    value = os.getenv('IMMICH_MATCH', '').strip().lower()
+    if value in ('checksum', 'path'):
+        return value
+    return 'path' if immich_path_map() else 'checksum'
+
+
+def xmp_sidecars():
+    """True if edits should go to XMP sidecars by default (``IMMICH_EXIF_SIDECARS=1``)."""
+    return os.getenv('IMMICH_EXIF_SIDECARS', '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def library_roots():
+    """Folders the background indexer crawls.
+
+    ``IMMICH_EXIF_LIBRARY_ROOTS`` lists them separated by ``os.pathsep``
+    (``;`` on Windows); by default ``Z:/photos`` if it exists.
+    """
+    value = os.getenv('IMMICH_EXIF_LIBRARY_ROOTS', '').strip()
+    if value:
+        return [Path(part.strip()) for part in value.split(os.pathsep) if part.strip()]
+    default = Path('Z:/photos')
+    return [default] if default.exists() else []
+
+
+def background_indexer():
+    """True unless ``IMMICH_EXIF_INDEXER=off`` (e.g. when running ``indexer.py`` headless)."""
+    return os.getenv('IMMICH_EXIF_INDEXER', 'on').strip().lower() not in ('0', 'false', 'no', 'off')
+
+
+def index_throttle():
+    """Seconds the indexer idles per second of work (``IMMICH_EXIF_INDEX_THROTTLE``, default 2)."""
+    try:
+        return max(0.0, float(os.getenv('IMMICH_EXIF_INDEX_THROTTLE', '2')))
+    except ValueError:
+        return 2.0
+
+
+def thumbnail_memory_mb():
+    """Memory for file list thumbnails in MB (``IMMICH_EXIF_THUMBNAIL_MB``, default 192)."""
+    try:
+        return max(16, int(os.getenv('IMMICH_EXIF_THUMBNAIL_MB', '192')))
+    except ValueError:
+        return 192
+
+
+def checksum_manifests():
+    """True unless ``IMMICH_EXIF_CHECKSUMS=0``: write jobs record old/new SHA-1s."""
+    return os.getenv('IMMICH_EXIF_CHECKSUMS', '1').strip().lower() not in ('0', 'false', 'no', 'off')
+
+
+def staging_mode():
+    """Whether jobs edit local copies of files: 'off', 'network' or 'always'.
+
+    ``IMMICH_EXIF_STAGING=network`` stages files on network shares (SMB, NFS)
+    only; the default is 'off'. See ``staging``.
+    """
+    value = os.getenv('IMMICH_EXIF_STAGING', 'off').strip().lower()
+    return value if value in ('network', 'always') else 'off'
+
+
+def staging_dir():
+    """Local folder for staged copies (``IMMICH_EXIF_STAGING_DIR``, default ``<data dir>/staging``)."""
+    value = os.getenv('IMMICH_EXIF_STAGING_DIR', '').strip()
+    path = Path(value) if value else data_dir() / 'staging'
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def staging_mb():
+    """How far downloads may run ahead of the edits, in MB (``IMMICH_EXIF_STAGING_MB``, default 512)."""
+    try:
+        return max(16, int(os.getenv('IMMICH_EXIF_STAGING_MB', '512')))
+    except ValueError:
+        return 512
+
+
+def job_slots():
+    """Write jobs that may run at once (``IMMICH_EXIF_JOB_SLOTS``, default 1; others wait in the queue)."""
+    try:
+        return max(1, int(os.getenv('IMMICH_EXIF_JOB_SLOTS', '1')))
+    except ValueError:
+        return 1
@@ -0,0 +1,244 @@
+"""Duplicates - find near-duplicate photos and fill in their missing metadata
+
+The same shot often turns up as the camera original, an edited export and
+a messenger copy with its metadata stripped. Each image gets a 64-bit
+difference hash (dHash) of its thumbnail; copies that were resized,
+recompressed or lightly edited hash within a few bits of each other.
+
+Clusters are found without comparing every pair: the hash is split into
+``max_distance + 1`` chunks, and by the pigeonhole principle two hashes
+within ``max_distance`` bits agree exactly on at least one chunk. Hashes
+are bucketed by each chunk with a NumPy sort, only hashes sharing a bucket
+are compared, and matches are merged with union-find.
+
+Hashes are cached by path, size and mtime in ``<data dir>/dhash.json``;
+thumbnails made while browsing (``remember``) fill the cache for free.
+"""
+
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import config
+import exif_ops
+import jobs
+import preflight
+import timing
+
+
+# Largest Hamming distance (of 64 bits) treated as the same picture
+DEFAULT_MAX_DISTANCE = 4
+
+# Date fields copied from the richest member of a cluster
+DATE_FIELDS = ('DateTimeOriginal', 'CreateDate')
+
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def dhash(img):
+    """64-bit difference hash of a Pillow image: is each pixel brighter than its right neighbour?"""
+    small = np.asarray(img.convert('L').resize((9, 8)), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def _cache_path():
+    return config.data_dir() / 'dhash.json'
+
+
+def _load_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            try:
+                with open(_cache_path(), encoding='utf-8') as f:
+                    _cache = json.load(f)
+            except (OSError, ValueError):
+                _cache = {}
+        return _cache
+
+
+def save_cache():
+    with _cache_lock:
+        if _cache is None:
+            return
+        temp = _cache_path().with_suffix('.tmp')
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(_cache, f)
+        os.replace(temp, _cache_path())
+
+
+def _stamp(file_path):
+    stat = os.stat(file_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def remember(file_path, img):
+    """Cache the hash of a thumbnail that was made anyway (file browser)."""
+    try:
+        entry = _stamp(file_path) + [dhash(img)]
+    except (OSError, ValueError):
+        return
+    cache = _load_cache()
+    with _cache_lock:
+        cache[exif_ops.path_key(file_path)] = entry
+
+
+def hash_file(file_path):
+    """Return the dHash of a file, from the cache if it hasn't changed."""
+    cache = _load_cache()
+    key = exif_ops.path_key(file_path)
+    stamp = _stamp(file_path)
+    entry = cache.get(key)
+    if entry and entry[:2] == stamp:
+        return entry[2]
+    with timing.span('dhash.compute'):
+        value = dhash(exif_ops.make_thumbnail(file_path))
+    with _cache_lock:
+        cache[key] = stamp + [value]
+    return value
+
+
+def hash_files(files, max_workers=jobs.DEFAULT_WORKERS, on_progress=None):
+    """Hash many files in parallel.
+
+    Returns:
+        (files, hashes) - the files that could be hashed and a uint64 array
+    """
+    def safe_hash(file_path):
+        try:
+            return hash_file(file_path)
+        except Exception:
+            return None  # Video, unreadable or undecodable
+
+    hashed, values = [], []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for i, (file_path, value) in enumerate(zip(files, executor.map(safe_hash, files)), 1):
+            if value is not None:
+                hashed.append(file_path)
+                values.append(value)
+            if on_progress and i % 500 == 0:
+                on_progress(i, len(files))
+    save_cache()
+    return hashed, np.array(values, dtype=np.uint64)
+
+
+def _popcount(values):
+    return _POPCOUNT[values.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def find_clusters(hashes, max_distance=DEFAULT_MAX_DISTANCE):
+    """Group hashes that are within ``max_distance`` bits of each other.
+
+    Args:
+        hashes: uint64 array
+        max_distance: Largest Hamming distance in a match
+
+    Returns:
+        List of clusters (lists of indices into ``hashes``), each with two
+        or more members
+    """
+    all_hashes = np.ascontiguousarray(hashes, dtype=np.uint64)
+    # Exact copies share one entry, so a large set of identical files
+    # doesn't turn into a quadratic number of pairs
+    hashes, inverse = np.unique(all_hashes, return_inverse=True)
+    parent = list(range(len(hashes)))
+    # Flat images (all bits equal) say nothing about the picture
+    usable = (hashes != 0) & (hashes != np.uint64(0xFFFFFFFFFFFFFFFF))
+
+    chunks = max_distance + 1
+    widths = [64 // chunks + (1 if i < 64 % chunks else 0) for i in range(chunks)]
+    shift = 0
+    with timing.span('dhash.cluster', hashes=len(hashes)):
+        for width in widths:
+            keys = (hashes >> np.uint64(shift)) & np.uint64((1 << width) - 1)
+            shift += width
+            order = np.argsort(keys, kind='stable')
+            order = order[usable[order]]
+            sorted_keys = keys[order]
+            # End of the run of equal keys each position belongs to
+            starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+            ends = np.r_[starts[1:], len(order)]
+            run_end = np.repeat(ends, ends - starts)
+
+            # Compare every position with the one k places on, for all runs at once
+            positions = np.arange(len(order))
+            active = positions[run_end - positions > 1]
+            k = 1
+            while active.size:
+                first, second = order[active], order[active + k]
+                close = _popcount(hashes[first] ^ hashes[second]) <= max_distance
+                for i, j in zip(first[close].tolist(), second[close].tolist()):
+                    a, b = _find(parent, i), _find(parent, j)
+                    if a != b:
+                        parent[b] = a
+                k += 1
+                active = active[run_end[active] - active > k]
+
+    clusters = {}
+    roots = [_find(parent, i) for i in range(len(hashes))]
+    for i, unique_index in enumerate(inverse.ravel().tolist()):
+        if usable[unique_index]:
+            clusters.setdefault(roots[unique_index], []).append(i)
+    return [members for members in clusters.values() if len(members) > 1]
+
+
+def _richness(file_path, tags):
+    """Sort key for the member to copy from: has a date, has GPS, then largest file."""
+    has_date = preflight.parse_exif_datetime(tags.get('DateTimeOriginal', '')) is not None
+    has_gps = 'GPSLatitude' in tags and 'GPSLongitude' in tags
+    try:
+        size = os.path.getsize(file_path)
+    except OSError:
+        size = 0
+    return (has_date + has_gps, size)
+
+
+def plan(files, max_distance=DEFAULT_MAX_DISTANCE, on_progress=None):
+    """Find duplicate clusters and what each member is missing.
+
+    Args:
+        files: Files to search (e.g. a whole folder tree)
+        max_distance: Largest Hamming distance in a match
+        on_progress: Optional ``on_progress(hashed, total)`` while hashing
+
+    Returns:
+        (to_change, clusters) - to_change is a list of (file, source file,
+        datetime or None, lat or None, lon or None) for members missing a
+        date or GPS that the richest member of their cluster has; clusters
+        is a list of lists of files
+    """
+    hashed, hashes = hash_files(files, on_progress=on_progress)
+    clusters = [[hashed[i] for i in members] for members in find_clusters(hashes, max_distance)]
+
+    members = [f for cluster in clusters for f in cluster]
+    current = preflight.read_current(members, ('DateTimeOriginal',) + preflight.GPS_TAGS)
+
+    to_change = []
+    for cluster in clusters:
+        tags = {f: current.get(exif_ops.path_key(f), {}) for f in cluster}
+        source = max(cluster, key=lambda f: _richness(f, tags[f]))
+        source_dt = preflight.parse_exif_datetime(tags[source].get('DateTimeOriginal', ''))
+        source_gps = preflight.signed_gps(tags[source])
+        for file_path in cluster:
+            if file_path == source:
+                continue
+            has_date = preflight.parse_exif_datetime(tags[file_path].get('DateTimeOriginal', '')) is not None
+            dt = source_dt if not has_date else None
+            lat, lon = source_gps if source_gps and preflight.signed_gps(tags[file_path]) is None else (None, None)
+            if dt is not None or lat is not None:
+                to_change.append((file_path, source, dt, lat, lon))
+    return to_change, clusters
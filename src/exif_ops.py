@@ -0,0 +1,671 @@
+"""EXIF Operations - ExifTool and Pillow helpers shared by the GUI and benchmarks
+
+Everything in here is free of Tk so that the same code paths can be driven
+headless (see ``benchmarks/``).
+"""
+
+import functools
+import json
+import os
+import platform
+import queue
+import shutil
+import struct
+import subprocess
+import sys
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import atomic
+import config
+import filetimes
+import formats
+import jpeg
+import sanitise_policies
+import timing
+import xmp_sidecar
+
+
+# Photos, RAW and video (see ``formats``)
+IMAGE_EXTENSIONS = formats.EXTENSIONS
+
+THUMBNAIL_SIZE = (80, 80)
+
+EXIF_DATETIME_FORMAT = "%Y:%m:%d %H:%M:%S"
+
+# Fields handled by the OS rather than ExifTool (see ``filetimes``)
+WINDOWS_TIMESTAMP_FIELDS = ('WindowsCreated', 'WindowsModified')
+
+# File path characters per spawned ExifTool command (Windows caps a command
+# line at 32,767); a persistent process reads its arguments from stdin instead
+SPAWN_ARGS_CHARS = 24000
+
+
+def _bundled_exiftool_files():
+    """Return the bundled ``exiftool_files`` folder."""
+    if getattr(sys, 'frozen', False):
+        return Path(sys.executable).parent / 'exiftool_files'
+    return Path(__file__).resolve().parent.parent / 'exiftool_files'
+
+
+def _bundled_exiftool_script():
+    """Return (exiftool.pl, its ``lib`` folder), or None if either isn't there.
+
+    The script needs the Image::ExifTool library from ``exiftool_files/lib``;
+    without it Perl stops before ExifTool starts.
+    """
+    files = _bundled_exiftool_files()
+    script = files / 'exiftool.pl'
+    lib = files / 'lib'
+    if script.exists() and (lib / 'Image' / 'ExifTool.pm').exists():
+        return script, lib
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def exiftool_command():
+    """Return the ExifTool command as a list of arguments.
+
+    ``EXIFTOOL_CMD`` takes precedence. Otherwise on Windows this is the
+    bundled/PATH ``exiftool.exe``; elsewhere a PATH ``exiftool`` is
+    preferred, falling back to running the bundled Perl script (with its
+    ``lib`` folder) with the system ``perl``. The result is cached - call
+    ``exiftool_command.cache_clear()`` after changing the configuration.
+    """
+    override = config.exiftool_command_override()
+    if override:
+        return override
+
+    if platform.system() == 'Windows':
+        return ['exiftool.exe']
+
+    if shutil.which('exiftool'):
+        return ['exiftool']
+
+    bundled = _bundled_exiftool_script()
+    if bundled and shutil.which('perl'):
+        script, lib = bundled
+        return ['perl', '-I', str(lib), str(script)]
+
+    return ['exiftool']
+
+
+def exiftool_missing_reason():
+    """Explain why ExifTool can't be run, for when ``check_exiftool`` fails."""
+    command = ' '.join(exiftool_command())
+    if platform.system() == 'Windows' or config.exiftool_command_override():
+        return f"ExifTool not runnable: {command}"
+    files = _bundled_exiftool_files()
+    if (files / 'exiftool.pl').exists() and not (files / 'lib' / 'Image' / 'ExifTool.pm').exists():
+        return (f"ExifTool not runnable: {command}\n"
+                f"The bundled {files / 'exiftool.pl'} can't run without its Image::ExifTool "
+                f"library ({files / 'lib'} is missing). Install ExifTool (e.g. "
+                f"'apt install libimage-exiftool-perl') so 'exiftool' is on the PATH, "
+                f"or set EXIFTOOL_CMD.")
+    return (f"ExifTool not runnable: {command}\n"
+            f"Install ExifTool so 'exiftool' is on the PATH, or set EXIFTOOL_CMD.")
+
+
+class ExifToolCrashed(Exception):
+    """The persistent ExifTool process exited while running a command."""
+
+
+class ExifToolProcess:
+    """A persistent ExifTool process using the ``-stay_open`` protocol.
+
+    Each command is written to stdin one argument per line and terminated with
+    ``-execute{N}``. ExifTool prints ``{readyN}`` on stdout when it is done, and
+    ``-echo4`` prints the same marker on stderr. A reader thread drains stderr
+    into a queue while stdout is read, so a command with a lot of warnings
+    can't fill the stderr pipe and stall ExifTool. The process is started on
+    first use and restarted after a crash.
+
+    Args:
+        low_priority: Run ExifTool at idle CPU priority (background indexing)
+    """
+
+    def __init__(self, low_priority=False):
+        self._proc = None
+        self._counter = 0
+        self._lock = threading.Lock()
+        self.low_priority = low_priority
+
+    def _start(self):
+        kwargs = {}
+        if platform.system() == 'Windows':
+            kwargs['creationflags'] = subprocess.CREATE_NO_WINDOW
+            if self.low_priority:
+                kwargs['creationflags'] |= subprocess.IDLE_PRIORITY_CLASS
+        elif self.low_priority:
+            kwargs['preexec_fn'] = lambda: os.nice(10)
+        with timing.span('exiftool.start'):
+            self._proc = subprocess.Popen(
+                exiftool_command() + ['-stay_open', 'True', '-@', '-',
+                                      '-common_args', '-charset', 'filename=utf8'],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                encoding='utf-8',
+                errors='replace',
+                **kwargs
+            )
+            self._stderr = queue.Queue()
+            threading.Thread(target=self._drain, args=(self._proc.stderr, self._stderr),
+                             name='exiftool-stderr', daemon=True).start()
+
+    @staticmethod
+    def _drain(stream, lines):
+        """Copy a stream's lines to a queue until it closes ('' marks the end)."""
+        for line in iter(stream.readline, ''):
+            lines.put(line)
+        lines.put('')
+
+    def _read_until(self, read_line, marker):
+        lines = []
+        while True:
+            line = read_line()
+            if not line:
+                try:
+                    code = self._proc.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    code = None
+                raise ExifToolCrashed(f"ExifTool exited (code {code})")
+            if line.rstrip('\r\n') == marker:
+                return ''.join(lines)
+            lines.append(line)
+
+    def execute(self, args):
+        """Run one command and return a subprocess.CompletedProcess.
+
+        ExifTool doesn't report an exit status in this mode, so the return
+        code is 1 if any ``Error`` line was written to stderr.
+        """
+        with self._lock:
+            if self._proc is None or self._proc.poll() is not None:
+                self._start()
+
+            self._counter += 1
+            marker = f"{{ready{self._counter}}}"
+            lines = [str(a) for a in args] + ['-echo4', marker, f"-execute{self._counter}"]
+
+            try:
+                self._proc.stdin.write('\n'.join(lines) + '\n')
+                self._proc.stdin.flush()
+                stdout = self._read_until(self._proc.stdout.readline, marker)
+                stderr = self._read_until(self._stderr.get, marker)
+            except (OSError, ExifToolCrashed) as e:
+                self._kill()
+                raise ExifToolCrashed(str(e))
+
+        returncode = 1 if any(line.startswith('Error') for line in stderr.splitlines()) else 0
+        return subprocess.CompletedProcess(args, returncode, stdout, stderr)
+
+    def _kill(self):
+        if self._proc is not None:
+            try:
+                self._proc.kill()
+                self._proc.wait(timeout=5)
+            except Exception:
+                pass
+            self._proc = None
+
+    def close(self):
+        """Ask ExifTool to exit, killing it if it doesn't."""
+        with self._lock:
+            if self._proc is None:
+                return
+            try:
+                self._proc.stdin.write('-stay_open\nFalse\n')
+                self._proc.stdin.flush()
+                self._proc.wait(timeout=5)
+            except Exception:
+                pass
+            self._kill()
+
+
+_local = threading.local()
+
+
+class ExifToolPool:
+    """Persistent ExifTool processes, one per worker thread.
+
+    Pass ``bind`` as a ThreadPoolExecutor initializer; ``run_exiftool`` calls
+    made on those threads then reuse the thread's process instead of spawning
+    a new one per file. Call ``close`` when the executor has finished.
+    """
+
+    def __init__(self, low_priority=False):
+        self._processes = []
+        self._lock = threading.Lock()
+        self.low_priority = low_priority
+
+    def bind(self):
+        process = ExifToolProcess(self.low_priority)
+        with self._lock:
+            self._processes.append(process)
+        _local.process = process
+
+    def close(self):
+        with self._lock:
+            processes, self._processes = self._processes, []
+        for process in processes:
+            process.close()
+
+
+def run_exiftool(args):
+    """Run ExifTool with the given arguments.
+
+    Uses the current thread's persistent process if one is bound (see
+    ``ExifToolPool``), otherwise spawns a new process.
+
+    Args:
+        args: ExifTool arguments (without the command itself)
+
+    Returns:
+        subprocess.CompletedProcess with text stdout/stderr
+    """
+    process = getattr(_local, 'process', None)
+    if process is not None:
+        with timing.span('exiftool.execute'):
+            return process.execute(args)
+
+    with timing.span('exiftool.spawn'):
+        return subprocess.run(
+            exiftool_command() + list(args),
+            capture_output=True,
+            text=True,
+            shell=(platform.system() == 'Windows')
+        )
+
+
+def _exiftool_fingerprint():
+    """Return the ExifTool command with the size and mtime of each file it runs."""
+    parts = []
+    for arg in exiftool_command():
+        path = arg if os.path.isfile(arg) else shutil.which(arg)
+        try:
+            stat = os.stat(path) if path else None
+        except OSError:
+            stat = None
+        parts.append([arg, stat.st_size, stat.st_mtime_ns] if stat else [arg])
+    return parts
+
+
+def exiftool_version(cached=False):
+    """Return the ExifTool version string, or None if ExifTool can't be run.
+
+    Args:
+        cached: Trust the last successful check (``<data dir>/exiftool.json``)
+            if the command and its files are unchanged, rather than spawning
+            ExifTool (about 0.3 s on Windows)
+    """
+    cache_path = config.data_dir() / 'exiftool.json'
+    fingerprint = _exiftool_fingerprint()
+    if cached:
+        try:
+            with open(cache_path, encoding='utf-8') as f:
+                saved = json.load(f)
+            if saved['fingerprint'] == fingerprint:
+                return saved['version']
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    try:
+        result = run_exiftool(['-ver'])
+    except Exception:
+        return None
+    if result.returncode != 0:
+        return None
+    version = result.stdout.strip()
+    try:
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump({'fingerprint': fingerprint, 'version': version}, f)
+    except OSError:
+        pass
+    return version
+
+
+def check_exiftool(cached=False):
+    """Return True if ExifTool can be run (see ``exiftool_version``)."""
+    return exiftool_version(cached) is not None
+
+
+def list_image_files(directory):
+    """Return the image files directly inside a directory, sorted by name.
+
+    Raises:
+        PermissionError: If the directory can't be listed
+    """
+    files = []
+    for item in sorted(Path(directory).iterdir()):
+        if item.is_file() and item.suffix.lower() in IMAGE_EXTENSIONS:
+            files.append(item)
+    return files
+
+
+def walk_image_files(directory):
+    """Return the image files in a directory and all its subfolders.
+
+    Folders that can't be listed are skipped.
+    """
+    files = []
+    for root, dirs, names in os.walk(directory):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        for name in names:
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS and not name.startswith('.'):
+                files.append(Path(root) / name)
+    return files
+
+
+def make_thumbnail(file_path, size=THUMBNAIL_SIZE):
+    """Return a Pillow thumbnail of at most ``size``.
+
+    Raises:
+        Exception: If the format has no thumbnail (video) or can't be decoded
+    """
+    return formats.handler_for(file_path).thumbnail(file_path, size)
+
+
+def read_datetime_original(file_path):
+    """Read DateTimeOriginal from a file, or from its XMP sidecar if it has one.
+
+    Returns:
+        datetime, or None if the tag is missing or unreadable
+    """
+    sidecar = xmp_sidecar.find_sidecars([file_path]).get(file_path)
+    if sidecar is not None:
+        value = xmp_sidecar.read_values(sidecar).get('DateTimeOriginal')
+        if value:
+            return datetime.strptime(value, EXIF_DATETIME_FORMAT)
+
+    try:
+        native = formats.handler_for(file_path).read_native(file_path, ['DateTimeOriginal'])
+    except (OSError, struct.error):
+        native = None
+    if native is not None:
+        value = native.get('DateTimeOriginal')
+        return datetime.strptime(value, EXIF_DATETIME_FORMAT) if value else None
+
+    result = run_exiftool(['-DateTimeOriginal', '-s3', str(file_path)])
+
+    if result.returncode == 0 and result.stdout.strip():
+        # Format: 2024:01:17 14:30:25
+        try:
+            return datetime.strptime(result.stdout.strip(), EXIF_DATETIME_FORMAT)
+        except ValueError:
+            return None
+    return None
+
+
+def path_key(file_path):
+    """Normalise a path for use as a dictionary key (ExifTool reports '/' on Windows)."""
+    return os.path.normcase(os.path.normpath(str(file_path)))
+
+
+def _chunk_paths(files, max_chars):
+    """Split files into lists whose paths add up to at most ``max_chars`` (one file minimum)."""
+    chunks = []
+    chunk, length = [], 0
+    for file_path in files:
+        size = len(str(file_path)) + 3  # Quotes and separator
+        if chunk and length + size > max_chars:
+            chunks.append(chunk)
+            chunk, length = [], 0
+        chunk.append(file_path)
+        length += size
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def read_tags(files, tags, sidecars=True):
+    """Read tags from many files with one ExifTool command.
+
+    Values are numeric (``-n``), so GPS coordinates come back as unsigned
+    decimal degrees with a separate ``...Ref`` tag.
+
+    Args:
+        files: File paths to read
+        tags: Tag names to read
+        sidecars: Merge date and GPS values from XMP sidecars over the
+            file's own, as Immich does
+
+    Returns:
+        {path_key(file): {tag: value}} for every file ExifTool could read
+    """
+    if not files:
+        return {}
+
+    # Formats with a native reader (video) only reach ExifTool for tags it can't read
+    values = {}
+    exiftool_files = []
+    for file_path in files:
+        try:
+            native = formats.handler_for(file_path).read_native(file_path, tags)
+        except (OSError, struct.error):
+            native = None  # Unreadable or corrupt boxes: let ExifTool try
+        if native is None:
+            exiftool_files.append(file_path)
+        else:
+            values[path_key(file_path)] = {tag: v for tag, v in native.items() if tag in tags}
+
+    if getattr(_local, 'process', None) is None:
+        chunks = _chunk_paths(exiftool_files, SPAWN_ARGS_CHARS)
+    else:
+        chunks = [exiftool_files] if exiftool_files else []
+    for chunk in chunks:
+        args = ['-j', '-n', '-fast'] + [f"-{tag}" for tag in tags] + [str(f) for f in chunk]
+        result = run_exiftool(args)
+
+        # ExifTool exits non-zero if any file failed but still reports the rest
+        try:
+            entries = json.loads(result.stdout) if result.stdout.strip() else []
+        except ValueError:
+            raise Exception(result.stderr or "Unreadable ExifTool output")
+        values.update((path_key(entry.pop('SourceFile')), entry) for entry in entries)
+
+    if sidecars:
+        for file_path, sidecar in xmp_sidecar.find_sidecars(files).items():
+            entry = values.setdefault(path_key(file_path), {})
+            entry.update((tag, value) for tag, value in xmp_sidecar.read_values(sidecar).items()
+                         if tag in tags)
+    return values
+
+
+def _run_write(args, file_path, output=None, times=(None, None)):
+    """Run an ExifTool write, overwriting the file or writing a new one to ``output``.
+
+    Args:
+        times: (created, modified) timestamps to set on the written file, or None each
+    """
+    if output is None:
+        args = ['-overwrite_original'] + args + [str(file_path)]
+    else:
+        args = ['-o', str(output)] + args + [str(file_path)]
+
+    result = run_exiftool(args)
+    if result.returncode != 0:
+        raise Exception(result.stderr)
+
+    _set_file_times(file_path, output, *times)
+
+
+def _file_time_fields(fields, created, modified):
+    """Return (created, modified), keeping each only if its Windows timestamp field is in ``fields``."""
+    return (created if 'WindowsCreated' in fields else None,
+            modified if 'WindowsModified' in fields else None)
+
+
+def _set_file_times(file_path, output, created=None, modified=None):
+    """Set the OS times of a file just written, all in one call.
+
+    A new file written to ``output`` replaces the original when committed,
+    so it also gets the original's creation time unless given a new one.
+    """
+    target = file_path
+    if output is not None and os.path.exists(output):
+        target = output
+        if created is None and filetimes.CAN_SET_CREATED:
+            created = filetimes.created_time(file_path)
+    if created is None and modified is None:
+        return
+    with timing.span('os.set_timestamps'):
+        filetimes.set_times(target, created if filetimes.CAN_SET_CREATED else None, modified)
+
+
+def write_datetime(file_path, dt, fields, output=None):
+    """Write a date/time to the given fields of a file.
+
+    Windows timestamp fields are set on the file ExifTool writes, right
+    after the write.
+
+    Args:
+        file_path: File to update
+        dt: datetime to write
+        fields: Field names
+        output: Write the updated file here instead of overwriting (see ``atomic``)
+    """
+    exif_fields = [f for f in fields if f not in WINDOWS_TIMESTAMP_FIELDS]
+    times = _file_time_fields(fields, dt.timestamp(), dt.timestamp())
+
+    handler = formats.handler_for(file_path)
+    if not exif_fields or not handler.writable:
+        if exif_fields:
+            xmp_sidecar.write_datetime(file_path, dt, exif_fields)
+        _set_file_times(file_path, None, *times)
+        return
+
+    args = handler.datetime_args(exif_fields, dt.strftime(EXIF_DATETIME_FORMAT))
+    _run_write(args, file_path, output, times)
+
+
+def parse_time_shift(text):
+    """Parse a shift like '+1:13', '-0:30:15' or '+2 3:00' (days hours:minutes) to seconds."""
+    text = text.strip()
+    sign = -1 if text.startswith('-') else 1
+    body = text.lstrip('+-').strip()
+    days = 0
+    if ' ' in body:
+        day_text, body = body.split(None, 1)
+        if not day_text.isdigit():
+            raise ValueError(f"Invalid shift: {text!r}")
+        days = int(day_text)
+    parts = body.split(':')
+    if not 1 <= len(parts) <= 3 or not all(p.isdigit() for p in parts):
+        raise ValueError(f"Invalid shift: {text!r} (use +H:MM, -H:MM:SS or +D H:MM)")
+    hours, minutes, seconds = (int(p) for p in parts + ['0'] * (3 - len(parts)))
+    return sign * (days * 86400 + hours * 3600 + minutes * 60 + seconds)
+
+
+def shift_datetime(file_path, seconds, fields, output=None):
+    """Shift the given date/time fields of a file by a number of seconds.
+
+    ExifTool does the arithmetic on each field's own value (``-TAG+=``), so
+    the spacing between shots is kept and nothing has to be read first.
+
+    Args:
+        file_path: File to update
+        seconds: Shift; negative moves dates earlier
+        fields: Field names; Windows timestamps are shifted from the original's
+        output: Write the updated file here instead of overwriting (see ``atomic``)
+    """
+    if not seconds:
+        return
+    exif_fields = [f for f in fields if f not in WINDOWS_TIMESTAMP_FIELDS]
+    # Read the OS times before anything is rewritten
+    stat = os.stat(file_path)
+    created = filetimes.created_time(stat)
+    times = _file_time_fields(fields, None if created is None else created + seconds,
+                              stat.st_mtime + seconds)
+
+    handler = formats.handler_for(file_path)
+    if not exif_fields or not handler.writable:
+        if exif_fields:
+            current = read_tags([file_path], exif_fields).get(path_key(file_path), {})
+            xmp_sidecar.shift_datetime(file_path, seconds, exif_fields, current)
+        _set_file_times(file_path, None, *times)
+        return
+
+    op = '+=' if seconds > 0 else '-='
+    days, rest = divmod(abs(int(seconds)), 86400)
+    shift = f"0:0:{days} {rest // 3600}:{rest % 3600 // 60:02d}:{rest % 60:02d}"
+    _run_write(handler.datetime_args(exif_fields, shift, op), file_path, output, times)
+
+
+def write_gps(file_path, lat, lon, output=None):
+    """Write GPS coordinates to a file (or its XMP sidecar, if ExifTool can't write it)."""
+    handler = formats.handler_for(file_path)
+    if not handler.writable:
+        xmp_sidecar.write_gps(file_path, lat, lon)
+        return
+    _run_write(handler.gps_args(lat, lon), file_path, output)
+
+
+def write_metadata(file_path, dt=None, fields=(), lat=None, lon=None, output=None):
+    """Write a date/time and/or GPS coordinates in a single ExifTool call.
+
+    Args:
+        file_path: File to update
+        dt: datetime to write to ``fields``, or None
+        fields: Date field names, including Windows timestamp fields
+        lat, lon: Coordinates to write, or None
+        output: Write the updated file here instead of overwriting (see ``atomic``)
+    """
+    exif_fields = [f for f in fields if f not in WINDOWS_TIMESTAMP_FIELDS] if dt else []
+    times = _file_time_fields(fields, dt.timestamp(), dt.timestamp()) if dt else (None, None)
+    has_gps = lat is not None and lon is not None
+
+    handler = formats.handler_for(file_path)
+    if (not exif_fields and not has_gps) or not handler.writable:
+        if exif_fields:
+            xmp_sidecar.write_datetime(file_path, dt, exif_fields)
+        if has_gps:
+            xmp_sidecar.write_gps(file_path, lat, lon)
+        _set_file_times(file_path, None, *times)
+        return
+
+    args = []
+    if exif_fields:
+        args += handler.datetime_args(exif_fields, dt.strftime(EXIF_DATETIME_FORMAT))
+    if has_gps:
+        args += handler.gps_args(lat, lon)
+    _run_write(args, file_path, output, times)
+
+
+def sanitise(file_path, output=None, plan=None):
+    """Remove metadata from a file according to a sanitise plan.
+
+    With the default plan (remove everything but the ICC profile and
+    Orientation), JPEGs are stripped natively by copying the image data
+    without the metadata segments; other formats, other plans and JPEGs the
+    parser rejects go through ExifTool.
+
+    Args:
+        file_path: File to sanitise
+        output: Write the sanitised file here instead of overwriting
+        plan: sanitise_policies.SanitisePlan; defaults to the full policy
+    """
+    if plan is None:
+        plan = sanitise_policies.compile_policy()
+
+    if plan.native is not None and jpeg.is_jpeg(file_path):
+        target = output if output is not None else atomic.temp_path(file_path)
+        try:
+            with timing.span('sanitise.native'):
+                jpeg.strip_metadata(file_path, target, **plan.native)
+        except jpeg.JpegError:
+            Path(target).unlink(missing_ok=True)
+        except Exception:
+            Path(target).unlink(missing_ok=True)
+            raise
+        else:
+            if output is None:
+                shutil.copymode(file_path, target)
+                os.replace(target, file_path)
+            else:
+                atomic.preserve_creation_time(file_path, output)
+            return
+
+    _run_write(list(plan.exiftool_args), file_path, output)
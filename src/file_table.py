@@ -0,0 +1,108 @@
+"""File Table - columnar metadata for sorting and filtering the file list
+
+The files of the current folder are kept in name order, with one NumPy
+array per column:
+
+    taken   int64    DateTimeOriginal as seconds since 1970 (naive, no time zone)
+    lat     float32  latitude, NaN if none
+    lon     float32  longitude, NaN if none
+    flags   uint8    HAS_DATE | HAS_GPS | READ bits
+
+``view`` returns the row order for a sort and filter as an index array, so
+re-sorting 50k files is a single ``np.lexsort`` rather than a Python sort
+over dicts. Columns are filled in one batched read (``read_all``) the first
+time a sort or filter needs them.
+"""
+
+from datetime import datetime
+
+import numpy as np
+
+import exif_ops
+import preflight
+
+
+HAS_DATE = 1
+HAS_GPS = 2
+READ = 4
+
+TAGS = ('DateTimeOriginal',) + preflight.GPS_TAGS
+
+# Sort keys and filters ``view`` accepts
+SORTS = ('name', 'date')
+FILTERS = {
+    'all': lambda flags: np.ones(len(flags), dtype=bool),
+    'no_date': lambda flags: (flags & READ != 0) & (flags & HAS_DATE == 0),
+    'no_gps': lambda flags: (flags & READ != 0) & (flags & HAS_GPS == 0),
+    'incomplete': lambda flags: (flags & READ != 0) & (flags & (HAS_DATE | HAS_GPS) != HAS_DATE | HAS_GPS),
+}
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class FileTable:
+    """Metadata columns for a list of files, in the list's (name) order."""
+
+    def __init__(self, files):
+        self.files = list(files)
+        self.rows = {file_path: i for i, file_path in enumerate(self.files)}
+        count = len(self.files)
+        self.taken = np.zeros(count, dtype=np.int64)
+        self.lat = np.full(count, np.nan, dtype=np.float32)
+        self.lon = np.full(count, np.nan, dtype=np.float32)
+        self.flags = np.zeros(count, dtype=np.uint8)
+        self.complete = False
+        self.reading = False
+
+    def __len__(self):
+        return len(self.files)
+
+    def set_values(self, file_path, dt=None, lat=None, lon=None):
+        """Record a file's values; None leaves a column unset."""
+        row = self.rows.get(file_path)
+        if row is None:
+            return
+        flags = READ
+        if dt is not None:
+            self.taken[row] = int((dt - _EPOCH).total_seconds())
+            flags |= HAS_DATE
+        if lat is not None and lon is not None:
+            self.lat[row], self.lon[row] = lat, lon
+            flags |= HAS_GPS
+        self.flags[row] = flags
+
+    def fill(self, current):
+        """Fill the columns from ``preflight.read_current`` output for ``TAGS``."""
+        for file_path in self.files:
+            tags = current.get(exif_ops.path_key(file_path), {})
+            dt = preflight.parse_exif_datetime(tags.get('DateTimeOriginal', ''))
+            lat, lon = preflight.signed_gps(tags) or (None, None)
+            self.set_values(file_path, dt, lat, lon)
+        self.complete = True
+
+    def read_all(self):
+        """Read every file's date and GPS in parallel batches (background thread)."""
+        self.fill(preflight.read_current(self.files, TAGS))
+
+    def view(self, sort='name', descending=False, filter='all'):
+        """Return the row order for a sort and filter.
+
+        Args:
+            sort: 'name' or 'date'; files without a date sort last either way
+            descending: Reverse the sort
+            filter: A key of ``FILTERS``
+
+        Returns:
+            int array of row indices into ``files``
+        """
+        name_rank = np.arange(len(self.files))
+        if descending:
+            name_rank = name_rank[::-1]
+        if sort == 'date':
+            has_date = (self.flags & HAS_DATE) != 0
+            taken = np.where(has_date, self.taken, 0)
+            # lexsort: last key is the primary one
+            order = np.lexsort((name_rank, -taken if descending else taken, ~has_date))
+        else:
+            order = np.argsort(name_rank, kind='stable')
+        return order[FILTERS[filter](self.flags)[order]]
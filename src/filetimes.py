@@ -0,0 +1,128 @@
+"""File Times - set a file's created, modified and accessed times on any OS
+
+    Windows  SetFileTime through ctypes: one handle for all three times,
+             no pywin32 needed
+    macOS    os.utime, then setattrlist(ATTR_CMN_CRTIME) for the creation
+             (birth) time
+    Linux    os.utime; the birth time can be read on some file systems but
+             no system call sets it, so a created time is skipped
+             (``CAN_SET_CREATED``)
+
+Times are POSIX timestamps in seconds (floats, like ``os.stat``).
+"""
+
+import functools
+import os
+import platform
+
+
+CAN_SET_CREATED = platform.system() in ('Windows', 'Darwin')
+
+# Seconds from 1601-01-01 (FILETIME epoch) to 1970-01-01
+_FILETIME_EPOCH = 11644473600
+
+# Windows CreateFileW flags
+_FILE_WRITE_ATTRIBUTES = 0x100
+_FILE_SHARE_ALL = 0x1 | 0x2 | 0x4
+_OPEN_EXISTING = 3
+_FILE_FLAG_BACKUP_SEMANTICS = 0x02000000  # Allows opening folders too
+
+# macOS setattrlist
+_ATTR_BIT_MAP_COUNT = 5
+_ATTR_CMN_CRTIME = 0x200
+
+
+def created_time(path_or_stat):
+    """Return a file's creation time, or None where the OS doesn't keep one.
+
+    Args:
+        path_or_stat: A path, or an ``os.stat`` result already taken
+    """
+    stat = path_or_stat if isinstance(path_or_stat, os.stat_result) else os.stat(path_or_stat)
+    birthtime = getattr(stat, 'st_birthtime', None)
+    if birthtime is None and platform.system() == 'Windows':
+        # st_ctime is the creation time on Windows (before Python 3.12)
+        birthtime = stat.st_ctime
+    return birthtime
+
+
+def set_times(path, created=None, modified=None, accessed=None):
+    """Set any of a file's times; None leaves that time as it is.
+
+    Raises:
+        OSError: If the file can't be opened or its times can't be set
+    """
+    if created is None and modified is None and accessed is None:
+        return
+    if platform.system() == 'Windows':
+        _set_windows(path, created, modified, accessed)
+        return
+
+    if modified is not None or accessed is not None:
+        if modified is None or accessed is None:
+            stat = os.stat(path)
+            modified = stat.st_mtime if modified is None else modified
+            accessed = stat.st_atime if accessed is None else accessed
+        os.utime(path, (accessed, modified))
+    # After utime: macOS moves the creation time back to a modified time set earlier
+    if created is not None and platform.system() == 'Darwin':
+        _set_macos_created(path, created)
+
+
+@functools.lru_cache(maxsize=None)
+def _kernel32():
+    import ctypes
+    from ctypes import wintypes
+
+    kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    kernel32.CreateFileW.argtypes = [wintypes.LPCWSTR, wintypes.DWORD, wintypes.DWORD, ctypes.c_void_p,
+                                     wintypes.DWORD, wintypes.DWORD, wintypes.HANDLE]
+    kernel32.CreateFileW.restype = wintypes.HANDLE
+    filetime = ctypes.POINTER(ctypes.c_uint64)
+    kernel32.SetFileTime.argtypes = [wintypes.HANDLE, filetime, filetime, filetime]
+    kernel32.SetFileTime.restype = wintypes.BOOL
+    kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+    return kernel32
+
+
+def _set_windows(path, created, modified, accessed):
+    import ctypes
+
+    def filetime(timestamp):
+        if timestamp is None:
+            return None
+        return ctypes.byref(ctypes.c_uint64(round((timestamp + _FILETIME_EPOCH) * 10_000_000)))
+
+    kernel32 = _kernel32()
+    handle = kernel32.CreateFileW(str(path), _FILE_WRITE_ATTRIBUTES, _FILE_SHARE_ALL, None,
+                                  _OPEN_EXISTING, _FILE_FLAG_BACKUP_SEMANTICS, None)
+    if handle is None or handle == ctypes.c_void_p(-1).value:
+        raise ctypes.WinError(ctypes.get_last_error())
+    try:
+        # SetFileTime(handle, CreationTime, LastAccessTime, LastWriteTime)
+        if not kernel32.SetFileTime(handle, filetime(created), filetime(accessed), filetime(modified)):
+            raise ctypes.WinError(ctypes.get_last_error())
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def _set_macos_created(path, created):
+    import ctypes
+
+    class AttrList(ctypes.Structure):
+        _fields_ = [('bitmapcount', ctypes.c_ushort), ('reserved', ctypes.c_uint16),
+                    ('commonattr', ctypes.c_uint32), ('volattr', ctypes.c_uint32),
+                    ('dirattr', ctypes.c_uint32), ('fileattr', ctypes.c_uint32),
+                    ('forkattr', ctypes.c_uint32)]
+
+    class Timespec(ctypes.Structure):
+        _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+    libc = ctypes.CDLL(None, use_errno=True)
+    attrs = AttrList(bitmapcount=_ATTR_BIT_MAP_COUNT, commonattr=_ATTR_CMN_CRTIME)
+    seconds = int(created // 1)
+    value = Timespec(seconds, int((created - seconds) * 1_000_000_000))
+    if libc.setattrlist(os.fsencode(path), ctypes.byref(attrs), ctypes.byref(value),
+                        ctypes.sizeof(value), 0) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno), str(path))
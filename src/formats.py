@@ -0,0 +1,449 @@
+"""Formats - per-format metadata handlers
+
+Each handler knows, for one family of file types:
+
+    read_native  date/GPS values read by parsing only the boxes or segments
+                 that hold them (None: ask ExifTool, also when a wanted tag
+                 isn't in them)
+    thumbnail    a small Pillow image, decoded from the cheapest source
+                 (embedded preview for RAW, none for video)
+    write tags   which tags the app's date/GPS fields map to, and whether
+                 ExifTool can write the format at all (if not, edits go to
+                 an XMP sidecar)
+
+QuickTime/MP4 values come from ``moov/mvhd``, ``moov/meta`` (Apple keys)
+and ``udta/©xyz``, found by seeking from box header to box header, so a
+multi-GB video costs a few small reads. RAW previews are located through
+the TIFF IFDs (DNG, CR2, NEF, ARW...) or the CR3 ``THMB`` box and only the
+preview bytes are read.
+"""
+
+import io
+import re
+import struct
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from PIL import Image
+
+import timing
+
+
+EXIF_DATETIME_FORMAT = "%Y:%m:%d %H:%M:%S"
+
+# QuickTime header times count seconds from 1904 (UTC)
+_QUICKTIME_EPOCH = datetime(1904, 1, 1, tzinfo=timezone.utc)
+
+_ISO6709 = re.compile(r'([+-]\d+(?:\.\d+)?)([+-]\d+(?:\.\d+)?)')
+
+_CANON_UUID = bytes.fromhex('85c0b687820f11e08111f4ce462b6a48')
+
+
+def _boxes(f, start, end):
+    """Yield (type, payload start, payload end) for the ISO BMFF boxes in a range."""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack('>I4s', header)
+        payload = pos + 8
+        if size == 1:
+            large = f.read(8)
+            if len(large) < 8:
+                return
+            (size,) = struct.unpack('>Q', large)
+            payload += 8
+        elif size == 0:
+            size = end - pos
+        if size < payload - pos:
+            return  # Corrupt box
+        box_end = min(pos + size, end)
+        yield box_type, payload, box_end
+        pos += size
+
+
+def _find(f, start, end, box_type):
+    for found, payload, box_end in _boxes(f, start, end):
+        if found == box_type:
+            return payload, box_end
+    return None
+
+
+def _quicktime_time(seconds):
+    """QuickTime timestamp (UTC seconds since 1904) -> local naive datetime, or None."""
+    if not seconds:
+        return None
+    try:
+        return (_QUICKTIME_EPOCH + timedelta(seconds=seconds)).astimezone().replace(tzinfo=None)
+    except (OverflowError, OSError, ValueError):
+        return None
+
+
+def _parse_iso6709(text):
+    """'+37.3349-122.0090+030.000/' -> (lat, lon), or None."""
+    match = _ISO6709.match(text.strip())
+    if not match:
+        return None
+    lat, lon = float(match.group(1)), float(match.group(2))
+    if abs(lat) > 90 or abs(lon) > 180:
+        return None
+    return lat, lon
+
+
+def _parse_date_text(text):
+    """'2023-05-01T12:34:56+0200' (Apple/©day) -> wall-clock naive datetime, or None."""
+    text = text.strip().replace('T', ' ')[:19]
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y:%m:%d %H:%M:%S'):
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            pass
+    return None
+
+
+def _read_meta(f, start, end):
+    """Return {key: text} from an Apple ``meta`` box (``keys`` + ``ilst``)."""
+    # In MP4 files ``meta`` is a full box with 4 bytes of version/flags
+    f.seek(start + 4)
+    if f.read(4) != b'hdlr':
+        start += 4
+
+    keys = []
+    values = {}
+    keys_box = _find(f, start, end, b'keys')
+    if keys_box:
+        keys_start, keys_end = keys_box
+        f.seek(keys_start + 4)
+        (count,) = struct.unpack('>I', f.read(4))
+        # Every key entry is at least 8 bytes, so the box bounds the count
+        pos = keys_start + 8
+        for _ in range(min(count, (keys_end - pos) // 8, 1024)):
+            size, _namespace = struct.unpack('>I4s', f.read(8))
+            if size < 8 or pos + size > keys_end:
+                break  # Corrupt entry: never read past the box
+            keys.append(f.read(size - 8).decode('utf-8', 'replace'))
+            pos += size
+
+    ilst = _find(f, start, end, b'ilst')
+    if not ilst:
+        return values
+    for item_type, item_start, item_end in _boxes(f, ilst[0], ilst[1]):
+        (index,) = struct.unpack('>I', item_type)
+        if not 1 <= index <= len(keys):
+            continue
+        data = _find(f, item_start, item_end, b'data')
+        if data and 8 <= data[1] - data[0] <= 1024:
+            f.seek(data[0] + 8)  # type indicator, locale
+            values[keys[index - 1]] = f.read(data[1] - data[0] - 8).decode('utf-8', 'replace')
+    return values
+
+
+def _read_udta(f, start, end):
+    """Return {atom: text} for the ``©xyz`` and ``©day`` user data atoms."""
+    values = {}
+    for atom, payload, atom_end in _boxes(f, start, end):
+        if atom in (b'\xa9xyz', b'\xa9day') and 4 <= atom_end - payload <= 1024:
+            f.seek(payload)
+            (length,) = struct.unpack('>H', f.read(2))
+            f.read(2)  # language
+            values[atom] = f.read(min(length, atom_end - payload - 4)).decode('utf-8', 'replace')
+    return values
+
+
+def read_quicktime(file_path):
+    """Read the capture date and location of a QuickTime/MP4 file.
+
+    Returns:
+        {tag: value} in ``exif_ops.read_tags`` form (DateTimeOriginal,
+        CreateDate, ModifyDate, GPSLatitude/Ref, GPSLongitude/Ref)
+    """
+    values = {}
+    with open(file_path, 'rb') as f:
+        f.seek(0, io.SEEK_END)
+        size = f.tell()
+        moov = _find(f, 0, size, b'moov')
+        if not moov:
+            return values
+
+        created = modified = None
+        mvhd = _find(f, moov[0], moov[1], b'mvhd')
+        if mvhd:
+            f.seek(mvhd[0])
+            version = f.read(4)[0]
+            if version == 1:
+                created, modified = struct.unpack('>QQ', f.read(16))
+            else:
+                created, modified = struct.unpack('>II', f.read(8))
+            created, modified = _quicktime_time(created), _quicktime_time(modified)
+
+        meta = _find(f, moov[0], moov[1], b'meta')
+        keys = _read_meta(f, *meta) if meta else {}
+        udta = _find(f, moov[0], moov[1], b'udta')
+        user_data = _read_udta(f, *udta) if udta else {}
+
+    original = (_parse_date_text(keys.get('com.apple.quicktime.creationdate', ''))
+                or _parse_date_text(user_data.get(b'\xa9day', ''))
+                or created)
+    for tag, dt in (('DateTimeOriginal', original), ('CreateDate', created), ('ModifyDate', modified)):
+        if dt is not None:
+            values[tag] = dt.strftime(EXIF_DATETIME_FORMAT)
+
+    location = _parse_iso6709(keys.get('com.apple.quicktime.location.ISO6709', '')
+                              or user_data.get(b'\xa9xyz', ''))
+    if location:
+        lat, lon = location
+        values.update(GPSLatitude=abs(lat), GPSLatitudeRef='N' if lat >= 0 else 'S',
+                      GPSLongitude=abs(lon), GPSLongitudeRef='E' if lon >= 0 else 'W')
+    return values
+
+
+def _tiff_previews(f):
+    """Return [(offset, length)] of the JPEG previews referenced by a TIFF-based RAW."""
+    f.seek(0)
+    head = f.read(8)
+    if head[:2] == b'II':
+        endian = '<'
+    elif head[:2] == b'MM':
+        endian = '>'
+    else:
+        return []
+    (first,) = struct.unpack(endian + 'I', head[4:8])
+    sizes = {3: 2, 4: 4, 13: 4}
+
+    previews = []
+    queue, seen = [first], set()
+    while queue and len(seen) < 32:
+        offset = queue.pop(0)
+        if not offset or offset in seen:
+            continue
+        seen.add(offset)
+        f.seek(offset)
+        raw = f.read(2)
+        if len(raw) < 2:
+            continue
+        (count,) = struct.unpack(endian + 'H', raw)
+        entries = f.read(count * 12)
+        tags = {}
+        for i in range(len(entries) // 12):
+            tag, field_type, n = struct.unpack_from(endian + 'HHI', entries, i * 12)
+            value_bytes = entries[i * 12 + 8:i * 12 + 12]
+            width = sizes.get(field_type)
+            if width is None:
+                continue
+            if n * width <= 4:
+                fmt = endian + ('H' if width == 2 else 'I') * n
+                tags[tag] = list(struct.unpack_from(fmt, value_bytes))
+            elif tag == 0x014A:  # SubIFDs stored elsewhere
+                (pointer,) = struct.unpack(endian + 'I', value_bytes)
+                f.seek(pointer)
+                tags[tag] = list(struct.unpack(endian + 'I' * n, f.read(4 * n)))
+        next_raw = f.read(4)
+        if len(next_raw) == 4:
+            queue.append(struct.unpack(endian + 'I', next_raw)[0])
+        queue.extend(tags.get(0x014A, []))
+
+        if 0x0201 in tags and 0x0202 in tags:
+            previews.append((tags[0x0201][0], tags[0x0202][0]))
+        compression = tags.get(0x0103, [0])[0]
+        reduced = tags.get(0x00FE, [0])[0] == 1
+        if (compression == 6 or (compression == 7 and reduced)) and \
+                len(tags.get(0x0111, [])) == 1 and len(tags.get(0x0117, [])) == 1:
+            previews.append((tags[0x0111][0], tags[0x0117][0]))
+    return previews
+
+
+def _cr3_preview(f):
+    """Return (offset, length) of the JPEG in a CR3's THMB box, or None."""
+    f.seek(0, io.SEEK_END)
+    moov = _find(f, 0, f.tell(), b'moov')
+    if not moov:
+        return None
+    for box_type, start, end in _boxes(f, *moov):
+        if box_type != b'uuid':
+            continue
+        f.seek(start)
+        if f.read(16) != _CANON_UUID:
+            continue
+        thmb = _find(f, start + 16, end, b'THMB')
+        if thmb:
+            f.seek(thmb[0])
+            data = f.read(min(thmb[1] - thmb[0], 64))
+            soi = data.find(b'\xff\xd8')
+            if soi >= 0:
+                return thmb[0] + soi, thmb[1] - thmb[0] - soi
+    return None
+
+
+def _preview_thumbnail(f, candidates, size):
+    """Decode the smallest readable JPEG preview among (offset, length) candidates."""
+    for offset, length in sorted(candidates, key=lambda c: c[1]):
+        if length < 512:
+            continue
+        f.seek(offset)
+        data = f.read(length)
+        if not data.startswith(b'\xff\xd8'):
+            continue
+        img = Image.open(io.BytesIO(data))
+        # Let the JPEG decoder skip detail the thumbnail won't show
+        img.draft('RGB', (size[0] * 2, size[1] * 2))
+        img.thumbnail(size)
+        return img
+    raise ValueError("No embedded preview")
+
+
+class FormatHandler:
+    """Still images Pillow can open and ExifTool can write (JPEG, PNG, TIFF...)."""
+
+    name = 'image'
+    extensions = ('.jpg', '.jpeg', '.png', '.gif', '.tiff', '.tif', '.webp')
+    icon = '📷'
+    # False: ExifTool can't write the format, so edits go to an XMP sidecar
+    writable = True
+
+    # App date field -> tags written (the field itself for EXIF formats)
+    datetime_tags = {}
+    gps_tags = ()
+
+    def read_native(self, file_path, tags=None):
+        """Return {tag: value} without ExifTool, or None if ExifTool is needed.
+
+        Args:
+            tags: Tags wanted; if any of them can't be read natively, None
+        """
+        return None
+
+    def thumbnail(self, file_path, size):
+        with timing.span('file.open'):
+            img = Image.open(file_path)
+        # Pillow decodes lazily, so the pixel data is read here
+        with timing.span('thumbnail.decode'):
+            img.thumbnail(size)
+        return img
+
+    def tags_for(self, fields):
+        """Map app field names (DateTimeOriginal, GPSLatitude...) to the tags written."""
+        tags = []
+        for field in fields:
+            if field.startswith('GPS') and field != 'GPSDateStamp' and self.gps_tags:
+                mapped = self.gps_tags
+            else:
+                mapped = self.datetime_tags.get(field, (field,))
+            tags.extend(t for t in mapped if t not in tags)
+        return tags
+
+    def datetime_args(self, fields, value, op='='):
+        """ExifTool arguments setting (or shifting, with op '+='/'-=') date fields."""
+        return [f"-{tag}{op}{value}" for tag in self.tags_for(fields)]
+
+    def gps_args(self, lat, lon):
+        return [
+            f"-GPSLatitude={abs(lat)}",
+            f"-GPSLatitudeRef={'N' if lat >= 0 else 'S'}",
+            f"-GPSLongitude={abs(lon)}",
+            f"-GPSLongitudeRef={'E' if lon >= 0 else 'W'}",
+        ]
+
+
+class BitmapHandler(FormatHandler):
+    """BMP: no metadata ExifTool can write, so edits always go to a sidecar."""
+
+    name = 'bitmap'
+    extensions = ('.bmp',)
+    writable = False
+
+
+class HeifHandler(FormatHandler):
+    """HEIC/HEIF phone photos. Thumbnails need the optional ``pillow-heif``."""
+
+    name = 'heif'
+    extensions = ('.heic', '.heif', '.hif')
+
+    def thumbnail(self, file_path, size):
+        try:
+            import pillow_heif
+        except ImportError:
+            raise ValueError("Install pillow-heif for HEIC thumbnails")
+        pillow_heif.register_heif_opener()
+        return super().thumbnail(file_path, size)
+
+
+class RawHandler(FormatHandler):
+    """Camera RAW; thumbnails come from the embedded JPEG preview."""
+
+    name = 'raw'
+    extensions = ('.dng', '.cr2', '.cr3', '.nef', '.arw', '.orf', '.rw2', '.raf', '.pef')
+    icon = '🎞️'
+
+    def thumbnail(self, file_path, size):
+        with timing.span('thumbnail.preview'):
+            with open(file_path, 'rb') as f:
+                if Path(file_path).suffix.lower() == '.cr3':
+                    preview = _cr3_preview(f)
+                    candidates = [preview] if preview else []
+                elif Path(file_path).suffix.lower() == '.raf':
+                    # Fujifilm: JPEG offset/length at fixed header positions
+                    f.seek(84)
+                    candidates = [struct.unpack('>II', f.read(8))]
+                else:
+                    candidates = _tiff_previews(f)
+                return _preview_thumbnail(f, candidates, size)
+
+
+class QuickTimeHandler(FormatHandler):
+    """MP4/MOV video. Dates live in the QuickTime header (UTC) and Apple keys."""
+
+    name = 'video'
+    extensions = ('.mp4', '.mov', '.m4v', '.3gp')
+    icon = '🎬'
+
+    datetime_tags = {
+        'DateTimeOriginal': ('Keys:CreationDate', 'QuickTime:CreateDate'),
+        'CreateDate': ('QuickTime:CreateDate', 'QuickTime:TrackCreateDate', 'QuickTime:MediaCreateDate'),
+        'ModifyDate': ('QuickTime:ModifyDate', 'QuickTime:TrackModifyDate', 'QuickTime:MediaModifyDate'),
+        'GPSDateStamp': (),
+    }
+    gps_tags = ('Keys:GPSCoordinates', 'UserData:GPSCoordinates')
+
+    def read_native(self, file_path, tags=None):
+        with timing.span('quicktime.read'):
+            values = read_quicktime(file_path)
+        # Other tags (FileModifyDate, QuickTime:...) and missing boxes go to ExifTool
+        if tags is not None and any(tag not in values for tag in tags):
+            return None
+        return values
+
+    def thumbnail(self, file_path, size):
+        raise ValueError("No thumbnails for video")
+
+    def datetime_args(self, fields, value, op='='):
+        # Dates are given in local time; QuickTimeUTC converts the header dates
+        args = ['-api', 'QuickTimeUTC']
+        for tag in self.tags_for(fields):
+            if tag == 'Keys:CreationDate' and op == '=':
+                # Apple's creation date carries the time zone
+                local = datetime.strptime(value, EXIF_DATETIME_FORMAT).astimezone()
+                offset = local.strftime('%z')
+                args.append(f"-{tag}={value}{offset[:3]}:{offset[3:]}")
+            else:
+                args.append(f"-{tag}{op}{value}")
+        return args
+
+    def gps_args(self, lat, lon):
+        return [f"-{tag}={lat}, {lon}" for tag in self.gps_tags]
+
+
+HANDLERS = [FormatHandler(), BitmapHandler(), HeifHandler(), RawHandler(), QuickTimeHandler()]
+
+_BY_EXTENSION = {ext: handler for handler in HANDLERS for ext in handler.extensions}
+
+# Every extension the file browser lists
+EXTENSIONS = frozenset(_BY_EXTENSION)
+
+DEFAULT_HANDLER = HANDLERS[0]
+
+
+def handler_for(file_path):
+    """Return the FormatHandler for a file (by extension)."""
+    return _BY_EXTENSION.get(Path(file_path).suffix.lower(), DEFAULT_HANDLER)
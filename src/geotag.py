@@ -0,0 +1,332 @@
+"""Geotag - match photo times to GPS tracks
+
+Tracks are loaded from GPX or CSV files into sorted NumPy arrays of
+(UTC seconds, latitude, longitude). Photos are matched in one vectorised
+pass: ``searchsorted`` finds the track points either side of each photo's
+time, and the position is linearly interpolated between them unless they
+are more than ``max_gap`` seconds apart.
+
+Photo times come from DateTimeOriginal, which has no time zone; the camera
+offset (time zone plus any clock error) converts them to UTC.
+"""
+
+import csv
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+import exif_ops
+import preflight
+
+
+# Seconds between track points beyond which a photo isn't interpolated
+DEFAULT_MAX_GAP = 300
+
+TRACK_EXTENSIONS = ('.gpx', '.csv')
+
+_CSV_TIME_COLUMNS = ('time', 'timestamp', 'datetime', 'date_time', 'utc')
+_CSV_LAT_COLUMNS = ('lat', 'latitude')
+_CSV_LON_COLUMNS = ('lon', 'lng', 'long', 'longitude')
+
+
+class TrackError(Exception):
+    """A track file couldn't be read."""
+
+
+class Track:
+    """GPS points sorted by time, as parallel NumPy arrays."""
+
+    def __init__(self, times, lats, lons):
+        order = np.argsort(times, kind='stable')
+        self.times = np.asarray(times, dtype=np.float64)[order]
+        self.lats = np.asarray(lats, dtype=np.float64)[order]
+        self.lons = np.asarray(lons, dtype=np.float64)[order]
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def start(self):
+        return datetime.fromtimestamp(self.times[0], timezone.utc) if len(self) else None
+
+    @property
+    def end(self):
+        return datetime.fromtimestamp(self.times[-1], timezone.utc) if len(self) else None
+
+    def match(self, photo_times, max_gap=DEFAULT_MAX_GAP):
+        """Find the position of each photo on the track.
+
+        Args:
+            photo_times: UTC POSIX seconds per photo (NaN for unknown)
+            max_gap: Largest time between the two bracketing track points
+                (or to the nearest end of the track) that is still matched
+
+        Returns:
+            (lats, lons, matched) arrays; lats/lons are NaN where unmatched
+        """
+        t = np.asarray(photo_times, dtype=np.float64)
+        lats = np.full(t.shape, np.nan)
+        lons = np.full(t.shape, np.nan)
+        if not len(self):
+            return lats, lons, np.zeros(t.shape, dtype=bool)
+
+        times = self.times
+        right = np.searchsorted(times, t, side='left')
+        right = np.clip(right, 0, len(times) - 1)
+        left = np.clip(right - 1, 0, len(times) - 1)
+
+        # Before the first point or after the last, use the nearest end point
+        before = t <= times[0]
+        after = t >= times[-1]
+        left = np.where(before, 0, np.where(after, len(times) - 1, left))
+        right = np.where(before, 0, np.where(after, len(times) - 1, right))
+
+        t_left = times[left]
+        t_right = times[right]
+        span = t_right - t_left
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fraction = np.where(span > 0, (t - t_left) / span, 0.0)
+
+        gap = np.where(before | after, np.abs(t - t_left), span)
+        matched = ~np.isnan(t) & (gap <= max_gap)
+
+        lats[matched] = (self.lats[left] + fraction * (self.lats[right] - self.lats[left]))[matched]
+        lons[matched] = (self.lons[left] + fraction * (self.lons[right] - self.lons[left]))[matched]
+        return lats, lons, matched
+
+
+def _parse_time(value):
+    """Parse an ISO 8601 time (or POSIX seconds) to UTC POSIX seconds."""
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def load_gpx(path):
+    """Read all track, route and way points with a time from a GPX file."""
+    times, lats, lons = [], [], []
+    try:
+        # iterparse keeps memory flat for tracks with millions of points
+        for _, elem in ET.iterparse(path, events=('end',)):
+            tag = elem.tag.rsplit('}', 1)[-1]
+            if tag not in ('trkpt', 'rtept', 'wpt'):
+                continue
+            time_text = None
+            for child in elem:
+                if child.tag.rsplit('}', 1)[-1] == 'time':
+                    time_text = child.text
+                    break
+            if time_text:
+                times.append(_parse_time(time_text))
+                lats.append(float(elem.get('lat')))
+                lons.append(float(elem.get('lon')))
+            elem.clear()
+    except (ET.ParseError, ValueError, TypeError) as e:
+        raise TrackError(f"{Path(path).name}: {e}")
+    return times, lats, lons
+
+
+def _find_column(fieldnames, candidates):
+    for name in fieldnames:
+        if name.strip().lower() in candidates:
+            return name
+    return None
+
+
+def load_csv(path):
+    """Read a CSV with time, latitude and longitude columns (names are flexible)."""
+    times, lats, lons = [], [], []
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames or []
+        time_col = _find_column(fieldnames, _CSV_TIME_COLUMNS)
+        lat_col = _find_column(fieldnames, _CSV_LAT_COLUMNS)
+        lon_col = _find_column(fieldnames, _CSV_LON_COLUMNS)
+        if not (time_col and lat_col and lon_col):
+            raise TrackError(f"{Path(path).name}: needs time, latitude and longitude columns")
+        try:
+            for row in reader:
+                if not row[time_col]:
+                    continue
+                times.append(_parse_time(row[time_col]))
+                lats.append(float(row[lat_col]))
+                lons.append(float(row[lon_col]))
+        except (ValueError, TypeError) as e:
+            # TypeError: a short row leaves its missing columns None
+            raise TrackError(f"{Path(path).name} line {reader.line_num}: {e}")
+    return times, lats, lons
+
+
+def load_tracks(paths):
+    """Load and merge GPX/CSV files into one Track.
+
+    Raises:
+        TrackError: If a file can't be read
+    """
+    times, lats, lons = [], [], []
+    for path in paths:
+        if Path(path).suffix.lower() == '.csv':
+            t, la, lo = load_csv(path)
+        else:
+            t, la, lo = load_gpx(path)
+        times.extend(t)
+        lats.extend(la)
+        lons.extend(lo)
+    return Track(times, lats, lons)
+
+
+def parse_offset(text):
+    """Parse a camera offset like '+08:00', '-5', '+10:30:15' to seconds."""
+    text = text.strip()
+    sign = -1 if text.startswith('-') else 1
+    parts = text.lstrip('+-').split(':')
+    if not 1 <= len(parts) <= 3 or not all(p.strip().isdigit() for p in parts):
+        raise ValueError(f"Invalid offset: {text!r} (use +HH:MM)")
+    hours, minutes, seconds = (int(p) for p in parts + ['0'] * (3 - len(parts)))
+    return sign * (hours * 3600 + minutes * 60 + seconds)
+
+
+def format_offset(seconds):
+    sign = '-' if seconds < 0 else '+'
+    seconds = abs(int(seconds))
+    text = f"{sign}{seconds // 3600:02d}:{seconds % 3600 // 60:02d}"
+    return text + (f":{seconds % 60:02d}" if seconds % 60 else '')
+
+
+def local_utc_offset():
+    """The computer's current UTC offset in seconds, a sensible default camera offset."""
+    return int(datetime.now().astimezone().utcoffset().total_seconds())
+
+
+def photo_times_utc(camera_times, offset_seconds):
+    """Convert camera datetimes (naive, None if unknown) to UTC POSIX seconds.
+
+    The naive times are treated as UTC and the offset subtracted, so the
+    result doesn't depend on the computer's time zone.
+    """
+    epoch = datetime(1970, 1, 1)
+    return np.array([
+        (dt - epoch).total_seconds() - offset_seconds if dt is not None else np.nan
+        for dt in camera_times
+    ], dtype=np.float64)
+
+
+def plan(files, track, offset_seconds, max_gap=DEFAULT_MAX_GAP):
+    """Match files to a track and drop those that already hold the position.
+
+    Reads DateTimeOriginal and the current GPS tags in one batched pass.
+
+    Returns:
+        (to_change, unchanged, unmatched) - lists of (file, lat, lon) tuples,
+        and the files with no date or no track point close enough in time
+    """
+    current = preflight.read_current(files, ('DateTimeOriginal',) + preflight.GPS_TAGS)
+    tags = [current.get(exif_ops.path_key(file_path), {}) for file_path in files]
+    camera_times = [preflight.parse_exif_datetime(t.get('DateTimeOriginal', '')) for t in tags]
+
+    lats, lons, matched = track.match(photo_times_utc(camera_times, offset_seconds), max_gap)
+
+    to_change, unchanged, unmatched = [], [], []
+    for i, file_path in enumerate(files):
+        if not matched[i]:
+            unmatched.append(file_path)
+            continue
+        lat, lon = round(float(lats[i]), 6), round(float(lons[i]), 6)
+        if preflight.gps_matches(lat, lon, tags[i]):
+            unchanged.append((file_path, lat, lon))
+        else:
+            to_change.append((file_path, lat, lon))
+    return to_change, unchanged, unmatched
+
+
+# Largest time between an untagged photo and a tagged one it borrows GPS from
+DEFAULT_INFER_WINDOW = 30 * 60
+
+
+def nearest_in_time(ref_times, times, window):
+    """Find the nearest reference time to each time, vectorised.
+
+    Args:
+        ref_times: Sorted reference times (seconds)
+        times: Times to look up (NaN for unknown)
+        window: Largest difference that still counts as a match
+
+    Returns:
+        (indices into ref_times, absolute differences, matched mask)
+    """
+    times = np.asarray(times, dtype=np.float64)
+    if not len(ref_times):
+        empty = np.zeros(times.shape, dtype=np.int64)
+        return empty, np.full(times.shape, np.inf), np.zeros(times.shape, dtype=bool)
+
+    right = np.clip(np.searchsorted(ref_times, times), 0, len(ref_times) - 1)
+    left = np.clip(right - 1, 0, len(ref_times) - 1)
+    left_diff = np.abs(times - ref_times[left])
+    right_diff = np.abs(ref_times[right] - times)
+
+    use_right = right_diff < left_diff
+    nearest = np.where(use_right, right, left)
+    diff = np.where(use_right, right_diff, left_diff)
+    matched = ~np.isnan(times) & (diff <= window)
+    return nearest, diff, matched
+
+
+def plan_infer(files, library_files, window=DEFAULT_INFER_WINDOW):
+    """Give untagged files the GPS of the geotagged photo nearest in time.
+
+    Both sets of times are camera-local DateTimeOriginal, so cameras must
+    have been on roughly the same clock.
+
+    Args:
+        files: Selected files to fill in
+        library_files: Files to borrow coordinates from (e.g. the whole folder tree)
+        window: Largest time difference in seconds
+
+    Returns:
+        (to_change, already_tagged, unmatched) - to_change is a list of
+        (file, lat, lon, source file, seconds apart)
+    """
+    wanted = {exif_ops.path_key(f): f for f in files}
+    everything = list(files) + [f for f in library_files if exif_ops.path_key(f) not in wanted]
+    current = preflight.read_current(everything, ('DateTimeOriginal',) + preflight.GPS_TAGS)
+
+    # Reference points: every file with both a date and GPS
+    ref = []
+    for file_path in everything:
+        tags = current.get(exif_ops.path_key(file_path), {})
+        dt = preflight.parse_exif_datetime(tags.get('DateTimeOriginal', ''))
+        gps = preflight.signed_gps(tags)
+        if dt is not None and gps is not None:
+            ref.append((dt, gps[0], gps[1], file_path))
+    ref.sort(key=lambda r: r[0])
+    ref_times = photo_times_utc([r[0] for r in ref], 0)
+
+    targets, already_tagged, unmatched = [], [], []
+    for file_path in files:
+        tags = current.get(exif_ops.path_key(file_path), {})
+        if preflight.signed_gps(tags) is not None:
+            already_tagged.append(file_path)
+        else:
+            targets.append((file_path, preflight.parse_exif_datetime(tags.get('DateTimeOriginal', ''))))
+
+    times = photo_times_utc([dt for _, dt in targets], 0)
+    nearest, diff, matched = nearest_in_time(ref_times, times, window)
+
+    to_change = []
+    for i, (file_path, _) in enumerate(targets):
+        if not matched[i]:
+            unmatched.append(file_path)
+            continue
+        _, lat, lon, source = ref[nearest[i]]
+        to_change.append((file_path, round(lat, 6), round(lon, 6), source, float(diff[i])))
+    return to_change, already_tagged, unmatched
@@ -0,0 +1,263 @@
+"""Immich Sync - push date and location edits to an Immich server
+
+Immich only notices edited files when it rescans the library, and a
+rewritten original gets a new checksum. With push mode on, the assets behind
+the edited files are updated through the Immich API instead (or as well):
+
+    after  edit the files, then push the new values
+    only   push the new values and leave the files alone
+
+Files are matched to assets by SHA-1 checksum (one bulk-upload-check request
+per batch) or by their path on the server (see ``config.immich_path_map``).
+Updates with the same values are sent together through the bulk asset
+update endpoint. All requests share a small pool of keep-alive connections,
+which also bounds the concurrency.
+"""
+
+import http.client
+import json
+import queue
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import checksums
+import config
+import exif_ops
+import timing
+
+
+# Connections (and so requests in flight) per server
+MAX_CONNECTIONS = 8
+
+# Asset ids or checksums per bulk request
+BULK_SIZE = 500
+
+REQUEST_TIMEOUT = 30
+
+
+class ImmichError(Exception):
+    """The Immich server rejected a request or couldn't be reached."""
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections to one server, reused across threads."""
+
+    def __init__(self, base_url, size=MAX_CONNECTIONS):
+        parts = urlsplit(base_url)
+        self._https = parts.scheme == 'https'
+        self._host = parts.hostname
+        self._port = parts.port
+        self.prefix = parts.path.rstrip('/')
+        self._idle = queue.LifoQueue()
+        self._slots = queue.Queue()
+        for _ in range(size):
+            self._slots.put(None)
+        self.connections_opened = 0
+
+    def _connect(self):
+        self.connections_opened += 1
+        cls = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+        return cls(self._host, self._port, timeout=REQUEST_TIMEOUT)
+
+    def request(self, method, path, body=None, headers=None):
+        """Send a request and return (status, response bytes).
+
+        Blocks while all connections are busy. A reused connection that the
+        server has closed is retried once on a fresh one.
+        """
+        self._slots.get()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+                reused = True
+            except queue.Empty:
+                conn = self._connect()
+                reused = False
+
+            for attempt in (1, 2):
+                try:
+                    conn.request(method, self.prefix + path, body=body, headers=headers or {})
+                    response = conn.getresponse()
+                    data = response.read()
+                    break
+                except (http.client.HTTPException, ConnectionError) as e:
+                    conn.close()
+                    if attempt == 2 or not reused:
+                        raise ImmichError(f"{method} {path}: {e}")
+                    conn = self._connect()
+                except OSError as e:
+                    conn.close()
+                    raise ImmichError(f"{method} {path}: {e}")
+
+            if response.will_close:
+                conn.close()
+            else:
+                self._idle.put(conn)
+            return response.status, data
+        finally:
+            self._slots.put(None)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class ImmichClient:
+    """The few Immich API calls push mode needs."""
+
+    def __init__(self, base_url, api_key, max_connections=MAX_CONNECTIONS):
+        self.pool = ConnectionPool(base_url, max_connections)
+        self.max_connections = max_connections
+        self._headers = {
+            'x-api-key': api_key,
+            'Content-Type': 'application/json',
+            'Accept': 'application/json',
+        }
+
+    def _call(self, method, path, payload=None):
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        with timing.span('immich.request', method=method, path=path):
+            status, data = self.pool.request(method, path, body, self._headers)
+        if status >= 400:
+            raise ImmichError(f"{method} {path}: HTTP {status} {data[:200].decode('utf-8', 'replace')}")
+        return json.loads(data) if data else None
+
+    def ping(self):
+        return self._call('GET', '/api/server/ping')
+
+    def find_checksums(self, checksums):
+        """Return {checksum: asset id} for checksums Immich already has."""
+        found = {}
+        results = self._call('POST', '/api/assets/bulk-upload-check', {
+            'assets': [{'id': checksum, 'checksum': checksum} for checksum in checksums]
+        })
+        for result in results.get('results', []):
+            if result.get('assetId'):
+                found[result['id']] = result['assetId']
+        return found
+
+    def find_path(self, server_path):
+        """Return the id of the asset at ``server_path``, or None."""
+        results = self._call('POST', '/api/search/metadata', {'originalPath': server_path, 'size': 2})
+        for asset in results.get('assets', {}).get('items', []):
+            if asset.get('originalPath') == server_path:
+                return asset['id']
+        return None
+
+    def update_assets(self, ids, fields):
+        """Set the same fields (dateTimeOriginal, latitude, longitude) on many assets."""
+        self._call('PUT', '/api/assets', dict(fields, ids=list(ids)))
+
+    def map(self, func, items):
+        """Run ``func`` over items with at most ``max_connections`` in flight."""
+        with ThreadPoolExecutor(max_workers=self.max_connections) as executor:
+            return list(executor.map(func, items))
+
+    def close(self):
+        self.pool.close()
+
+
+def client_from_config():
+    """Return an ImmichClient for the configured server, or None."""
+    server = config.immich_server()
+    if server is None:
+        return None
+    return ImmichClient(*server)
+
+
+def to_server_path(file_path, path_map):
+    """Translate a local path to the server's path, or None if no prefix matches."""
+    local = str(file_path).replace('\\', '/')
+    for local_prefix, server_prefix in path_map:
+        prefix = local_prefix.replace('\\', '/').rstrip('/')
+        if local.lower().startswith(prefix.lower() + '/'):
+            return server_prefix.rstrip('/') + local[len(prefix):]
+    return None
+
+
+def match_assets(client, files, method=None):
+    """Find the Immich asset of each file.
+
+    Args:
+        client: ImmichClient
+        files: Local file paths
+        method: 'checksum' or 'path'; defaults to config.immich_match()
+
+    Returns:
+        {exif_ops.path_key(file): asset id} for the files Immich knows
+    """
+    method = method or config.immich_match()
+    matched = {}
+
+    if method == 'path':
+        path_map = config.immich_path_map()
+        pairs = [(f, to_server_path(f, path_map)) for f in files]
+        pairs = [(f, server_path) for f, server_path in pairs if server_path]
+        ids = client.map(lambda pair: client.find_path(pair[1]), pairs)
+        for (file_path, _), asset_id in zip(pairs, ids):
+            if asset_id:
+                matched[exif_ops.path_key(file_path)] = asset_id
+        return matched
+
+    # Hash in parallel (I/O bound), then look checksums up in bulk
+    with timing.span('immich.hash', files=len(files)):
+        with ThreadPoolExecutor(max_workers=client.max_connections) as executor:
+            file_checksums = list(executor.map(checksums.sha1_file, files))
+    batches = [file_checksums[i:i + BULK_SIZE] for i in range(0, len(file_checksums), BULK_SIZE)]
+    found = {}
+    for result in client.map(client.find_checksums, batches):
+        found.update(result)
+    for file_path, checksum in zip(files, file_checksums):
+        if checksum in found:
+            matched[exif_ops.path_key(file_path)] = found[checksum]
+    return matched
+
+
+def push_updates(client, updates):
+    """Send asset updates, grouping identical values into bulk requests.
+
+    Args:
+        client: ImmichClient
+        updates: List of (asset id, fields dict)
+
+    Returns:
+        (pushed, errors) - number of assets updated and error messages
+    """
+    groups = defaultdict(list)
+    for asset_id, fields in updates:
+        groups[json.dumps(fields, sort_keys=True)].append(asset_id)
+
+    requests = []
+    for key, ids in groups.items():
+        fields = json.loads(key)
+        for i in range(0, len(ids), BULK_SIZE):
+            requests.append((ids[i:i + BULK_SIZE], fields))
+
+    def send(request):
+        ids, fields = request
+        try:
+            client.update_assets(ids, fields)
+            return len(ids), None
+        except ImmichError as e:
+            return 0, f"{len(ids)} asset(s): {e}"
+
+    pushed = 0
+    errors = []
+    for count, error in client.map(send, requests):
+        pushed += count
+        if error:
+            errors.append(error)
+    return pushed, errors
+
+
+def datetime_fields(dt):
+    """Immich update fields for a new DateTimeOriginal (local time of this computer)."""
+    return {'dateTimeOriginal': dt.astimezone().isoformat()}
+
+
+def gps_fields(lat, lon):
+    return {'latitude': lat, 'longitude': lon}
@@ -0,0 +1,269 @@
+"""Indexer - keep the library index warm in the background
+
+Crawls the library roots (``config.library_roots``) folder by folder and
+indexes new or changed files into ``library``, without getting in the way:
+
+- the crawl thread and its ExifTool process run at low priority (Windows
+  background mode lowers I/O priority too; on Linux I/O priority follows
+  the nice value)
+- after each batch it idles ``throttle`` seconds per second of work
+- it waits while a write job runs, in this process (``jobs.running``) or
+  another one (``manifest.recently_active``)
+- after each folder its position is saved in ``<data dir>/indexer.json``,
+  so a restart carries on where it stopped; a finished root is crawled
+  again after ``RESCAN_INTERVAL``
+
+Only files whose size or mtime changed are read again, so a rescan of an
+unchanged library costs a directory walk and a ``stat`` per file.
+
+It runs on a thread inside the GUI, or headless:
+
+    python src/indexer.py [ROOT ...] [--once] [--throttle SECONDS]
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from pathlib import Path
+
+import config
+import exif_ops
+import jobs
+import library
+import manifest
+
+
+# Seconds between full crawls of a root
+RESCAN_INTERVAL = 6 * 3600
+
+# Files read per ExifTool call; small so pauses and the throttle take effect quickly
+CHUNK = 100
+
+# Seconds between checks while a write job is running
+JOB_POLL = 2.0
+
+# Windows priority modes (lower CPU and I/O priority)
+_THREAD_MODE_BACKGROUND_BEGIN = 0x00010000
+_PROCESS_MODE_BACKGROUND_BEGIN = 0x00100000
+
+
+def lower_thread_priority():
+    """Give the calling thread background priority (best effort)."""
+    try:
+        if platform.system() == 'Windows':
+            import ctypes
+            kernel32 = ctypes.windll.kernel32
+            kernel32.SetThreadPriority(kernel32.GetCurrentThread(), _THREAD_MODE_BACKGROUND_BEGIN)
+        elif platform.system() == 'Linux':
+            # Linux applies the nice value to the thread id alone
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+    except (AttributeError, OSError):
+        pass
+
+
+def lower_process_priority():
+    """Give the whole process background priority (headless indexer)."""
+    try:
+        if platform.system() == 'Windows':
+            import ctypes
+            kernel32 = ctypes.windll.kernel32
+            kernel32.SetPriorityClass(kernel32.GetCurrentProcess(), _PROCESS_MODE_BACKGROUND_BEGIN)
+        else:
+            os.nice(10)
+    except (AttributeError, OSError):
+        pass
+
+
+def _checkpoint_path():
+    return config.data_dir() / 'indexer.json'
+
+
+def _walk(root, errors):
+    """Yield (folder, image files) for ``root`` and its subfolders in a stable order."""
+    for folder, dirs, names in os.walk(root, onerror=errors.append):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        yield Path(folder), [Path(folder) / name for name in sorted(names)
+                             if os.path.splitext(name)[1].lower() in exif_ops.IMAGE_EXTENSIONS
+                             and not name.startswith('.')]
+
+
+class Indexer:
+    """Background crawler for the library index.
+
+    Args:
+        roots: Folders to crawl
+        throttle: Seconds to idle per second of work (default ``config.index_throttle``)
+        on_status: Optional ``on_status(text)``, called from the indexer thread
+    """
+
+    def __init__(self, roots, throttle=None, on_status=None):
+        self.roots = [Path(root) for root in roots]
+        self.throttle = config.index_throttle() if throttle is None else throttle
+        self.on_status = on_status
+        self.indexed = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._checkpoints = self._load_checkpoints()
+
+    def start(self):
+        """Run the indexer on a background thread."""
+        self._thread = threading.Thread(target=self.run, name='indexer', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        """Stop after the current batch (its folder is indexed again next time)."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _status(self, text):
+        if self.on_status:
+            self.on_status(text)
+
+    def _load_checkpoints(self):
+        try:
+            with open(_checkpoint_path(), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_checkpoints(self):
+        temp = _checkpoint_path().with_suffix('.tmp')
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(self._checkpoints, f)
+        os.replace(temp, _checkpoint_path())
+
+    def _due(self, root):
+        """Seconds until a root should be crawled again (0: now)."""
+        finished = self._checkpoints.get(exif_ops.path_key(root), {}).get('finished')
+        if finished is None:
+            return 0
+        return max(0, finished + RESCAN_INTERVAL - time.time())
+
+    def _wait_turn(self):
+        """Wait while a write job runs. Returns False if the indexer was stopped."""
+        while jobs.running() or manifest.recently_active():
+            self._status("📚 Library indexing paused while a job runs")
+            if self._stop.wait(JOB_POLL):
+                return False
+        return not self._stop.is_set()
+
+    def _idle(self, busy):
+        self._stop.wait(busy * self.throttle)
+
+    def run(self, once=False):
+        """Crawl the roots until stopped (or once, with ``once``)."""
+        lower_thread_priority()
+        pool = exif_ops.ExifToolPool(low_priority=True)
+        pool.bind()
+        conn = library.connect()
+        try:
+            while not self._stop.is_set():
+                for root in self.roots:
+                    if self._stop.is_set():
+                        break
+                    if once or not self._due(root):
+                        self.index_root(conn, root)
+                if once:
+                    break
+                count = library.stats(conn)[0]
+                self._status(f"📚 Library: {count} file(s) indexed")
+                self._stop.wait(max(60, min(self._due(root) for root in self.roots)) if self.roots else None)
+        finally:
+            conn.close()
+            pool.close()
+
+    def index_root(self, conn, root):
+        """Crawl one root, resuming after its checkpoint.
+
+        Returns:
+            True if the crawl finished
+        """
+        if not root.is_dir():
+            self._status(f"📚 Library root not reachable: {root}")
+            return False
+
+        state = self._checkpoints.setdefault(exif_ops.path_key(root), {})
+        resume_after = tuple(state.get('folder') or ())
+        folders = []
+        errors = []
+        for folder, files in _walk(root, errors):
+            folders.append(folder)
+            position = folder.relative_to(root).parts
+            # The walk is sorted, so everything up to the checkpoint was done
+            if resume_after and position <= resume_after:
+                continue
+            if not self.index_folder(conn, folder, files):
+                return False
+            state['folder'] = list(position)
+            self._save_checkpoints()
+
+        # Deleted folders; skipped if part of the tree couldn't be listed
+        if not errors:
+            library.remove_missing_folders(conn, root, folders)
+        state.clear()
+        state['finished'] = time.time()
+        self._save_checkpoints()
+        return True
+
+    def index_folder(self, conn, folder, files):
+        """Index the new and changed files of one folder.
+
+        Returns:
+            False if the indexer was stopped
+        """
+        if not self._wait_turn():
+            return False
+        begin = time.perf_counter()
+        changed = library.changed_files(conn, files)
+        self._idle(time.perf_counter() - begin)
+
+        for i in range(0, len(changed), CHUNK):
+            if not self._wait_turn():
+                return False
+            chunk = changed[i:i + CHUNK]
+            self._status(f"📚 Indexing {folder} ({i + len(chunk)}/{len(changed)})")
+            begin = time.perf_counter()
+            try:
+                current = exif_ops.read_tags([f for f, _ in chunk], library.TAGS)
+            except Exception:
+                continue  # Left unindexed, so tried again next crawl
+            library.store(conn, chunk, current)
+            self.indexed += len(chunk)
+            self._idle(time.perf_counter() - begin)
+
+        library.remove_missing_in_folder(conn, folder, files)
+        return True
+
+
+def main():
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Index the photo library in the background")
+    parser.add_argument('roots', nargs='*', type=Path,
+                        help='Folders to index (default: IMMICH_EXIF_LIBRARY_ROOTS)')
+    parser.add_argument('--once', action='store_true', help='Crawl once and exit')
+    parser.add_argument('--throttle', type=float, default=None,
+                        help='Seconds to idle per second of work (default: IMMICH_EXIF_INDEX_THROTTLE or 2)')
+    args = parser.parse_args()
+
+    roots = args.roots or config.library_roots()
+    if not roots:
+        parser.error("no library roots (pass folders or set IMMICH_EXIF_LIBRARY_ROOTS)")
+
+    lower_process_priority()
+    indexer = Indexer(roots, args.throttle, on_status=lambda text: print(text, file=sys.stderr))
+    try:
+        indexer.run(once=args.once)
+    except KeyboardInterrupt:
+        pass
+    print(f"Indexed {indexer.indexed} file(s)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
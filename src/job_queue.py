@@ -0,0 +1,164 @@
+"""Job Queue - run write jobs in priority order, with pause, resume and cancel
+
+Every write job is added to the queue with its manifest, which already holds
+its tasks and which of them are committed. The queue adds its own state to
+the manifest (priority, paused), so after the app closes the same jobs come
+back queued, in the same state, and carry on with the files not yet done.
+
+Up to ``config.job_slots`` unpaused jobs run at once. A waiting job starts
+when a slot is free, no waiting job is ahead of it (higher priority, or the
+same priority and queued earlier) and no running job is writing the same
+files.
+
+    with queue.turn(job):       # waits for the job's turn
+        jobs.run_batch(..., cancel_event=job.cancel_event,
+                       pause_event=job.pause_event)
+"""
+
+import itertools
+import threading
+from contextlib import contextmanager
+
+import config
+
+
+# Priority labels -> sort order (lower runs first)
+PRIORITIES = {'high': 0, 'normal': 1, 'low': 2}
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+FINISHED = 'finished'
+CANCELLED = 'cancelled'
+
+
+class Job:
+    """A write job in the queue (made by ``JobQueue.add``).
+
+    ``state`` is QUEUED, RUNNING, FINISHED or CANCELLED; a queued or running
+    job can also be paused.
+    """
+
+    def __init__(self, queue, job_manifest, priority, number):
+        self.queue = queue
+        self.manifest = job_manifest
+        self.priority = priority if priority in PRIORITIES else 'normal'
+        self.number = number
+        self.state = QUEUED
+        self.cancel_event = threading.Event()
+        self.pause_event = threading.Event()
+        self.files = {str(task[0]) for task in job_manifest.tasks}
+
+    @property
+    def name(self):
+        return self.manifest.job_name
+
+    @property
+    def paused(self):
+        return self.pause_event.is_set()
+
+    def pause(self):
+        """Stop starting files; those in progress finish and are committed."""
+        self.pause_event.set()
+        self.manifest.set_state(paused=True)
+        self.queue._changed()
+
+    def resume(self):
+        self.pause_event.clear()
+        self.manifest.set_state(paused=False)
+        self.queue._changed()
+
+    def cancel(self):
+        """Stop the job for good; files already committed stay changed (Undo restores them)."""
+        self.cancel_event.set()
+        self.pause_event.clear()
+        self.queue._changed()
+
+    def set_priority(self, priority):
+        if priority in PRIORITIES and priority != self.priority:
+            self.priority = priority
+            self.manifest.set_state(priority=priority)
+            self.queue._changed()
+
+    def waiting_behind(self):
+        """Number of jobs this queued job is waiting for."""
+        return self.queue._waiting_behind(self)
+
+
+class JobQueue:
+    """The queue of write jobs. Thread-safe.
+
+    Args:
+        slots: Jobs that may run at once (default ``config.job_slots``)
+    """
+
+    def __init__(self, slots=None):
+        self.slots = config.job_slots() if slots is None else slots
+        self.jobs = []
+        self._numbers = itertools.count()
+        self._cond = threading.Condition()
+
+    def add(self, job_manifest, priority=None):
+        """Queue a job. Priority and pause state are restored from a resumed manifest.
+
+        Returns:
+            Job
+        """
+        if priority is None:
+            priority = job_manifest.info.get('priority', 'normal')
+        with self._cond:
+            job = Job(self, job_manifest, priority, next(self._numbers))
+            self.jobs.append(job)
+        if job_manifest.info.get('priority') != job.priority:
+            job_manifest.set_state(priority=job.priority)
+        if job_manifest.info.get('paused'):
+            job.pause_event.set()
+        return job
+
+    def _changed(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def _ahead(self, job, other):
+        return (PRIORITIES[other.priority], other.number) < (PRIORITIES[job.priority], job.number)
+
+    def _blocking(self, job):
+        """Return the jobs ``job`` is waiting for (caller holds the lock)."""
+        running = [other for other in self.jobs if other.state == RUNNING]
+        overlapping = [other for other in running if other.files & job.files]
+        if overlapping:
+            return overlapping
+        # Jobs ahead that could start now take the free slots first
+        active = [other for other in running if not other.paused]
+        ahead = [other for other in self.jobs
+                 if other.state == QUEUED and other is not job and not other.paused
+                 and not other.cancel_event.is_set() and self._ahead(job, other)
+                 and not any(r.files & other.files for r in running)]
+        if len(active) + len(ahead) >= self.slots:
+            return active + ahead
+        return []
+
+    def _waiting_behind(self, job):
+        with self._cond:
+            return len(self._blocking(job)) if job.state == QUEUED else 0
+
+    @contextmanager
+    def turn(self, job):
+        """Wait until ``job`` may run, and remove it from the queue when it ends.
+
+        A job cancelled while waiting gets its turn straight away (its batch
+        then starts nothing).
+        """
+        with self._cond:
+            while not job.cancel_event.is_set() and (job.paused or self._blocking(job)):
+                self._cond.wait()
+            job.state = RUNNING
+        try:
+            yield job
+        finally:
+            with self._cond:
+                job.state = CANCELLED if job.cancel_event.is_set() else FINISHED
+                self.jobs.remove(job)
+                self._cond.notify_all()
+            if job.cancel_event.is_set():
+                job.manifest.cancel()
@@ -0,0 +1,260 @@
+"""Batch Jobs - run a per-file operation over many files in parallel"""
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import atomic
+import exif_ops
+import profiling
+import staging
+import timing
+
+
+# 8 workers = sweet spot for I/O-bound ExifTool processes
+DEFAULT_WORKERS = 8
+
+# Tasks queued per worker; keeps memory flat for very large selections and
+# lets cancellation take effect quickly
+QUEUE_DEPTH = 4
+
+# Seconds between checks while a job is paused
+PAUSE_POLL = 0.2
+
+_running = 0
+_running_lock = threading.Lock()
+
+
+def running():
+    """True while a batch job is running in this process (background work backs off)."""
+    return _running > 0
+
+
+def run_batch(func, tasks, max_workers=DEFAULT_WORKERS, on_progress=None, cancel_event=None,
+              name=None, journal=None, atomic_writes=False, manifest=None, checksum_log=None,
+              stage=False, pause_event=None):
+    """Run ``func(*task)`` for every task using a pool of worker threads.
+
+    Each worker thread gets its own persistent ExifTool process, so files
+    don't pay a process start-up each.
+
+    Args:
+        func: Per-file operation; raise an exception to report a failure
+        tasks: List of argument tuples; the first item of each is the file path
+        max_workers: Maximum number of worker threads
+        on_progress: Optional callback ``on_progress(processed, total, file_name)``,
+            called from the calling thread after each task finishes
+        cancel_event: Optional threading.Event; once set, no further tasks are started
+        pause_event: Optional threading.Event; while set, no further tasks are
+            started, and once those running have finished they are committed
+        name: Job name for diagnostics; defaults to the function name
+        journal: Optional journal.Journal; each file is snapshotted before
+            ``func`` runs, and the journal is closed when the batch ends
+        atomic_writes: If True, ``func`` is called with ``output=<temp path>``
+            and must write the new file there instead of overwriting; files
+            are then renamed into place in fsynced groups (see ``atomic``)
+        manifest: Optional manifest.Manifest whose ``tasks`` are being run;
+            committed tasks are recorded in it so an interrupted job can resume
+        checksum_log: Optional checksums.ChecksumLog; each file is hashed
+            before and after ``func`` and committed files are recorded. The
+            log is closed when the batch ends
+        stage: With ``atomic_writes``, run ``func`` on local copies of files
+            on network shares and copy the results back (see ``staging``).
+            Only for operations that change nothing but the file itself
+
+    Returns:
+        (completed, errors, cancelled) - the number of successful tasks, a list
+        of (file path, error message) tuples and the number of tasks not run.
+        The path is the full one, since a job can span folders
+    """
+    total = len(tasks)
+    completed = 0
+    processed = 0
+    errors = []
+    if not total:
+        if journal is not None:
+            journal.close()
+        if checksum_log is not None:
+            checksum_log.close()
+        if manifest is not None:
+            manifest.finish()
+        return completed, errors, 0
+
+    global _running
+    with _running_lock:
+        _running += 1
+
+    job_name = name or func.__name__
+    timing.recorder.begin_job(job_name)
+
+    profile = profiling.start_session(job_name)
+
+    stager = None
+    if stage and atomic_writes:
+        staged = [task[0] for task in tasks if staging.wanted(task[0])]
+        if staged:
+            stager = staging.Stager(staged)
+
+    def timed_task(*task):
+        with timing.span(f"job.{job_name}"):
+            if stager is not None and task[0] in stager:
+                try:
+                    staged_task(*task)
+                finally:
+                    stager.release(task[0])
+                return
+            if journal is not None:
+                with timing.span('journal.snapshot'):
+                    journal.snapshot(task[0])
+            if checksum_log is not None:
+                with timing.span('checksum.before'):
+                    checksum_log.before(task[0])
+            try:
+                if not atomic_writes:
+                    func(*task)
+                else:
+                    # ExifTool won't write over a temp file left by a crash
+                    atomic.remove_temp_files([task[0]])
+                    try:
+                        func(*task, output=atomic.temp_path(task[0]))
+                    except Exception:
+                        atomic.remove_temp_files([task[0]])
+                        raise
+            except Exception:
+                if checksum_log is not None:
+                    checksum_log.discard(task[0])
+                raise
+            if checksum_log is not None:
+                with timing.span('checksum.after'):
+                    checksum_log.after(task[0], atomic.temp_path(task[0]) if atomic_writes else task[0])
+
+    def staged_task(file_path, *args):
+        # Same steps on the local copy; the upload leaves the temp file on the share to commit
+        local = stager.fetch(file_path)
+        if journal is not None:
+            with timing.span('journal.snapshot'):
+                journal.snapshot(file_path, source=local)
+        if checksum_log is not None:
+            with timing.span('checksum.before'):
+                checksum_log.before(file_path, source=local)
+        atomic.remove_temp_files([file_path])
+        try:
+            func(local, *args, output=atomic.temp_path(local))
+            if checksum_log is not None:
+                with timing.span('checksum.after'):
+                    checksum_log.after(file_path, atomic.temp_path(local))
+            stager.upload(file_path)
+        except Exception:
+            atomic.remove_temp_files([file_path])
+            if checksum_log is not None:
+                checksum_log.discard(file_path)
+            raise
+
+    if profile:
+        timed_task = profile.wrap(timed_task)
+
+    committer = None
+    if atomic_writes or manifest is not None:
+        committer = atomic.GroupCommitter(
+            before_commit=journal.sync if journal is not None else None)
+
+    def record_commits(results):
+        # Files that failed to commit move from completed to errors
+        nonlocal completed
+        for position, file_path, error in results:
+            if error:
+                completed -= 1
+                errors.append((str(file_path), error))
+                if checksum_log is not None:
+                    checksum_log.discard(file_path)
+        if checksum_log is not None:
+            checksum_log.commit([file_path for _, file_path, error in results if not error])
+        if manifest is not None:
+            manifest.mark_done([position for position, _, error in results if not error])
+
+    workers = max(1, min(max_workers, total))
+    pool = exif_ops.ExifToolPool()
+    task_iter = iter(enumerate(tasks))
+    pending = {}
+
+    def cancelled():
+        return cancel_event is not None and cancel_event.is_set()
+
+    def paused():
+        return pause_event is not None and pause_event.is_set() and not cancelled()
+
+    def wait_while_paused():
+        # Commit what was done, and let background work run meanwhile
+        global _running
+        if committer is not None:
+            record_commits(committer.flush())
+        with _running_lock:
+            _running -= 1
+        try:
+            while paused():
+                time.sleep(PAUSE_POLL)
+        finally:
+            with _running_lock:
+                _running += 1
+
+    submitted = 0
+    try:
+        with ThreadPoolExecutor(max_workers=workers, initializer=pool.bind) as executor:
+            def fill():
+                nonlocal submitted
+                while len(pending) < workers * QUEUE_DEPTH and not cancelled() and not paused():
+                    item = next(task_iter, None)
+                    if item is None:
+                        return
+                    pending[executor.submit(timed_task, *item[1])] = item
+                    submitted += 1
+
+            fill()
+            while pending or (paused() and submitted < total):
+                if not pending:
+                    wait_while_paused()
+                    fill()
+                    continue
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    position, task = pending.pop(future)
+                    file_name = Path(task[0]).name
+                    try:
+                        future.result()  # Raises exception if task failed
+                        completed += 1
+                        if committer is not None:
+                            record_commits(committer.add(position, task[0]))
+                        elif checksum_log is not None:
+                            checksum_log.commit([task[0]])
+                    except Exception as e:
+                        errors.append((str(task[0]), str(e)))
+                    processed += 1
+
+                    if on_progress:
+                        on_progress(processed, total, file_name)
+                fill()
+        if committer is not None:
+            record_commits(committer.flush())
+        if manifest is not None and processed == total:
+            manifest.finish()
+    finally:
+        pool.close()
+        if stager is not None:
+            stager.close()
+        if committer is not None:
+            # Renames already queued are still safe to commit after an error
+            record_commits(committer.flush())
+        if journal is not None:
+            journal.close()
+        if manifest is not None:
+            manifest.close()
+        if checksum_log is not None:
+            checksum_log.close()
+        timing.recorder.end_job()
+        if profile:
+            profile.stop()
+        with _running_lock:
+            _running -= 1
+
+    return completed, errors, total - processed
@@ -0,0 +1,310 @@
+"""Undo Journal - compact record of the metadata a job overwrote
+
+Before a job writes a file, the file's original metadata is appended to the
+job's journal:
+
+    JPEG   the raw APPn/COM header segments (Exif, XMP, IPTC, ICC, JFIF...),
+           restored byte for byte by splicing them back into the header
+    other  the previous values of the tags being written (or of every tag,
+           for sanitise) as ExifTool JSON, restored with ``-json=``
+    XMP    in sidecar write mode, the previous sidecar (or the fact there
+           wasn't one); the original isn't touched
+
+Each record is zlib-compressed, so a journal costs kilobytes per file rather
+than a full backup copy. Journals live in ``<data dir>/journals``; the most
+recent one that hasn't been undone is what "Undo Last Job" replays.
+
+Record layout: ``>II`` header and payload lengths, then the compressed JSON
+header and the compressed payload.
+"""
+
+import json
+import os
+import re
+import shutil
+import struct
+import tempfile
+import threading
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+import atomic
+import config
+import exif_ops
+import filetimes
+import formats
+import jpeg
+import xmp_sidecar
+
+
+SUFFIX = '.journal'
+UNDONE_SUFFIX = '.undone'
+
+# Journals kept; older ones are deleted when a new job starts
+KEEP_JOURNALS = 20
+
+_RECORD_HEADER = struct.Struct('>II')
+
+# Tag groups that describe the file itself rather than its metadata
+_SKIP_GROUPS = ('SourceFile', 'ExifTool:', 'System:', 'File:', 'Composite:')
+
+
+def journal_dir():
+    path = config.data_dir() / 'journals'
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _snapshot_tags(file_path, tags):
+    """Return the current values of tags (all tags if None) as a JSON-ready dict."""
+    if tags == []:
+        return {}
+    args = ['-j', '-G1', '-a', '-struct', '-b']
+    args += [f"-{tag}" for tag in formats.handler_for(file_path).tags_for(tags)] if tags else ['-all']
+    result = exif_ops.run_exiftool(args + [str(file_path)])
+    if not result.stdout.strip():
+        raise Exception(result.stderr or "Could not read metadata")
+    entry = json.loads(result.stdout)[0]
+    return {key: value for key, value in entry.items() if not key.startswith(_SKIP_GROUPS)}
+
+
+class Journal:
+    """Append-only undo journal for one job. Safe to use from worker threads.
+
+    Args:
+        job_name: Job name, used in the file name
+        tags: Tags the job writes, or None if it may change every tag; an
+            empty list journals only the file times (and JPEG segments)
+        path: Existing journal to append to when resuming an interrupted job
+        sidecars: The job writes XMP sidecars instead of the files
+    """
+
+    def __init__(self, job_name, tags=None, path=None, sidecars=False):
+        self.job_name = job_name
+        self.tags = list(tags) if tags is not None else None
+        self.sidecars = sidecars
+        self.started = datetime.now()
+        self._lock = threading.Lock()
+
+        if path is not None and Path(path).exists():
+            self.path = Path(path)
+            info = next(_read_records(self.path, with_payload=False), ({},))[0]
+            self.tags = info.get('tags', self.tags)
+            self.sidecars = info.get('sidecars', self.sidecars)
+            self._file = open(self.path, 'ab')
+            return
+
+        stem = re.sub(r'[^\w.-]+', '_', f"{self.started:%Y%m%d-%H%M%S}-{job_name}")
+        prune()
+        self.path = journal_dir() / f"{stem}{SUFFIX}"
+        self._file = open(self.path, 'ab')
+        self._append({'job': job_name, 'started': self.started.isoformat(timespec='seconds'),
+                      'tags': self.tags, 'sidecars': self.sidecars}, b'')
+
+    def _append(self, header, payload):
+        header = zlib.compress(json.dumps(header).encode('utf-8'))
+        payload = zlib.compress(payload) if payload else b''
+        with self._lock:
+            self._file.write(_RECORD_HEADER.pack(len(header), len(payload)) + header + payload)
+            # Must reach the OS before the file itself is rewritten; ``sync``
+            # makes it durable
+            self._file.flush()
+
+    def snapshot(self, file_path, source=None):
+        """Record a file's current metadata. Call before writing to it.
+
+        Args:
+            source: Read from this identical copy instead (see ``staging``)
+        """
+        source = file_path if source is None else source
+        stat = os.stat(source)
+        header = {'path': str(file_path), 'atime': stat.st_atime, 'mtime': stat.st_mtime,
+                  'created': filetimes.created_time(stat)}
+
+        # Formats ExifTool can't write get a sidecar even outside sidecar mode
+        if self.sidecars or not formats.handler_for(file_path).writable:
+            sidecar = xmp_sidecar.sidecar_path(file_path)
+            header['kind'] = 'sidecar'
+            header['sidecar'] = str(sidecar)
+            header['existed'] = sidecar.exists()
+            payload = sidecar.read_bytes() if header['existed'] else b''
+        elif jpeg.is_jpeg(source):
+            with open(source, 'rb') as f:
+                segments = jpeg.read_header(f)
+            header['kind'] = 'segments'
+            payload = b''.join(data for marker, data in segments
+                               if marker in jpeg.METADATA_MARKERS)
+        else:
+            header['kind'] = 'tags'
+            payload = json.dumps(_snapshot_tags(source, self.tags)).encode('utf-8')
+
+        self._append(header, payload)
+
+    def sync(self):
+        """Make every record so far durable."""
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def _read_records(path, with_payload=True):
+    """Yield (header, payload, offset) for every record in a journal."""
+    with open(path, 'rb') as f:
+        while True:
+            offset = f.tell()
+            prefix = f.read(_RECORD_HEADER.size)
+            if len(prefix) < _RECORD_HEADER.size:
+                return
+            header_len, payload_len = _RECORD_HEADER.unpack(prefix)
+            raw_header = f.read(header_len)
+            if len(raw_header) < header_len:
+                return  # Torn final record from a crash
+            header = json.loads(zlib.decompress(raw_header))
+            if with_payload:
+                raw = f.read(payload_len)
+                if len(raw) < payload_len:
+                    return
+                payload = zlib.decompress(raw) if raw else b''
+            else:
+                f.seek(payload_len, os.SEEK_CUR)
+                payload = None
+            yield header, payload, offset
+
+
+def read_record(path, offset):
+    """Return (header, payload) of the record at ``offset``."""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        header_len, payload_len = _RECORD_HEADER.unpack(f.read(_RECORD_HEADER.size))
+        header = json.loads(zlib.decompress(f.read(header_len)))
+        raw = f.read(payload_len)
+        return header, zlib.decompress(raw) if raw else b''
+
+
+def read_index(path):
+    """Return (job info, [(file path, record offset)]) without loading payloads.
+
+    If a file was journalled more than once, only its first record (the
+    metadata it had before the job) is kept.
+    """
+    info = None
+    index = []
+    seen = set()
+    for header, _, offset in _read_records(path, with_payload=False):
+        if info is None:
+            info = header
+            continue
+        if header['path'] not in seen:
+            seen.add(header['path'])
+            index.append((header['path'], offset))
+    return info or {}, index
+
+
+def journals():
+    """Return journals that haven't been undone, newest first."""
+    return sorted(journal_dir().glob(f"*{SUFFIX}"), reverse=True)
+
+
+def latest_journal():
+    found = journals()
+    return found[0] if found else None
+
+
+def prune(keep=KEEP_JOURNALS):
+    """Delete all but the newest ``keep`` journals (undone ones included)."""
+    paths = sorted(journal_dir().glob(f"*{SUFFIX}*"), reverse=True)
+    for path in paths[keep:]:
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+def mark_undone(path):
+    path = Path(path)
+    path.rename(path.with_name(path.name + UNDONE_SUFFIX))
+
+
+def _restore_segments(file_path, segments):
+    """Replace a JPEG's metadata segments with ``segments``."""
+    file_path = Path(file_path)
+    fd, temp_path = tempfile.mkstemp(dir=file_path.parent, prefix='.undo-', suffix='.tmp')
+    try:
+        with open(file_path, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+            current = jpeg.read_header(src)
+            dst.write(jpeg.SOI + segments)
+            for marker, data in current:
+                if marker not in jpeg.METADATA_MARKERS:
+                    dst.write(data)
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        atomic.copy_mode(file_path, temp_path)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _restore_sidecar(sidecar, existed, data):
+    """Put back a sidecar's previous contents, or remove one the job created."""
+    sidecar = Path(sidecar)
+    if not existed:
+        sidecar.unlink(missing_ok=True)
+        return
+    fd, temp_path = tempfile.mkstemp(dir=sidecar.parent, prefix='.undo-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        atomic.copy_mode(sidecar, temp_path)
+        os.replace(temp_path, sidecar)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _restore_tags(file_path, tags, values):
+    """Delete the tags a job wrote, then write back their previous values."""
+    if tags == []:
+        return
+    values = dict(values, SourceFile='*')
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False, encoding='utf-8') as f:
+        json.dump([values], f)
+        json_path = f.name
+    try:
+        args = ['-overwrite_original']
+        args += [f"-{tag}=" for tag in formats.handler_for(file_path).tags_for(tags)] if tags else ['-all=']
+        args += [f"-json={json_path}", str(file_path)]
+        result = exif_ops.run_exiftool(args)
+        if result.returncode != 0:
+            raise Exception(result.stderr)
+    finally:
+        os.unlink(json_path)
+
+
+def restore(journal_path, offset, tags):
+    """Undo one file from its journal record.
+
+    Args:
+        journal_path: Journal file
+        offset: Record offset from ``read_index``
+        tags: The job's tags from the journal info (None for all tags)
+    """
+    header, payload = read_record(journal_path, offset)
+    if header['kind'] == 'sidecar':
+        _restore_sidecar(header['sidecar'], header['existed'], payload)
+    elif header['kind'] == 'segments':
+        _restore_segments(header['path'], payload)
+    else:
+        _restore_tags(header['path'], tags, json.loads(payload))
+    created = header.get('created') if filetimes.CAN_SET_CREATED else None
+    filetimes.set_times(header['path'], created, header['mtime'], header['atime'])
@@ -0,0 +1,192 @@
+"""JPEG - minimal marker segment parsing
+
+Only the header (everything before the first SOS marker) is parsed; the
+entropy-coded image data after it is never decoded.
+"""
+
+import struct
+
+
+SOI = b'\xff\xd8'
+SOS = 0xDA
+
+# APP0-APP15 and COM hold metadata (JFIF, Exif, XMP, ICC, IPTC, comments...)
+METADATA_MARKERS = set(range(0xE0, 0xF0)) | {0xFE}
+
+# Markers without a length field
+_STANDALONE_MARKERS = set(range(0xD0, 0xD8)) | {0x01}
+
+
+class JpegError(Exception):
+    """The file isn't a JPEG this parser understands."""
+
+
+def is_jpeg(file_path):
+    try:
+        with open(file_path, 'rb') as f:
+            return f.read(2) == SOI
+    except OSError:
+        return False
+
+
+def read_header(f):
+    """Read the header segments of an open JPEG file.
+
+    Leaves the file positioned at the start of the SOS segment.
+
+    Returns:
+        List of (marker, segment bytes) tuples; each segment includes its
+        0xFF marker prefix and length field
+    """
+    if f.read(2) != SOI:
+        raise JpegError("Not a JPEG file")
+
+    segments = []
+    while True:
+        start = f.tell()
+        prefix = f.read(2)
+        if len(prefix) < 2 or prefix[0] != 0xFF:
+            raise JpegError("Corrupt JPEG header")
+        marker = prefix[1]
+
+        # Fill bytes: any number of 0xFF may precede a marker
+        while marker == 0xFF:
+            byte = f.read(1)
+            if not byte:
+                raise JpegError("Truncated JPEG header")
+            marker = byte[0]
+
+        if marker == SOS:
+            f.seek(start)
+            return segments
+        if marker in _STANDALONE_MARKERS:
+            segments.append((marker, bytes([0xFF, marker])))
+            continue
+
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            raise JpegError("Truncated JPEG header")
+        (length,) = struct.unpack('>H', length_bytes)
+        body = f.read(length - 2)
+        if len(body) < length - 2:
+            raise JpegError("Truncated JPEG header")
+        segments.append((marker, bytes([0xFF, marker]) + length_bytes + body))
+
+
+def split_segments(data):
+    """Split concatenated segments (as stored by ``read_header``) back apart."""
+    segments = []
+    pos = 0
+    while pos < len(data):
+        marker = data[pos + 1]
+        if marker in _STANDALONE_MARKERS:
+            segments.append((marker, data[pos:pos + 2]))
+            pos += 2
+            continue
+        (length,) = struct.unpack('>H', data[pos + 2:pos + 4])
+        segments.append((marker, data[pos:pos + 2 + length]))
+        pos += 2 + length
+    return segments
+
+
+# Bytes read per chunk when copying image data
+COPY_CHUNK = 1024 * 1024
+
+EOI = b'\xff\xd9'
+
+APP0, APP1, APP2, APP14 = 0xE0, 0xE1, 0xE2, 0xEE
+
+ORIENTATION_TAG = 0x0112
+
+
+def _is_kept(marker, data, keep_icc):
+    """Allow-list of metadata segments that affect how the image looks."""
+    payload = data[4:]
+    if marker == APP0:
+        return payload.startswith((b'JFIF\x00', b'JFXX\x00'))
+    if marker == APP2:
+        return keep_icc and payload.startswith(b'ICC_PROFILE\x00')
+    if marker == APP14:
+        # Adobe colour transform, needed to decode CMYK/YCCK correctly
+        return payload.startswith(b'Adobe')
+    return False
+
+
+def exif_orientation(segments):
+    """Return the Orientation value from the Exif APP1 segment, or None."""
+    for marker, data in segments:
+        if marker != APP1 or not data[4:].startswith(b'Exif\x00\x00'):
+            continue
+        tiff = data[10:]
+        if tiff[:2] == b'II':
+            endian = '<'
+        elif tiff[:2] == b'MM':
+            endian = '>'
+        else:
+            return None
+        try:
+            (ifd_offset,) = struct.unpack_from(endian + 'I', tiff, 4)
+            (count,) = struct.unpack_from(endian + 'H', tiff, ifd_offset)
+            for i in range(count):
+                entry = ifd_offset + 2 + i * 12
+                tag, field_type, _ = struct.unpack_from(endian + 'HHI', tiff, entry)
+                if tag == ORIENTATION_TAG and field_type == 3:
+                    return struct.unpack_from(endian + 'H', tiff, entry + 8)[0]
+        except struct.error:
+            return None
+    return None
+
+
+def orientation_segment(orientation):
+    """Build a minimal Exif APP1 segment holding only Orientation."""
+    tiff = (b'MM\x00\x2a' + struct.pack('>I', 8)
+            + struct.pack('>H', 1)
+            + struct.pack('>HHIHH', ORIENTATION_TAG, 3, 1, orientation, 0)
+            + struct.pack('>I', 0))
+    payload = b'Exif\x00\x00' + tiff
+    return bytes([0xFF, APP1]) + struct.pack('>H', len(payload) + 2) + payload
+
+
+def _copy_to_eoi(src, dst):
+    """Copy the image data up to and including EOI; anything after it
+    (maker trailers, MPF preview images with their own metadata) is dropped."""
+    tail = b''
+    while True:
+        chunk = src.read(COPY_CHUNK)
+        if not chunk:
+            dst.write(tail)
+            return
+        data = tail + chunk
+        end = data.find(EOI)
+        if end >= 0:
+            dst.write(data[:end + 2])
+            return
+        # Keep the last byte in case the marker straddles two chunks
+        dst.write(data[:-1])
+        tail = data[-1:]
+
+
+def strip_metadata(src_path, dst_path, keep_icc=True, keep_orientation=True):
+    """Write a copy of a JPEG without its metadata segments.
+
+    The image data is copied verbatim (never decoded). JFIF and Adobe
+    segments are always kept; the ICC profile and Orientation are kept
+    unless disabled.
+
+    Raises:
+        JpegError: If the file can't be parsed; use ExifTool instead
+    """
+    with open(src_path, 'rb') as src:
+        segments = read_header(src)
+        kept = [(marker, data) for marker, data in segments
+                if marker not in METADATA_MARKERS or _is_kept(marker, data, keep_icc)]
+
+        orientation = exif_orientation(segments) if keep_orientation else None
+        if orientation and orientation != 1:
+            # Exif goes after JFIF, if there is one
+            position = 1 if kept and kept[0][0] == APP0 else 0
+            kept.insert(position, (APP1, orientation_segment(orientation)))
+
+        with open(dst_path, 'wb') as dst:
+            dst.write(SOI + b''.join(data for _, data in kept))
+            _copy_to_eoi(src, dst)
@@ -0,0 +1,501 @@
+"""Library - a SQLite index of the whole photo library for search
+
+The index lives in ``<data dir>/library.sqlite``, one row per file:
+
+    files   path, key (normalised path), folder, name, size, mtime_ns,
+            taken (DateTimeOriginal as seconds since 1970, no time zone),
+            lat, lon, cell (location grid cell), make, model
+    names   FTS5 trigram index of the file names (substring search)
+
+Each kind of query has its own index, so a search of 500k files touches
+only the rows it returns:
+
+    taken        B-tree                      after:, before:, date:
+    cell         B-tree on a 0.01° grid      near: ... within:
+    make, model  B-tree, case-insensitive    camera:
+    key          partial B-trees for rows    missing:date, missing:gps
+                 without a date / location
+    names        FTS5 trigrams               bare words in the query
+
+Files are added by ``index_files`` / ``index_folder``; files whose size and
+mtime haven't changed since they were indexed aren't read again.
+"""
+
+import math
+import os
+import shlex
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import config
+import exif_ops
+import preflight
+import timing
+from gps_presets import GPS_PRESETS
+
+
+SCHEMA_VERSION = 1
+
+# Location grid: 0.01° cells (about 1.1 km north-south), numbered row by row
+CELL_DEGREES = 0.01
+GRID_COLUMNS = round(360 / CELL_DEGREES)
+
+# Most results a search returns
+MAX_RESULTS = 2000
+
+# Files read per ExifTool batch while indexing
+INDEX_CHUNK = 500
+
+DEFAULT_RADIUS_KM = 1.0
+EARTH_RADIUS_KM = 6371.0
+
+TAGS = ('DateTimeOriginal',) + preflight.GPS_TAGS + ('Make', 'Model')
+
+_EPOCH = datetime(1970, 1, 1)
+
+_FIELDS = ('after', 'before', 'date', 'near', 'within', 'camera', 'missing', 'has', 'in')
+
+SEARCH_HELP = """Search terms (all must match; quote values with spaces):
+after:2023-06-01  before:2024  date:2023-07 - taken in a range
+near:"Perth CBD" or near:-31.95,115.86 - within 1 km, or within:2km / within:500m
+camera:"Pixel 7" - camera make or model
+missing:date  missing:gps  missing:camera  has:date  has:gps
+in:Z:/photos/2023 - a folder and its subfolders
+anything else - part of the file name"""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    path TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    taken INTEGER,
+    lat REAL,
+    lon REAL,
+    cell INTEGER,
+    make TEXT,
+    model TEXT
+);
+CREATE INDEX IF NOT EXISTS files_taken ON files(taken);
+CREATE INDEX IF NOT EXISTS files_cell ON files(cell);
+CREATE INDEX IF NOT EXISTS files_make ON files(make COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS files_model ON files(model COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS files_no_date ON files(key) WHERE taken IS NULL;
+CREATE INDEX IF NOT EXISTS files_no_gps ON files(key) WHERE cell IS NULL;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS names USING fts5(
+    name, content='files', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS files_insert AFTER INSERT ON files BEGIN
+    INSERT INTO names(rowid, name) VALUES (new.id, new.name);
+END;
+CREATE TRIGGER IF NOT EXISTS files_delete AFTER DELETE ON files BEGIN
+    INSERT INTO names(names, rowid, name) VALUES ('delete', old.id, old.name);
+END;
+CREATE TRIGGER IF NOT EXISTS files_rename AFTER UPDATE OF name ON files BEGIN
+    INSERT INTO names(names, rowid, name) VALUES ('delete', old.id, old.name);
+    INSERT INTO names(rowid, name) VALUES (new.id, new.name);
+END;
+"""
+
+_schema_lock = threading.Lock()
+_schema_ready = set()
+
+
+def library_path():
+    return config.data_dir() / 'library.sqlite'
+
+
+def _distance_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance (haversine)."""
+    if lat2 is None or lon2 is None:
+        return None
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((p2 - p1) / 2) ** 2
+         + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def connect(path=None):
+    """Open the library database, creating it if needed.
+
+    Connections are cheap; open one per operation or thread. WAL mode lets
+    searches run while the library is being indexed.
+    """
+    path = Path(path) if path else library_path()
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.create_function('distance_km', 4, _distance_km, deterministic=True)
+    with _schema_lock:
+        if path not in _schema_ready:
+            conn.executescript(_SCHEMA)
+            conn.execute(f'PRAGMA user_version={SCHEMA_VERSION}')
+            _schema_ready.add(path)
+    return conn
+
+
+def grid_cell(lat, lon):
+    """Return the grid cell of a location, or None."""
+    if lat is None or lon is None:
+        return None
+    row = min(int((lat + 90) / CELL_DEGREES), round(180 / CELL_DEGREES) - 1)
+    column = min(int((lon + 180) / CELL_DEGREES), GRID_COLUMNS - 1)
+    return row * GRID_COLUMNS + column
+
+
+def _row(file_path, stat, tags):
+    """Build a ``files`` row from a file's stat and read tags."""
+    dt = preflight.parse_exif_datetime(tags.get('DateTimeOriginal', ''))
+    lat, lon = preflight.signed_gps(tags) or (None, None)
+    file_path = Path(file_path)
+    return (
+        exif_ops.path_key(file_path), str(file_path), exif_ops.path_key(file_path.parent),
+        file_path.name, stat.st_size, stat.st_mtime_ns,
+        int((dt - _EPOCH).total_seconds()) if dt else None,
+        lat, lon, grid_cell(lat, lon),
+        str(tags['Make']).strip() if tags.get('Make') else None,
+        str(tags['Model']).strip() if tags.get('Model') else None,
+    )
+
+
+def _stat_all(files):
+    stats = {}
+    for file_path in files:
+        try:
+            stats[file_path] = os.stat(file_path)
+        except OSError:
+            pass  # Gone since it was listed
+    return stats
+
+
+def changed_files(conn, files):
+    """Return (file, stat) pairs for files that are new or whose size/mtime changed."""
+    stats = _stat_all(files)
+    known = {}
+    keys = [exif_ops.path_key(f) for f in stats]
+    for i in range(0, len(keys), 500):
+        chunk = keys[i:i + 500]
+        known.update((key, (size, mtime_ns)) for key, size, mtime_ns in conn.execute(
+            f"SELECT key, size, mtime_ns FROM files WHERE key IN ({','.join('?' * len(chunk))})",
+            chunk))
+    return [(file_path, stat) for file_path, stat in stats.items()
+            if known.get(exif_ops.path_key(file_path)) != (stat.st_size, stat.st_mtime_ns)]
+
+
+def store(conn, changed, current):
+    """Write index rows for files.
+
+    Args:
+        conn: Open connection
+        changed: (file, stat) pairs from ``changed_files``
+        current: Their tags, as returned by ``exif_ops.read_tags`` for ``TAGS``
+    """
+    rows = [_row(f, stat, current.get(exif_ops.path_key(f), {})) for f, stat in changed]
+    with conn:
+        conn.executemany(
+            "INSERT INTO files (key, path, folder, name, size, mtime_ns, taken, lat, lon, cell, make, model) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET path=excluded.path, folder=excluded.folder, "
+            "name=excluded.name, size=excluded.size, mtime_ns=excluded.mtime_ns, "
+            "taken=excluded.taken, lat=excluded.lat, lon=excluded.lon, cell=excluded.cell, "
+            "make=excluded.make, model=excluded.model",
+            rows)
+
+
+def index_files(files, on_progress=None, cancel_event=None, conn=None):
+    """Add or update files in the library, skipping unchanged ones.
+
+    Args:
+        files: Files to index
+        on_progress: Optional ``on_progress(done, total)``
+        cancel_event: Optional threading.Event; stops between batches
+        conn: Optional open connection
+
+    Returns:
+        Number of files (re)indexed
+    """
+    own = conn is None
+    conn = conn or connect()
+    try:
+        with timing.span('library.changed', files=len(files)):
+            todo = changed_files(conn, files)
+        done = 0
+        for i in range(0, len(todo), INDEX_CHUNK):
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            chunk = todo[i:i + INDEX_CHUNK]
+            with timing.span('library.read', files=len(chunk)):
+                current = preflight.read_current([f for f, _ in chunk], TAGS)
+            store(conn, chunk, current)
+            done += len(chunk)
+            if on_progress:
+                on_progress(done, len(todo))
+        return done
+    finally:
+        if own:
+            conn.close()
+
+
+def remove_missing(root, present, conn=None):
+    """Drop indexed files under ``root`` that aren't in ``present``.
+
+    Returns:
+        Number of rows removed
+    """
+    own = conn is None
+    conn = conn or connect()
+    try:
+        prefix = exif_ops.path_key(root).rstrip(os.sep) + os.sep
+        present = {exif_ops.path_key(f) for f in present}
+        gone = [(key,) for (key,) in conn.execute(
+            "SELECT key FROM files WHERE key >= ? AND key < ?", (prefix, prefix + '\uffff'))
+                if key not in present]
+        with conn:
+            conn.executemany("DELETE FROM files WHERE key = ?", gone)
+        return len(gone)
+    finally:
+        if own:
+            conn.close()
+
+
+def remove_missing_in_folder(conn, folder, present):
+    """Drop indexed files directly in ``folder`` (not subfolders) that aren't in ``present``.
+
+    Returns:
+        Number of rows removed
+    """
+    folder_key = exif_ops.path_key(folder)
+    prefix = folder_key.rstrip(os.sep) + os.sep
+    present = {exif_ops.path_key(f) for f in present}
+    gone = [(key,) for key, row_folder in conn.execute(
+        "SELECT key, folder FROM files WHERE key >= ? AND key < ?", (prefix, prefix + '\uffff'))
+            if row_folder == folder_key and key not in present]
+    with conn:
+        conn.executemany("DELETE FROM files WHERE key = ?", gone)
+    return len(gone)
+
+
+def remove_missing_folders(conn, root, folders):
+    """Drop indexed files under ``root`` whose folder isn't in ``folders`` (deleted folders).
+
+    Returns:
+        Number of rows removed
+    """
+    prefix = exif_ops.path_key(root).rstrip(os.sep) + os.sep
+    keep = {exif_ops.path_key(f) for f in folders}
+    gone = [(key,) for key, folder in conn.execute(
+        "SELECT key, folder FROM files WHERE key >= ? AND key < ?", (prefix, prefix + '\uffff'))
+            if folder not in keep]
+    with conn:
+        conn.executemany("DELETE FROM files WHERE key = ?", gone)
+    return len(gone)
+
+
+def index_folder(root, on_progress=None, cancel_event=None):
+    """Index a folder and all its subfolders, dropping files no longer there.
+
+    Returns:
+        (indexed, total) - files (re)indexed and files found
+    """
+    files = exif_ops.walk_image_files(root)
+    conn = connect()
+    try:
+        indexed = index_files(files, on_progress, cancel_event, conn)
+        if cancel_event is None or not cancel_event.is_set():
+            remove_missing(root, files, conn)
+        return indexed, len(files)
+    finally:
+        conn.close()
+
+
+def _parse_date(text):
+    """Parse 'YYYY', 'YYYY-MM' or 'YYYY-MM-DD' to (start, end) datetimes."""
+    for fmt, step in (('%Y-%m-%d', 'day'), ('%Y-%m', 'month'), ('%Y', 'year')):
+        try:
+            start = datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        if step == 'day':
+            end = start + timedelta(days=1)
+        elif step == 'month':
+            end = start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+        else:
+            end = start.replace(year=start.year + 1)
+        return start, end
+    raise ValueError(f"Invalid date: {text!r} (use YYYY, YYYY-MM or YYYY-MM-DD)")
+
+
+def _seconds(dt):
+    return int((dt - _EPOCH).total_seconds())
+
+
+def _parse_place(text):
+    """Parse 'lat,lon' or a GPS preset name (case-insensitive) to (lat, lon)."""
+    try:
+        lat, lon = (float(part) for part in text.split(','))
+        return lat, lon
+    except ValueError:
+        pass
+    wanted = text.strip().lower()
+    for preset in GPS_PRESETS:
+        name = preset['name'].lower()
+        if name == wanted or name.split(' ', 1)[-1] == wanted:
+            return preset['lat'], preset['lon']
+    raise ValueError(f"Unknown place: {text!r} (use a GPS preset name or lat,lon)")
+
+
+def _parse_radius(text):
+    text = text.strip().lower()
+    try:
+        if text.endswith('km'):
+            return float(text[:-2])
+        if text.endswith('m'):
+            return float(text[:-1]) / 1000
+        return float(text)
+    except ValueError:
+        raise ValueError(f"Invalid distance: {text!r} (e.g. 2km or 500m)")
+
+
+def _near_clause(lat, lon, radius_km):
+    """Index-friendly SQL for files within ``radius_km`` of a point.
+
+    The bounding box becomes one ``cell BETWEEN`` range per grid row (or a
+    single range over whole rows for big areas); ``distance_km`` then
+    checks only the candidates.
+    """
+    dlat = radius_km / 111.32
+    dlon = radius_km / max(111.32 * math.cos(math.radians(lat)), 1e-6)
+    lat_min, lat_max = max(lat - dlat, -90), min(lat + dlat, 90)
+    lon_min, lon_max = max(lon - dlon, -180), min(lon + dlon, 180)
+    first, last = grid_cell(lat_min, lon_min), grid_cell(lat_max, lon_max)
+    first_row, last_row = first // GRID_COLUMNS, last // GRID_COLUMNS
+    first_column, last_column = first % GRID_COLUMNS, last % GRID_COLUMNS
+
+    if last_row - first_row < 64:
+        ranges = [(row * GRID_COLUMNS + first_column, row * GRID_COLUMNS + last_column)
+                  for row in range(first_row, last_row + 1)]
+    else:
+        ranges = [(first_row * GRID_COLUMNS, (last_row + 1) * GRID_COLUMNS - 1)]
+    cells = ' OR '.join('cell BETWEEN ? AND ?' for _ in ranges)
+    params = [value for pair in ranges for value in pair]
+    return (f"({cells}) AND distance_km(?, ?, lat, lon) <= ?",
+            params + [lat, lon, radius_km])
+
+
+def parse_query(text):
+    """Turn a search (see ``SEARCH_HELP``) into SQL conditions.
+
+    File name words drive the query through the FTS index (joined to
+    ``files``), so a common word still stops at the result limit.
+
+    Returns:
+        (source, where, params) for ``SELECT ... FROM <source> WHERE <where>``
+
+    Raises:
+        ValueError: For a term that can't be understood
+    """
+    try:
+        terms = shlex.split(text, posix=True)
+    except ValueError as e:
+        raise ValueError(f"Invalid search: {e}")
+
+    clauses, params, phrases = [], [], []
+    near, radius_km = None, DEFAULT_RADIUS_KM
+    for term in terms:
+        field, sep, value = term.partition(':')
+        field = field.lower()
+        if not sep or field not in _FIELDS:
+            field, value = '', term
+
+        if field == 'after':
+            clauses.append("taken >= ?")
+            params.append(_seconds(_parse_date(value)[0]))
+        elif field == 'before':
+            clauses.append("taken < ?")
+            params.append(_seconds(_parse_date(value)[0]))
+        elif field == 'date':
+            start, end = _parse_date(value)
+            clauses.append("taken >= ? AND taken < ?")
+            params += [_seconds(start), _seconds(end)]
+        elif field == 'near':
+            near = _parse_place(value)
+        elif field == 'within':
+            radius_km = _parse_radius(value)
+        elif field == 'camera':
+            clauses.append("(model = ? COLLATE NOCASE OR make = ? COLLATE NOCASE)")
+            params += [value, value]
+        elif field in ('missing', 'has'):
+            column = {'date': 'taken', 'gps': 'cell', 'camera': 'model'}.get(value.lower())
+            if column is None:
+                raise ValueError(f"Unknown {field}: {value!r} (use date, gps or camera)")
+            clauses.append(f"{column} IS {'NULL' if field == 'missing' else 'NOT NULL'}")
+        elif field == 'in':
+            prefix = exif_ops.path_key(value).rstrip(os.sep) + os.sep
+            clauses.append("key >= ? AND key < ?")
+            params += [prefix, prefix + '\uffff']
+        elif len(value) >= 3:
+            phrases.append('"' + value.replace('"', '""') + '"')
+        elif value:
+            # Too short for trigrams
+            clauses.append("files.name LIKE ?")
+            params.append('%' + value.replace('%', '').replace('_', '') + '%')
+
+    if near is not None:
+        clause, near_params = _near_clause(near[0], near[1], radius_km)
+        clauses.append(clause)
+        params += near_params
+    source = 'files'
+    if phrases:
+        source = 'names JOIN files ON files.id = names.rowid'
+        clauses.insert(0, "names MATCH ?")
+        params.insert(0, ' AND '.join(phrases))
+    if not clauses:
+        raise ValueError("Empty search")
+    return source, ' AND '.join(clauses), params
+
+
+def search(text, limit=MAX_RESULTS, conn=None):
+    """Search the library.
+
+    Args:
+        text: Query (see ``parse_query``)
+        limit: Most files to return
+
+    No ORDER BY in SQL: the query stops after ``limit`` matches from
+    whichever index it uses, and only those are sorted.
+
+    Returns:
+        (files, more) - Paths in path order, and True if more matched than ``limit``
+
+    Raises:
+        ValueError: For a query that can't be understood
+    """
+    source, where, params = parse_query(text)
+    own = conn is None
+    conn = conn or connect()
+    try:
+        with timing.span('library.search'):
+            rows = conn.execute(
+                f"SELECT key, path FROM {source} WHERE {where} LIMIT ?", params + [limit + 1]
+            ).fetchall()
+    finally:
+        if own:
+            conn.close()
+    return [Path(path) for _, path in sorted(rows[:limit])], len(rows) > limit
+
+
+def stats(conn=None):
+    """Return (files, folders) in the library."""
+    own = conn is None
+    conn = conn or connect()
+    try:
+        return conn.execute("SELECT COUNT(*), COUNT(DISTINCT folder) FROM files").fetchone()
+    finally:
+        if own:
+            conn.close()
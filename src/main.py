@@ -3,6 +3,9 @@ Immich EXIF Bulk Editor
 A modern Windows 11 application for bulk EXIF editing
 """
 
+import time
+_STARTED = time.perf_counter()  # For the startup report
+
 import sys
 import os
 import subprocess
@@ -10,31 +13,70 @@ import platform
 from pathlib import Path
 from datetime import datetime, timedelta
 import tkinter as tk
-from tkinter import messagebox, ttk
+from tkinter import filedialog, messagebox, ttk
 import customtkinter as ctk
-from PIL import Image, ImageTk
+from PIL import ImageTk
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from tkcalendar import Calendar, DateEntry
-import webbrowser
+from concurrent.futures import ThreadPoolExecutor
 import tempfile
-import pywintypes
-import win32file
-import win32con
 from dotenv import load_dotenv
 from version import __version__
 from gps_presets import GPS_PRESETS
 from gps_preset_updater import update_gps_preset
+import atomic
+import checksums
+import config
+import exif_ops
+import filetimes
+import formats
+import immich_sync
+import indexer
+import job_queue
+import jobs
+import journal
+import library
+import manifest
+import preflight
+import profiling
+import sanitise_policies
+import thumbnails
+import timing
+import xmp_sidecar
 
 # Load environment variables
 load_dotenv()
 
+# Startup is the first "job" in the diagnostics window
+timing.recorder.begin_job('startup')
+timing.recorder.record('startup.imports', _STARTED, time.perf_counter() - _STARTED)
+
 # Set appearance
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("blue")
 
 
 class ExifEditor(ctk.CTk):
+    # Immich push mode labels shown in the header -> config.immich_push_mode() values
+    IMMICH_MODES = {
+        "☁️ Immich: Off": 'off',
+        "☁️ Push after edit": 'after',
+        "☁️ Push only": 'only',
+    }
+    
+    # File list sort and filter choices -> file_table keys
+    FILE_SORTS = {
+        "Name A→Z": ('name', False),
+        "Name Z→A": ('name', True),
+        "Oldest first": ('date', False),
+        "Newest first": ('date', True),
+    }
+    FILE_FILTERS = {
+        "All files": 'all',
+        "No date": 'no_date',
+        "No GPS": 'no_gps',
+        "No date or GPS": 'incomplete',
+    }
+    
     # Google Maps API Key - loaded from environment variable
     GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY', 'your_api_key_here')
     
@@ -43,18 +85,32 @@ class ExifEditor(ctk.CTk):
         print("WARNING: Google Maps API key not loaded from .env file!")
     
     def __init__(self):
-        super().__init__()
-        
-        # Window setup
-        self.title(f"Immich EXIF Bulk Editor v{__version__}")
-        
-        # Start maximized
-        self.state('zoomed')  # Windows maximize
+        with timing.span('startup.window'):
+            super().__init__()
+            
+            # Window setup
+            self.title(f"Immich EXIF Bulk Editor v{__version__}")
+            
+            # Start maximized
+            try:
+                self.state('zoomed')  # Windows maximize
+            except tk.TclError:
+                self.attributes('-zoomed', True)  # X11
         
         # Lazy loading control
         self.load_executor = ThreadPoolExecutor(max_workers=10)
         self.loaded_files = set()  # Track what's been loaded
         
+        # Thumbnail memory: encoded copies of every thumbnail made, decoded
+        # images only for rows near the viewport
+        photo_bytes, cache_bytes = thumbnails.budgets()
+        self.thumbnail_cache = thumbnails.ThumbnailCache(cache_bytes)
+        self.photo_budget = thumbnails.PhotoBudget(photo_bytes)
+        self._visible_rows = (0, 15)
+        self._last_view = None
+        self._thumbnail_pending = set()
+        self._no_thumbnail = set()
+        
         # State variables
         # Default to Z:\photos if it exists, otherwise home
         default_path = Path('Z:/photos')
@@ -62,10 +118,42 @@ class ExifEditor(ctk.CTk):
         self.selected_files = []
         self.file_widgets = {}  # Store file widgets for selection
         self.last_selected_index = None  # For shift+click
-        self.all_files = []  # All files in current directory
+        self.all_files = []  # Files shown, in display order
+        self.file_table = None  # Metadata columns of the files, made by the first sort or filter
+        self.job_queue = job_queue.JobQueue()  # Write jobs, run in priority order
+        
+        # Check for ExifTool in the background; the window doesn't wait for it
+        threading.Thread(target=self.check_exiftool, daemon=True).start()
+        
+        with timing.span('startup.create_ui'):
+            self.create_ui()
+        
+        # Fill the folder tree and file list once the window is up
+        self.after_idle(self.finish_startup)
+        
+        # Offer to finish jobs cut short by a crash once the window is up
+        self.after(500, self.resume_interrupted_jobs)
+        
+        # Swap thumbnails in and out as the file list scrolls
+        self.after(200, self._watch_viewport)
+        
+        # Keep the library index warm once startup has settled
+        self.indexer = None
+        if config.background_indexer() and config.library_roots():
+            self.indexer = indexer.Indexer(
+                config.library_roots(),
+                on_status=lambda text: self.ui_call(lambda: self.index_status_label.configure(text=text))
+            )
+            self.after(10000, self.indexer.start)
+    
+    def check_exiftool(self):
+        """Check if ExifTool is available (background thread); quit if it isn't."""
+        with timing.span('startup.exiftool_check'):
+            found = exif_ops.check_exiftool(cached=True)
+        if found:
+            return
         
-        # Check for ExifTool
-        if not self.check_exiftool():
+        def missing():
             messagebox.showerror(
                 "ExifTool Required",
                 "ExifTool not found!\n\n"
@@ -73,23 +161,43 @@ class ExifEditor(ctk.CTk):
                 "and add it to your PATH."
             )
             self.quit()
-            return
         
-        self.create_ui()
+        self.ui_call(missing)
     
-    def check_exiftool(self):
-        """Check if ExifTool is available."""
-        try:
-            cmd = 'exiftool.exe' if platform.system() == 'Windows' else 'exiftool'
-            result = subprocess.run(
-                [cmd, '-ver'],
-                capture_output=True,
-                text=True,
-                shell=(platform.system() == 'Windows')
-            )
-            return result.returncode == 0
-        except:
-            return False
+    def finish_startup(self):
+        """Load the folder tree and initial directory, then report startup times."""
+        timing.recorder.record('startup.interactive', _STARTED, time.perf_counter() - _STARTED)
+        
+        with timing.span('startup.load_directory'):
+            self.load_directory()
+        
+        # The geotag and duplicate settings come from modules loaded on demand
+        threading.Thread(target=self.fill_feature_defaults, daemon=True).start()
+        
+        def tree_ready():
+            # Expand to Z:\photos if it exists
+            if Path('Z:/photos').exists():
+                self.expand_to_path(Path('Z:/photos'))
+            timing.recorder.end_job()
+        
+        self.populate_folder_tree(on_done=tree_ready)
+    
+    def fill_feature_defaults(self):
+        """Fill in the default geotag and duplicate settings (background thread)."""
+        import duplicates
+        import geotag
+        
+        def fill():
+            for entry, value in (
+                (self.geotag_offset_entry, geotag.format_offset(geotag.local_utc_offset())),
+                (self.geotag_gap_entry, str(geotag.DEFAULT_MAX_GAP)),
+                (self.infer_window_entry, str(geotag.DEFAULT_INFER_WINDOW // 60)),
+                (self.duplicate_distance_entry, str(duplicates.DEFAULT_MAX_DISTANCE))
+            ):
+                if not entry.get():
+                    entry.insert(0, value)
+        
+        self.ui_call(fill)
     
     def show_auto_close_message(self, title, message, timeout=3000):
         """Show a message that auto-closes after timeout milliseconds."""
@@ -244,6 +352,363 @@ class ExifEditor(ctk.CTk):
         else:
             progress_window.status_label.config(text=f"Completed: {completed}/{total}")
     
+    def open_progress(self, title, total):
+        """Show a progress dialog from a background thread.
+        
+        Returns:
+            (progress, on_progress) - a dict holding the dialog as 'window'
+            once it is shown, and a ``run_batch`` progress callback for it
+        """
+        progress = {}
+        self.ui_call(lambda: progress.update(window=self.show_progress_dialog(title, total)))
+        
+        def on_progress(done, total, name):
+            self.ui_call(lambda: self.update_progress(progress.get('window'), done, total, name))
+        
+        return progress, on_progress
+    
+    def run_queued(self, job_manifest, progress, func, priority=None, job=None, **batch_args):
+        """Run a write job through the job queue (background thread).
+        
+        Waits for the job's turn, then runs ``jobs.run_batch`` with the
+        manifest's tasks. The progress dialog gets priority, pause and cancel
+        controls.
+        
+        Args:
+            job_manifest: The job's manifest.Manifest
+            progress: Progress dict from ``open_progress``
+            func, batch_args: Passed to ``jobs.run_batch``
+            priority: A ``job_queue.PRIORITIES`` key; default from the manifest, or normal
+            job: The manifest's job_queue.Job, if already queued
+        
+        Returns:
+            (completed, errors) - files not run because the job was cancelled
+            are reported as errors, so they aren't pushed to Immich
+        """
+        if job is None:
+            job = self.job_queue.add(job_manifest, priority)
+        self.ui_call(lambda: self.add_job_controls(progress.get('window'), job))
+        
+        with self.job_queue.turn(job):
+            completed, errors, not_run = jobs.run_batch(
+                func,
+                job_manifest.tasks,
+                cancel_event=job.cancel_event,
+                pause_event=job.pause_event,
+                manifest=job_manifest,
+                **batch_args
+            )
+        if not_run:
+            errors += [(str(task[0]), "Cancelled") for task in job_manifest.tasks[-not_run:]]
+        return completed, errors
+    
+    def add_job_controls(self, progress_window, job):
+        """Add priority, pause/resume and cancel controls for a queued job to its progress dialog."""
+        if not progress_window or not progress_window.winfo_exists():
+            return
+        # Other jobs can be queued while this one runs
+        progress_window.grab_release()
+        progress_window.geometry(f"500x250+{progress_window.winfo_x()}+{progress_window.winfo_y()}")
+        
+        controls = tk.Frame(progress_window)
+        controls.pack(pady=5)
+        
+        tk.Label(controls, text="Priority:", font=('Segoe UI', 10)).pack(side='left', padx=5)
+        priority_var = tk.StringVar(value=job.priority.title())
+        priority_box = ttk.Combobox(
+            controls,
+            textvariable=priority_var,
+            values=[name.title() for name in job_queue.PRIORITIES],
+            state='readonly',
+            width=8
+        )
+        priority_box.pack(side='left', padx=5)
+        priority_box.bind('<<ComboboxSelected>>', lambda event: job.set_priority(priority_var.get().lower()))
+        
+        def toggle_pause():
+            job.resume() if job.paused else job.pause()
+            refresh()
+        
+        def cancel():
+            if messagebox.askyesno(
+                "Cancel Job",
+                "Stop this job?\n\nFiles already written stay changed (Undo Last Job restores them).",
+                parent=progress_window
+            ):
+                job.cancel()
+                refresh()
+        
+        pause_button = ttk.Button(controls, text="⏸ Pause", command=toggle_pause)
+        pause_button.pack(side='left', padx=5)
+        cancel_button = ttk.Button(controls, text="✖ Cancel", command=cancel)
+        cancel_button.pack(side='left', padx=5)
+        
+        def refresh():
+            if not progress_window.winfo_exists():
+                return
+            pause_button.config(text="▶ Resume" if job.paused else "⏸ Pause")
+            if job.cancel_event.is_set():
+                for widget in (pause_button, cancel_button, priority_box):
+                    widget.config(state='disabled')
+                progress_window.status_label.config(text="Cancelling - finishing files in progress...")
+            elif job.state == job_queue.QUEUED:
+                waiting = job.waiting_behind()
+                progress_window.status_label.config(
+                    text="⏸ Paused" if job.paused else f"⏳ Queued - waiting for {waiting} job(s)")
+            elif job.paused:
+                progress_window.status_label.config(text="⏸ Paused - files in progress are finishing")
+            if job.state in (job_queue.QUEUED, job_queue.RUNNING):
+                progress_window.after(500, refresh)
+        
+        refresh()
+    
+    def ui_call(self, func):
+        """Run func on the Tk thread, timing how long it queued and how long it ran."""
+        queued = time.perf_counter()
+        
+        def run():
+            timing.recorder.record('tk.queue', queued, time.perf_counter() - queued)
+            with timing.span('tk.dispatch'):
+                func()
+        
+        self.after(0, run)
+    
+    def run_preflight(self, plan, on_ready):
+        """Run a preflight check in the background, then call ``on_ready(result)``.
+        
+        Args:
+            plan: Function returning (to_change, unchanged); runs off the UI thread
+            on_ready: Called on the UI thread with the result
+        """
+        self.configure(cursor='watch')
+        self.selection_label.configure(text="🔍 Checking current values...")
+        
+        def work():
+            result = plan()
+            
+            def done():
+                self.configure(cursor='')
+                self.update_selection_label()
+                on_ready(result)
+            
+            self.ui_call(done)
+        
+        threading.Thread(target=work, daemon=True).start()
+
+    def sidecar_mode(self):
+        """True if date/GPS edits go to XMP sidecars instead of the originals (UI thread)."""
+        return self.sidecar_var.get()
+
+    def immich_mode(self):
+        """Current Immich push mode: 'off', 'after' or 'only' (UI thread)."""
+        if not config.immich_server():
+            return 'off'
+        return self.IMMICH_MODES.get(self.immich_mode_var.get(), 'off')
+
+    def run_with_immich(self, mode, tasks, immich_fields, write_files):
+        """Run a file job and push its new values to Immich (background thread).
+
+        Assets are matched before the files are written, since rewriting a
+        file changes its checksum. Files the job failed to write are not
+        pushed.
+
+        Args:
+            mode: Immich push mode from ``immich_mode()``
+            tasks: Job tasks; each starts with the file path
+            immich_fields: Function returning the Immich update fields for a
+                task, or None if it has no value to push
+            write_files: Function running the file job, returning (completed, errors)
+
+        Returns:
+            (completed, errors) - files written (assets updated in 'only'
+            mode) and (file path or "Immich", error) pairs
+        """
+        if mode == 'off':
+            return write_files()
+
+        client = immich_sync.client_from_config()
+        try:
+            try:
+                matched = immich_sync.match_assets(client, [task[0] for task in tasks])
+            except immich_sync.ImmichError as e:
+                completed, errors = write_files() if mode == 'after' else (0, [])
+                return completed, errors + [("Immich", str(e))]
+
+            completed, errors = write_files() if mode == 'after' else (0, [])
+            failed = {exif_ops.path_key(path) for path, _ in errors}
+            updates = []
+            for task in tasks:
+                key = exif_ops.path_key(task[0])
+                asset_id = matched.get(key)
+                if key in failed:
+                    continue
+                if asset_id is None:
+                    errors.append((str(task[0]), "Not found in Immich"))
+                    continue
+                fields = immich_fields(task)
+                if fields is None:
+                    errors.append((str(task[0]), "No date/time to send to Immich"))
+                    continue
+                updates.append((asset_id, fields))
+
+            with timing.span('immich.push', assets=len(updates)):
+                pushed, push_errors = immich_sync.push_updates(client, updates)
+            errors += [("Immich", error) for error in push_errors]
+            return (pushed if mode == 'only' else completed), errors
+        finally:
+            client.close()
+
+    def _immich_confirm_note(self, mode):
+        """Extra confirmation line describing the Immich push mode."""
+        if mode == 'after':
+            return "\n☁️ Matching Immich assets will be updated too"
+        if mode == 'only':
+            return "\n☁️ Immich only: files are left unchanged"
+        return ""
+
+    def show_diagnostics(self):
+        """Show per-operation timings for the last job."""
+        window = tk.Toplevel(self)
+        window.title("Diagnostics")
+        window.geometry("820x520")
+        window.transient(self)
+        
+        header = tk.Label(window, font=('Segoe UI', 12, 'bold'), anchor='w')
+        header.pack(fill='x', padx=15, pady=(15, 5))
+        
+        columns = ('count', 'total', 'mean', 'p50', 'p95', 'max')
+        table = ttk.Treeview(window, columns=columns, height=10)
+        table.heading('#0', text='Operation')
+        table.column('#0', width=220)
+        for column, title in zip(columns, ('Count', 'Total (ms)', 'Mean (ms)', 'p50 (ms)', 'p95 (ms)', 'Max (ms)')):
+            table.heading(column, text=title)
+            table.column(column, width=90, anchor='e')
+        table.pack(fill='both', expand=True, padx=15, pady=5)
+        
+        # Latency histogram of the selected operation
+        histogram_text = tk.Text(window, height=10, font=('Consolas', 10), state='disabled')
+        histogram_text.pack(fill='x', padx=15, pady=5)
+        
+        def refresh():
+            summary = timing.recorder.summary()
+            job = timing.recorder.job_name or "(no job yet)"
+            header.config(text=f"Last job: {job}    started {timing.recorder.job_started:%H:%M:%S}")
+            if profiling.last_output:
+                profile_label.config(text=f"Last profile: {profiling.last_output}")
+            show_memory()
+            table.delete(*table.get_children())
+            for name, stats in summary.items():
+                table.insert('', 'end', iid=name, text=name, values=(
+                    stats['count'],
+                    f"{stats['total_ms']:.1f}",
+                    f"{stats['mean_ms']:.2f}",
+                    f"{stats['p50_ms']:.2f}",
+                    f"{stats['p95_ms']:.2f}",
+                    f"{stats['max_ms']:.1f}"
+                ))
+        
+        def show_histogram(event=None):
+            selection = table.selection()
+            stats = timing.recorder.summary().get(selection[0]) if selection else None
+            lines = []
+            if stats:
+                peak = max(stats['bucket_counts']) or 1
+                bounds = stats['buckets_ms'] + ['inf']
+                for bound, count in zip(bounds, stats['bucket_counts']):
+                    if count:
+                        bar = '#' * max(1, int(50 * count / peak))
+                        lines.append(f"<= {bound:>7} ms  {count:>7}  {bar}")
+            histogram_text.config(state='normal')
+            histogram_text.delete('1.0', 'end')
+            histogram_text.insert('1.0', '\n'.join(lines) or "Select an operation to see its histogram")
+            histogram_text.config(state='disabled')
+        
+        def export(kind):
+            path = filedialog.asksaveasfilename(
+                parent=window,
+                defaultextension='.json',
+                initialfile=f"{timing.recorder.job_name or 'timings'}{'.trace' if kind == 'trace' else ''}.json",
+                filetypes=[('JSON', '*.json')]
+            )
+            if not path:
+                return
+            if kind == 'trace':
+                timing.recorder.export_chrome_trace(path)
+            else:
+                timing.recorder.export_json(path)
+        
+        table.bind('<<TreeviewSelect>>', show_histogram)
+        
+        # Profiling toggle for the next job
+        profile_frame = tk.Frame(window)
+        profile_frame.pack(fill='x', padx=15)
+        
+        profile_var = tk.BooleanVar(value=profiling.armed_mode() is not None)
+        profile_mode = tk.StringVar(value=profiling.armed_mode() or 'collapsed')
+        
+        def toggle_profile(*args):
+            if profile_var.get():
+                profiling.arm(profile_mode.get())
+            else:
+                profiling.disarm()
+        
+        tk.Checkbutton(
+            profile_frame,
+            text="Profile the next job",
+            variable=profile_var,
+            command=toggle_profile,
+            font=('Segoe UI', 10)
+        ).pack(side='left')
+        ttk.Combobox(
+            profile_frame,
+            textvariable=profile_mode,
+            values=profiling.MODES,
+            state='readonly',
+            width=10
+        ).pack(side='left', padx=5)
+        profile_mode.trace_add('write', toggle_profile)
+        
+        profile_label = tk.Label(profile_frame, font=('Segoe UI', 9), fg='gray', anchor='w')
+        profile_label.pack(side='left', padx=10, fill='x')
+        
+        # Thumbnail and process memory
+        memory_label = tk.Label(window, font=('Segoe UI', 9), fg='gray', anchor='w', justify='left')
+        memory_label.pack(fill='x', padx=15, pady=(5, 0))
+        
+        def show_memory():
+            mb = 1024 * 1024
+            process = thumbnails.process_memory()
+            cache = self.thumbnail_cache
+            memory_label.config(text=(
+                f"Thumbnails shown: {len(self.photo_budget)} "
+                f"({self.photo_budget.bytes / mb:.1f} of {self.photo_budget.max_bytes / mb:.0f} MB, "
+                f"{self.photo_budget.evicted} evicted)    "
+                f"Cached: {len(cache)} ({cache.bytes / mb:.1f} of {cache.max_bytes / mb:.0f} MB, "
+                f"{cache.hits} hits, {cache.misses} misses)    "
+                f"Process: {f'{process / mb:.0f} MB' if process else 'unknown'}"
+            ))
+        
+        btn_frame = tk.Frame(window)
+        btn_frame.pack(pady=10)
+        for text, command in (
+            ("⟳ Refresh", refresh),
+            ("💾 Export JSON", lambda: export('json')),
+            ("💾 Export Chrome Trace", lambda: export('trace'))
+        ):
+            tk.Button(
+                btn_frame,
+                text=text,
+                command=command,
+                font=('Segoe UI', 11),
+                padx=15,
+                pady=6,
+                relief='flat',
+                cursor='hand2'
+            ).pack(side='left', padx=5)
+        
+        refresh()
+        show_histogram()
+    
     def create_ui(self):
         """Create the main user interface."""
         
@@ -291,6 +756,45 @@ class ExifEditor(ctk.CTk):
         )
         self.selection_label.grid(row=1, column=0, pady=2, sticky="w")
         
+        # Library search
+        search_frame = ctk.CTkFrame(header_frame, fg_color="transparent")
+        search_frame.grid(row=2, column=0, columnspan=2, pady=(8, 0), sticky="ew")
+        search_frame.grid_columnconfigure(0, weight=1)
+        
+        self.search_entry = ctk.CTkEntry(
+            search_frame,
+            placeholder_text='Search library: after:2023-01-01 near:Home within:2km camera:"Pixel 7" missing:gps name...',
+            height=32
+        )
+        self.search_entry.grid(row=0, column=0, padx=(0, 4), sticky="ew")
+        self.search_entry.bind('<Return>', lambda e: self.search_library())
+        
+        ctk.CTkButton(
+            search_frame,
+            text="🔎 Search",
+            width=90,
+            command=self.search_library
+        ).grid(row=0, column=1, padx=2)
+        
+        ctk.CTkButton(
+            search_frame,
+            text="📚 Index This Folder",
+            width=140,
+            command=self.index_current_folder,
+            fg_color="gray40",
+            hover_color="gray30"
+        ).grid(row=0, column=2, padx=2)
+        
+        # Background indexer status
+        self.index_status_label = ctk.CTkLabel(
+            search_frame,
+            text="",
+            font=ctk.CTkFont(size=11),
+            text_color="gray",
+            anchor="w"
+        )
+        self.index_status_label.grid(row=1, column=0, columnspan=3, sticky="w")
+        
         # Selection buttons
         button_frame = ctk.CTkFrame(header_frame)
         button_frame.grid(row=0, column=1, rowspan=2, sticky="e")
@@ -309,6 +813,46 @@ class ExifEditor(ctk.CTk):
             command=self.deselect_all_files
         ).pack(side="left", padx=2)
         
+        ctk.CTkButton(
+            button_frame,
+            text="📊 Diagnostics",
+            width=110,
+            command=self.show_diagnostics,
+            fg_color="gray40",
+            hover_color="gray30"
+        ).pack(side="left", padx=2)
+        
+        ctk.CTkButton(
+            button_frame,
+            text="↩️ Undo Last Job",
+            width=120,
+            command=self.undo_last_job,
+            fg_color="gray40",
+            hover_color="gray30"
+        ).pack(side="left", padx=2)
+        
+        # Write XMP sidecars instead of rewriting the originals
+        self.sidecar_var = tk.BooleanVar(value=config.xmp_sidecars())
+        ctk.CTkSwitch(
+            button_frame,
+            text="📝 XMP sidecars",
+            variable=self.sidecar_var,
+            width=120
+        ).pack(side="left", padx=8)
+        
+        # Immich push mode, only when a server is configured
+        self.immich_mode_var = ctk.StringVar(value=next(
+            label for label, mode in self.IMMICH_MODES.items() if mode == config.immich_push_mode()))
+        if config.immich_server():
+            ctk.CTkOptionMenu(
+                button_frame,
+                values=list(self.IMMICH_MODES),
+                variable=self.immich_mode_var,
+                width=150,
+                fg_color="gray40",
+                button_color="gray30"
+            ).pack(side="left", padx=2)
+        
         # Tree and file view container
         paned = ttk.PanedWindow(browser_frame, orient=tk.HORIZONTAL)
         paned.grid(row=1, column=0, sticky="nsew", padx=10, pady=(0, 10))
@@ -372,27 +916,41 @@ class ExifEditor(ctk.CTk):
         )
         self.path_label.pack(pady=5, padx=5, fill="x")
         
-        # Select All checkbox at top of file list
+        # Select All checkbox, sort and filter at top of file list
+        list_controls = ctk.CTkFrame(file_frame, fg_color="transparent")
+        list_controls.pack(pady=5, padx=5, fill="x")
+        
         self.select_all_var = tk.BooleanVar(value=False)
         select_all_checkbox = ctk.CTkCheckBox(
-            file_frame,
+            list_controls,
             text="Select All Files",
             variable=self.select_all_var,
             command=self.toggle_select_all
         )
-        select_all_checkbox.pack(pady=5, padx=5, anchor="w")
+        select_all_checkbox.pack(side="left")
+        
+        self.file_filter_var = ctk.StringVar(value=next(iter(self.FILE_FILTERS)))
+        ctk.CTkOptionMenu(
+            list_controls,
+            values=list(self.FILE_FILTERS),
+            variable=self.file_filter_var,
+            command=lambda choice: self.apply_file_view(),
+            width=140
+        ).pack(side="right", padx=2)
+        
+        self.file_sort_var = ctk.StringVar(value=next(iter(self.FILE_SORTS)))
+        ctk.CTkOptionMenu(
+            list_controls,
+            values=list(self.FILE_SORTS),
+            variable=self.file_sort_var,
+            command=lambda choice: self.apply_file_view(),
+            width=130
+        ).pack(side="right", padx=2)
         
         # File list
         self.file_scroll = ctk.CTkScrollableFrame(file_frame)
         self.file_scroll.pack(fill="both", expand=True, padx=5, pady=5)
         
-        # Load initial directory
-        self.populate_folder_tree()
-        self.load_directory()
-        
-        # Expand to Z:\photos if it exists
-        if Path('Z:/photos').exists():
-            self.expand_to_path(Path('Z:/photos'))
     
     def expand_to_path(self, target_path):
         """Expand tree to show a specific path."""
@@ -443,32 +1001,45 @@ class ExifEditor(ctk.CTk):
             self.folder_tree.see(current_node)
             self.folder_tree.event_generate('<<TreeviewSelect>>')
     
-    def populate_folder_tree(self):
-        """Populate the folder tree with drives and directories."""
+    def populate_folder_tree(self, on_done=None):
+        """Populate the folder tree with drives and directories.
+        
+        Drives are checked on a background thread, since a disconnected
+        network drive can take seconds to answer.
+        
+        Args:
+            on_done: Optional, called on the UI thread once the drives are listed
+        """
         # Clear existing
         for item in self.folder_tree.get_children():
             self.folder_tree.delete(item)
         
-        # Add drives (Windows)
-        if platform.system() == 'Windows':
-            import string
-            from ctypes import windll
-            
+        self.folder_tree.bind('<<TreeviewOpen>>', self.on_tree_expand)
+        
+        def find_drives():
             drives = []
-            bitmask = windll.kernel32.GetLogicalDrives()
-            for letter in string.ascii_uppercase:
-                if bitmask & 1:
-                    drives.append(f"{letter}:\\")
-                bitmask >>= 1
-            
+            # Add drives (Windows)
+            if platform.system() == 'Windows':
+                import string
+                from ctypes import windll
+                
+                with timing.span('startup.drives'):
+                    bitmask = windll.kernel32.GetLogicalDrives()
+                    for letter in string.ascii_uppercase:
+                        if bitmask & 1 and Path(f"{letter}:\\").exists():
+                            drives.append(f"{letter}:\\")
+                        bitmask >>= 1
+            self.ui_call(lambda: show_drives(drives))
+        
+        def show_drives(drives):
             for drive in drives:
-                drive_path = Path(drive)
-                if drive_path.exists():
-                    node = self.folder_tree.insert('', 'end', text=drive, values=[str(drive_path)])
-                    # Add dummy child to make it expandable
-                    self.folder_tree.insert(node, 'end', text='Loading...')
+                node = self.folder_tree.insert('', 'end', text=drive, values=[str(Path(drive))])
+                # Add dummy child to make it expandable
+                self.folder_tree.insert(node, 'end', text='Loading...')
+            if on_done:
+                on_done()
         
-        self.folder_tree.bind('<<TreeviewOpen>>', self.on_tree_expand)
+        threading.Thread(target=find_drives, daemon=True).start()
     
     def on_tree_expand(self, event):
         """Load subdirectories when tree node is expanded."""
@@ -517,9 +1088,45 @@ class ExifEditor(ctk.CTk):
     
     def load_directory(self):
         """Load and display files from current directory."""
+        # Profile this load and the background loads it queues, if requested
+        profile = profiling.start_session('load_directory')
+        self._load_wrap = profile.wrap if profile else (lambda func: func)
+        self._pending_loads = []
+        
+        try:
+            self._load_wrap(self._load_directory)()
+        finally:
+            if profile:
+                pending = self._pending_loads
+                
+                def finish_profile():
+                    for load in pending:
+                        load.result() if hasattr(load, 'result') else load.join()
+                    profile.stop()
+                
+                threading.Thread(target=finish_profile, daemon=True).start()
+    
+    def _load_directory(self):
         # Update path label
         self.path_label.configure(text=str(self.current_directory))
         
+        # Get image files
+        try:
+            files = exif_ops.list_image_files(self.current_directory)
+        except PermissionError:
+            self.show_file_list([], "")
+            messagebox.showerror("Error", f"Permission denied: {self.current_directory}")
+            return
+        
+        self.show_file_list(files, "No image files found in this directory")
+    
+    def show_file_list(self, files, empty_text):
+        """Replace the file list with ``files`` (a folder, or library search results).
+        
+        Args:
+            files: Files to show
+            empty_text: Shown instead if there are none
+        """
         # Clear existing file widgets
         for widget in self.file_scroll.winfo_children():
             widget.destroy()
@@ -528,31 +1135,177 @@ class ExifEditor(ctk.CTk):
         self.selected_files.clear()
         self.all_files.clear()
         self.loaded_files.clear()  # Clear loaded tracking
+        self.last_selected_index = None
+        self.photo_budget.clear()
+        self._thumbnail_pending.clear()
+        self._visible_rows = (0, 15)
+        self._last_view = None
         
-        # Get image files
-        image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.tif'}
-        
-        try:
-            for item in sorted(self.current_directory.iterdir()):
-                if item.is_file() and item.suffix.lower() in image_extensions:
-                    self.all_files.append(item)
-        except PermissionError:
-            messagebox.showerror("Error", f"Permission denied: {self.current_directory}")
-            return
+        self.all_files.extend(files)
+        self.file_table = None
         
         # Display files
         if not self.all_files:
-            ctk.CTkLabel(
-                self.file_scroll,
-                text="No image files found in this directory",
-                text_color="gray"
-            ).pack(pady=20)
+            if empty_text:
+                ctk.CTkLabel(
+                    self.file_scroll,
+                    text=empty_text,
+                    text_color="gray"
+                ).pack(pady=20)
+            self.update_selection_label()
             return
         
         # Create all file widgets (instant)
         for idx, file_path in enumerate(self.all_files):
             self.create_file_item(file_path, idx, load_immediately=(idx < 15))
         
+        # Keep the chosen sort and filter across folders
+        if self.file_view() != ('name', False, 'all'):
+            self.apply_file_view()
+        
+        self.update_selection_label()
+    
+    def refresh_file_view(self):
+        """Re-read dates and locations after a job changed them, if the list is sorted or filtered by them."""
+        if self.file_table is not None:
+            self.file_table.complete = False
+        if self.file_view() != ('name', False, 'all'):
+            self.apply_file_view()
+    
+    def search_library(self):
+        """Show the indexed files matching the search box in the file list."""
+        text = self.search_entry.get().strip()
+        if not text:
+            self.load_directory()
+            return
+        
+        try:
+            library.parse_query(text)
+        except ValueError as e:
+            messagebox.showerror("Search", f"{e}\n\n{library.SEARCH_HELP}")
+            return
+        
+        self.configure(cursor='watch')
+        
+        def work():
+            try:
+                result = library.search(text)
+                count = library.stats()[0]
+            except Exception as e:
+                error = str(e)
+                self.ui_call(lambda: (self.configure(cursor=''), messagebox.showerror("Search", error)))
+                return
+            self.ui_call(lambda: self._show_search_results(text, result, count))
+        
+        threading.Thread(target=work, daemon=True).start()
+    
+    def _show_search_results(self, text, result, library_count):
+        """Show search results in the file list."""
+        self.configure(cursor='')
+        files, more = result
+        if not library_count:
+            messagebox.showinfo(
+                "Library Empty",
+                "Nothing has been indexed yet.\n\n"
+                "Open a folder and click 📚 Index This Folder to add it and its subfolders."
+            )
+            return
+        
+        summary = f"first {len(files)}" if more else str(len(files))
+        self.path_label.configure(text=f"🔎 {text} — {summary} of {library_count} indexed file(s)")
+        self.show_file_list(files, "No indexed files match this search")
+    
+    def index_current_folder(self):
+        """Add the current folder and its subfolders to the library index."""
+        directory = self.current_directory
+        self.selection_label.configure(text=f"📚 Indexing {directory.name or directory}...")
+        
+        def on_progress(done, total):
+            self.ui_call(lambda: self.selection_label.configure(
+                text=f"📚 Indexing {directory.name or directory}... {done}/{total}"))
+        
+        def work():
+            try:
+                indexed, total = library.index_folder(directory, on_progress)
+            except Exception as e:
+                error = str(e)
+                self.ui_call(lambda: (self.update_selection_label(),
+                                      messagebox.showerror("Index Failed", error)))
+                return
+            
+            def done():
+                self.update_selection_label()
+                self.show_auto_close_message(
+                    "Library Updated",
+                    f"Indexed {indexed} new or changed file(s)\n"
+                    f"{total} file(s) in {directory}"
+                )
+            
+            self.ui_call(done)
+        
+        threading.Thread(target=work, daemon=True).start()
+    
+    def file_view(self):
+        """Return the chosen (sort, descending, filter) of the file list."""
+        sort, descending = self.FILE_SORTS[self.file_sort_var.get()]
+        return sort, descending, self.FILE_FILTERS[self.file_filter_var.get()]
+    
+    def apply_file_view(self):
+        """Re-order and filter the file list for the chosen sort and filter.
+        
+        The first sort or filter that needs dates or locations reads them
+        for the whole folder in the background, then applies itself.
+        """
+        sort, descending, filter_name = self.file_view()
+        if self.file_table is None:
+            import file_table
+            self.file_table = file_table.FileTable(self.all_files)
+        table = self.file_table
+        
+        if (sort != 'name' or filter_name != 'all') and not table.complete:
+            self.selection_label.configure(text="🔍 Reading dates and locations...")
+            if table.reading:
+                return  # The read in progress applies the latest choice
+            table.reading = True
+            
+            def read():
+                try:
+                    table.read_all()
+                except Exception as e:
+                    error = str(e)
+                    self.ui_call(lambda: self.selection_label.configure(
+                        text=f"⚠️ Couldn't read dates and locations: {error}"))
+                    return
+                finally:
+                    table.reading = False
+                # Only if the folder wasn't changed in the meantime
+                self.ui_call(lambda: self.apply_file_view() if table is self.file_table else None)
+            
+            threading.Thread(target=read, daemon=True).start()
+            return
+        
+        with timing.span('file_list.view', files=len(table)):
+            order = table.view(sort, descending, filter_name)
+        files = [table.files[i] for i in order.tolist()]
+        if files == self.all_files:
+            self.update_selection_label()
+            return
+        
+        # Re-pack the existing widgets in the new order
+        for file_path in self.all_files:
+            self.file_widgets[file_path]['frame'].pack_forget()
+        for idx, file_path in enumerate(files):
+            widget = self.file_widgets[file_path]
+            widget['index'] = idx
+            widget['frame'].pack(pady=1, padx=5, fill="x")
+        self.all_files[:] = files
+        
+        # Hidden files can't stay selected
+        shown = set(files)
+        for file_path in [f for f in self.selected_files if f not in shown]:
+            self.file_widgets[file_path]['var'].set(False)
+            self.selected_files.remove(file_path)
+        self.last_selected_index = None
         self.update_selection_label()
     
     def create_file_item(self, file_path, index, load_immediately=False):
@@ -562,7 +1315,7 @@ class ExifEditor(ctk.CTk):
         item_frame.pack_propagate(False)
         
         # Make frame clickable
-        item_frame.bind('<Button-1>', lambda e: self.on_file_click(file_path, index, e))
+        item_frame.bind('<Button-1>', lambda e: self.on_file_click(file_path, e))
         
         # Checkbox
         var = tk.BooleanVar(value=False)
@@ -574,12 +1327,12 @@ class ExifEditor(ctk.CTk):
             command=lambda: self.toggle_file_selection(file_path, var)
         )
         checkbox.pack(side="left", padx=5)
-        checkbox.bind('<Button-1>', lambda e: self.on_checkbox_click(file_path, index, e))
+        checkbox.bind('<Button-1>', lambda e: self.on_checkbox_click(file_path, e))
         
-        # Thumbnail placeholder
-        thumb_label = ctk.CTkLabel(item_frame, text="📷", width=80, height=80)
+        # Thumbnail placeholder (stays for formats without thumbnails, e.g. video)
+        thumb_label = ctk.CTkLabel(item_frame, text=formats.handler_for(file_path).icon, width=80, height=80)
         thumb_label.pack(side="left", padx=5)
-        thumb_label.bind('<Button-1>', lambda e: self.on_file_click(file_path, index, e))
+        thumb_label.bind('<Button-1>', lambda e: self.on_file_click(file_path, e))
         
         # Filename and date container
         info_frame = ctk.CTkFrame(item_frame, fg_color="transparent")
@@ -592,7 +1345,7 @@ class ExifEditor(ctk.CTk):
             font=ctk.CTkFont(size=12)
         )
         name_label.pack(anchor="w")
-        name_label.bind('<Button-1>', lambda e: self.on_file_click(file_path, index, e))
+        name_label.bind('<Button-1>', lambda e: self.on_file_click(file_path, e))
         
         # Date placeholder
         date_label = ctk.CTkLabel(
@@ -603,7 +1356,7 @@ class ExifEditor(ctk.CTk):
             text_color="gray"
         )
         date_label.pack(anchor="w")
-        date_label.bind('<Button-1>', lambda e: self.on_file_click(file_path, index, e))
+        date_label.bind('<Button-1>', lambda e: self.on_file_click(file_path, e))
         
         # Store reference
         self.file_widgets[file_path] = {
@@ -618,19 +1371,18 @@ class ExifEditor(ctk.CTk):
         # Load immediately or queue for lazy loading
         if load_immediately:
             # Load first 15 files immediately (unthrottled)
-            threading.Thread(
-                target=self.load_thumbnail,
-                args=(file_path, thumb_label),
-                daemon=True
-            ).start()
-            threading.Thread(
-                target=self.load_file_datetime,
-                args=(file_path, date_label),
-                daemon=True
-            ).start()
+            for target, args in (
+                (self.load_thumbnail, (file_path,)),
+                (self.load_file_datetime, (file_path, date_label))
+            ):
+                thread = threading.Thread(target=self._load_wrap(target), args=args, daemon=True)
+                thread.start()
+                self._pending_loads.append(thread)
         else:
             # Queue for throttled background loading
-            self.load_executor.submit(self.lazy_load_file_data, file_path)
+            self._pending_loads.append(
+                self.load_executor.submit(self._load_wrap(self.lazy_load_file_data), file_path)
+            )
     
     def lazy_load_file_data(self, file_path):
         """Load thumbnail and date in background (throttled via executor)."""
@@ -645,38 +1397,25 @@ class ExifEditor(ctk.CTk):
         
         # Load thumbnail
         try:
-            img = Image.open(file_path)
-            img.thumbnail((80, 80))
-            photo = ImageTk.PhotoImage(img)
-            self.after(0, lambda: self.update_thumbnail(widget['thumb_label'], photo))
+            img = self.thumbnail_image(file_path)
+            self.ui_call(lambda: self.show_thumbnail(file_path, img))
         except:
-            pass
+            self._no_thumbnail.add(file_path)
         
         # Load EXIF date
         try:
-            cmd = 'exiftool.exe' if platform.system() == 'Windows' else 'exiftool'
-            args = [cmd, '-DateTimeOriginal', '-s3', str(file_path)]
-            
-            result = subprocess.run(
-                args,
-                capture_output=True,
-                text=True,
-                shell=(platform.system() == 'Windows')
-            )
-            
-            if result.returncode == 0 and result.stdout.strip():
-                dt_str = result.stdout.strip()
-                dt = datetime.strptime(dt_str, "%Y:%m:%d %H:%M:%S")
+            dt = exif_ops.read_datetime_original(file_path)
+            if dt:
                 display_text = dt.strftime("%d/%m/%Y %H:%M")
             else:
                 display_text = "No date"
             
-            self.after(0, lambda: widget['date_label'].configure(text=display_text))
+            self.ui_call(lambda: widget['date_label'].configure(text=display_text))
         except:
-            self.after(0, lambda: widget['date_label'].configure(text="No date"))
+            self.ui_call(lambda: widget['date_label'].configure(text="No date"))
     
     
-    def on_checkbox_click(self, file_path, index, event):
+    def on_checkbox_click(self, file_path, event):
         """Handle checkbox click with modifier keys."""
         # Capture modifier state immediately before it gets lost in after_idle
         ctrl_pressed = bool(event.state & 0x0004)
@@ -684,21 +1423,22 @@ class ExifEditor(ctk.CTk):
         
         if ctrl_pressed or shift_pressed:
             # Modifiers present - handle selection immediately
-            self.handle_selection(file_path, index, event)
+            self.handle_selection(file_path, event)
             return "break"
         else:
             # No modifiers - use after_idle to let checkbox toggle normally first
-            event.widget.after_idle(lambda: self.handle_selection(file_path, index, event))
+            event.widget.after_idle(lambda: self.handle_selection(file_path, event))
             return "break"
     
-    def on_file_click(self, file_path, index, event):
+    def on_file_click(self, file_path, event):
         """Handle file item click with modifier keys."""
-        self.handle_selection(file_path, index, event)
+        self.handle_selection(file_path, event)
     
-    def handle_selection(self, file_path, index, event):
+    def handle_selection(self, file_path, event):
         """Handle selection with Ctrl and Shift modifiers."""
         ctrl_pressed = event.state & 0x0004  # Ctrl key
         shift_pressed = event.state & 0x0001  # Shift key
+        index = self.file_widgets[file_path]['index']  # Position in the current order
         
         if shift_pressed and self.last_selected_index is not None:
             # Range selection
@@ -763,9 +1503,9 @@ class ExifEditor(ctk.CTk):
             self.deselect_all_files()
     
     def select_all_files(self):
-        """Select all files in current directory."""
-        for file_path, widget in self.file_widgets.items():
-            widget['var'].set(True)
+        """Select all files shown in the list."""
+        for file_path in self.all_files:
+            self.file_widgets[file_path]['var'].set(True)
             if file_path not in self.selected_files:
                 self.selected_files.append(file_path)
         
@@ -781,41 +1521,107 @@ class ExifEditor(ctk.CTk):
         self.select_all_var.set(False)
         self.update_selection_label()
     
-    def load_thumbnail(self, file_path, label):
+    def load_thumbnail(self, file_path):
         """Load thumbnail image in background."""
         try:
-            img = Image.open(file_path)
-            img.thumbnail((80, 80))  # Bigger thumbnails
-            photo = ImageTk.PhotoImage(img)
-            self.after(0, lambda: self.update_thumbnail(label, photo))
-        except Exception as e:
-            pass
+            img = self.thumbnail_image(file_path)
+            self.ui_call(lambda: self.show_thumbnail(file_path, img))
+        except Exception:
+            self._no_thumbnail.add(file_path)
+        finally:
+            self._thumbnail_pending.discard(file_path)
+    
+    def thumbnail_image(self, file_path):
+        """Return a file's thumbnail from the cache, or make and cache it (background thread)."""
+        key = exif_ops.path_key(file_path)
+        img = self.thumbnail_cache.get(key)
+        if img is None:
+            img = exif_ops.make_thumbnail(file_path)
+            import duplicates
+            duplicates.remember(file_path, img)
+            self.thumbnail_cache.put(key, img)
+        return img
+    
+    def _near_viewport(self, file_path):
+        """True if a file's row is on screen or within a screen of it."""
+        widget = self.file_widgets.get(file_path)
+        if not widget:
+            return False
+        index = widget['index']
+        if index >= len(self.all_files) or self.all_files[index] != file_path:
+            return False  # Hidden by the filter
+        first, last = self._visible_rows
+        margin = max(last - first, 15)
+        return first - margin <= index < last + margin
+    
+    def show_thumbnail(self, file_path, img):
+        """Show a loaded thumbnail if its row is near the viewport, within the memory budget."""
+        widget = self.file_widgets.get(file_path)
+        if not widget or file_path in self.photo_budget or not self._near_viewport(file_path):
+            return  # Cached; shown when scrolled to
+        photo = ImageTk.PhotoImage(img)
+        self.update_thumbnail(widget['thumb_label'], photo)
+        self.photo_budget.add(file_path, photo.width(), photo.height())
+        
+        if self.photo_budget.bytes > self.photo_budget.max_bytes:
+            first, last = self._visible_rows
+            margin = max(last - first, 15)
+            keep = self.all_files[max(0, first - margin):last + margin]
+            for evicted in self.photo_budget.evict(keep):
+                self.clear_thumbnail(evicted)
+    
+    def clear_thumbnail(self, file_path):
+        """Drop a row's image, leaving the placeholder."""
+        widget = self.file_widgets.get(file_path)
+        if widget:
+            widget['thumb_label'].configure(image='', text=formats.handler_for(file_path).icon)
+            widget['thumb_label'].image = None
+    
+    def _watch_viewport(self):
+        """Every 200 ms: after a scroll, show thumbnails for the rows now near the viewport."""
+        try:
+            view = self.file_scroll._parent_canvas.yview()
+        except (AttributeError, tk.TclError):
+            view = None
+        if view and view != self._last_view and self.all_files:
+            self._last_view = view
+            count = len(self.all_files)
+            first = int(view[0] * count)
+            last = min(count, int(view[1] * count) + 1)
+            self._visible_rows = (first, last)
+            self.photo_budget.touch(self.all_files[first:last])
+            
+            margin = max(last - first, 15)
+            # On-screen rows first, then the rows either side
+            nearby = self.all_files[first:last] + self.all_files[max(0, first - margin):first] \
+                + self.all_files[last:last + margin]
+            for file_path in nearby:
+                if (file_path in self.photo_budget or file_path in self._thumbnail_pending
+                        or file_path in self._no_thumbnail):
+                    continue
+                img = self.thumbnail_cache.get(exif_ops.path_key(file_path))
+                if img is not None:
+                    self.show_thumbnail(file_path, img)
+                elif file_path in self.loaded_files:
+                    # Made before but dropped from the cache too: read it again
+                    self._thumbnail_pending.add(file_path)
+                    self.load_executor.submit(self.load_thumbnail, file_path)
+        
+        self.after(200, self._watch_viewport)
     
     def load_file_datetime(self, file_path, label):
         """Load DateTimeOriginal from file in background."""
         try:
-            cmd = 'exiftool.exe' if platform.system() == 'Windows' else 'exiftool'
-            args = [cmd, '-DateTimeOriginal', '-s3', str(file_path)]
-            
-            result = subprocess.run(
-                args,
-                capture_output=True,
-                text=True,
-                shell=(platform.system() == 'Windows')
-            )
-            
-            if result.returncode == 0 and result.stdout.strip():
-                # Parse the datetime (format: 2024:01:17 14:30:25)
-                dt_str = result.stdout.strip()
-                dt = datetime.strptime(dt_str, "%Y:%m:%d %H:%M:%S")
+            dt = exif_ops.read_datetime_original(file_path)
+            if dt:
                 display_text = dt.strftime("%d/%m/%Y %H:%M")
             else:
                 display_text = "No date set"
             
             # Update label on main thread
-            self.after(0, lambda: label.configure(text=display_text))
+            self.ui_call(lambda: label.configure(text=display_text))
         except Exception as e:
-            self.after(0, lambda: label.configure(text="No date set"))
+            self.ui_call(lambda: label.configure(text="No date set"))
     
     def update_thumbnail(self, label, photo):
         """Update thumbnail label with image."""
@@ -858,6 +1664,12 @@ class ExifEditor(ctk.CTk):
         # GPS Location Tab
         self.create_gps_tab()
         
+        # Geotag Tab
+        self.create_geotag_tab()
+        
+        # Duplicates Tab
+        self.create_duplicates_tab()
+        
         # Sanitise Tab
         self.create_sanitise_tab()
     
@@ -907,6 +1719,21 @@ class ExifEditor(ctk.CTk):
         self.increment_entry.insert(0, "1")
         self.increment_entry.grid(row=2, column=1, padx=5, pady=5, sticky="ew")
         
+        # Shift existing dates instead of setting them
+        shift_frame = ctk.CTkFrame(tab)
+        shift_frame.pack(pady=5, padx=10, fill="x")
+        shift_frame.grid_columnconfigure(1, weight=1)
+        
+        ctk.CTkLabel(shift_frame, text="Shift by:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
+        self.shift_entry = ctk.CTkEntry(shift_frame, placeholder_text="+1:13 or -0:30:15 or +1 2:00 (days)")
+        self.shift_entry.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
+        ctk.CTkButton(
+            shift_frame,
+            text="↔️ Shift",
+            width=80,
+            command=self.shift_datetime
+        ).grid(row=0, column=2, padx=5, pady=5)
+        
         # Set today button
         button_frame = ctk.CTkFrame(tab)
         button_frame.pack(pady=5, padx=10, fill="x")
@@ -1260,6 +2087,7 @@ class ExifEditor(ctk.CTk):
             f.write(html_content)
             self.map_html_path = f.name
         
+        import webbrowser
         webbrowser.open('file://' + self.map_html_path)
         self.start_coordinate_polling()
         self.start_preset_save_polling()
@@ -1368,103 +2196,581 @@ class ExifEditor(ctk.CTk):
         self._polling_active = True
         self.after(1000, check_preset_save)
     
-    def create_sanitise_tab(self):
-        """Create the sanitise for sharing tab."""
-        tab = self.tabview.add("🧹 Sanitise")
+    def create_geotag_tab(self):
+        """Create the tab for geotagging from GPS tracks."""
+        tab = self.tabview.add("🛰️ Geotag")
         tab.grid_columnconfigure(0, weight=1)
         
+        self.geotrack = None
+        
         # Instructions
         ctk.CTkLabel(
             tab,
-            text="Remove sensitive EXIF data before sharing",
-            font=ctk.CTkFont(size=14, weight="bold")
-        ).pack(pady=20, padx=10)
-        
-        # What will be removed
-        info_frame = ctk.CTkFrame(tab)
-        info_frame.pack(pady=10, padx=10, fill="both", expand=True)
+            text="Geotag photos from GPX/CSV tracks",
+            font=ctk.CTkFont(size=16, weight="bold")
+        ).pack(pady=15, padx=10)
         
         ctk.CTkLabel(
-            info_frame,
-            text="This will remove:",
-            font=ctk.CTkFont(size=12, weight="bold"),
+            tab,
+            text="Each photo's DateTimeOriginal is matched to the track and its\n"
+                 "position interpolated between the nearest track points.",
+            text_color="gray",
+            font=ctk.CTkFont(size=11),
+            justify="left"
+        ).pack(pady=5, padx=20, anchor="w")
+        
+        # Track files
+        track_frame = ctk.CTkFrame(tab)
+        track_frame.pack(pady=15, padx=20, fill="x")
+        
+        ctk.CTkButton(
+            track_frame,
+            text="📂 Load Tracks...",
+            command=self.load_geotag_tracks,
+            height=35
+        ).pack(side="left", padx=10, pady=10)
+        
+        self.geotrack_label = ctk.CTkLabel(
+            track_frame,
+            text="No track loaded",
+            text_color="gray",
             anchor="w"
-        ).pack(pady=10, padx=10, anchor="w")
-        
-        items_to_remove = [
-            "• All GPS location data",
-            "• Camera make and model",
-            "• Camera serial number",
-            "• Lens information",
-            "• Copyright information",
-            "• Author/Artist information",
-            "• Software used",
-            "• All metadata except essential image data"
-        ]
+        )
+        self.geotrack_label.pack(side="left", padx=10, fill="x", expand=True)
         
-        for item in items_to_remove:
-            ctk.CTkLabel(
-                info_frame,
-                text=item,
-                anchor="w",
-                text_color="gray"
-            ).pack(pady=2, padx=20, anchor="w")
+        # Matching options
+        options_frame = ctk.CTkFrame(tab)
+        options_frame.pack(pady=15, padx=20, fill="x")
+        options_frame.grid_columnconfigure(1, weight=1)
         
-        # Warning
-        warning_frame = ctk.CTkFrame(tab, fg_color="darkred")
-        warning_frame.pack(pady=10, padx=10, fill="x")
+        ctk.CTkLabel(options_frame, text="Camera offset from UTC:", font=ctk.CTkFont(size=12)).grid(
+            row=0, column=0, padx=10, pady=8, sticky="w"
+        )
+        self.geotag_offset_entry = ctk.CTkEntry(
+            options_frame,
+            placeholder_text="e.g., +08:00",
+            height=35
+        )
+        self.geotag_offset_entry.grid(row=0, column=1, padx=10, pady=8, sticky="ew")
+        
+        ctk.CTkLabel(options_frame, text="Max gap (seconds):", font=ctk.CTkFont(size=12)).grid(
+            row=1, column=0, padx=10, pady=8, sticky="w"
+        )
+        self.geotag_gap_entry = ctk.CTkEntry(options_frame, height=35)
+        self.geotag_gap_entry.grid(row=1, column=1, padx=10, pady=8, sticky="ew")
         
         ctk.CTkLabel(
-            warning_frame,
-            text="⚠️ Warning: This action cannot be undone!\nMake sure you have backups.",
-            font=ctk.CTkFont(size=12, weight="bold"),
-            text_color="white"
-        ).pack(pady=10, padx=10)
+            options_frame,
+            text="Offset = camera time zone plus clock error, e.g. +09:13 if the camera\n"
+                 "was set to Perth time (+08:00) and ran 1h13m fast.",
+            text_color="gray",
+            font=ctk.CTkFont(size=11),
+            justify="left"
+        ).grid(row=2, column=0, columnspan=2, padx=10, pady=(0, 8), sticky="w")
         
         # Apply button
         ctk.CTkButton(
             tab,
-            text="🧹 Sanitise Selected Files",
-            command=self.sanitise_files,
-            fg_color="orange",
-            hover_color="darkorange",
-            height=40
-        ).pack(pady=20, padx=10, fill="x")
-    
-    def set_today(self):
-        """Set date to today."""
-        today = datetime.now()
-        self.date_entry.delete(0, 'end')
-        self.date_entry.insert(0, today.strftime("%d/%m/%Y"))
-        self.time_entry.delete(0, 'end')
-        self.time_entry.insert(0, today.strftime("%H:%M"))
-    
-    def use_file_datetime(self):
-        """Extract DateTimeOriginal from first selected file and populate fields."""
-        if not self.selected_files:
-            messagebox.showwarning("No Selection", "Please select at least one file first")
-            return
+            text="🛰️ Geotag Selected Files",
+            command=self.geotag_files,
+            fg_color="green",
+            hover_color="darkgreen",
+            height=50,
+            font=ctk.CTkFont(size=14, weight="bold")
+        ).pack(pady=20, padx=20, fill="x")
         
-        # Get first selected file
-        file_path = self.selected_files[0]
+        # Infer from nearby photos
+        infer_frame = ctk.CTkFrame(tab)
+        infer_frame.pack(pady=15, padx=20, fill="x")
+        infer_frame.grid_columnconfigure(1, weight=1)
+        
+        ctk.CTkLabel(
+            infer_frame,
+            text="📸 Infer GPS from nearby photos",
+            font=ctk.CTkFont(size=13, weight="bold")
+        ).grid(row=0, column=0, columnspan=2, padx=10, pady=(10, 0), sticky="w")
+        
+        ctk.CTkLabel(
+            infer_frame,
+            text="Untagged selected photos get the location of the geotagged photo\n"
+                 "taken closest in time anywhere in the current folder and its subfolders.",
+            text_color="gray",
+            font=ctk.CTkFont(size=11),
+            justify="left"
+        ).grid(row=1, column=0, columnspan=2, padx=10, pady=5, sticky="w")
+        
+        ctk.CTkLabel(infer_frame, text="Time window (minutes):", font=ctk.CTkFont(size=12)).grid(
+            row=2, column=0, padx=10, pady=8, sticky="w"
+        )
+        self.infer_window_entry = ctk.CTkEntry(infer_frame, height=35)
+        self.infer_window_entry.grid(row=2, column=1, padx=10, pady=8, sticky="ew")
+        
+        ctk.CTkButton(
+            infer_frame,
+            text="🔎 Infer GPS for Selected Files",
+            command=self.infer_gps,
+            height=40
+        ).grid(row=3, column=0, columnspan=2, padx=10, pady=10, sticky="ew")
+    
+    def load_geotag_tracks(self):
+        """Choose and load GPX/CSV track files."""
+        import geotag
+        
+        paths = filedialog.askopenfilenames(
+            title="Load GPS Tracks",
+            filetypes=[("GPS tracks", "*.gpx *.csv"), ("All files", "*.*")]
+        )
+        if not paths:
+            return
+        
+        self.geotrack_label.configure(text=f"Loading {len(paths)} file(s)...")
+        
+        # Large tracks take a few seconds to parse
+        def load():
+            try:
+                with timing.span('geotag.load_tracks'):
+                    track = geotag.load_tracks(paths)
+            except (OSError, geotag.TrackError) as e:
+                error = str(e)
+                self.ui_call(lambda: self._finish_load_tracks(None, error))
+                return
+            self.ui_call(lambda: self._finish_load_tracks(track, None))
+        
+        threading.Thread(target=load, daemon=True).start()
+    
+    def _finish_load_tracks(self, track, error):
+        if error:
+            self.geotrack_label.configure(text="No track loaded")
+            messagebox.showerror("Track Error", f"Could not load track:\n{error}")
+            return
+        
+        self.geotrack = track
+        if not len(track):
+            self.geotrack_label.configure(text="Track has no timed points")
+            return
+        self.geotrack_label.configure(
+            text=f"{len(track):,} points, {track.start:%d/%m/%Y %H:%M} - {track.end:%d/%m/%Y %H:%M} UTC"
+        )
+    
+    def geotag_files(self):
+        """Match the selected files to the loaded track and write their GPS."""
+        import geotag
+        
+        if not self.selected_files:
+            messagebox.showwarning("No Selection", "Please select files first")
+            return
+        
+        if not self.geotrack or not len(self.geotrack):
+            messagebox.showwarning("No Track", "Please load a GPX or CSV track first")
+            return
         
         try:
-            # Run exiftool to get DateTimeOriginal
-            cmd = 'exiftool.exe' if platform.system() == 'Windows' else 'exiftool'
-            args = [cmd, '-DateTimeOriginal', '-s3', str(file_path)]
-            
-            result = subprocess.run(
-                args,
-                capture_output=True,
-                text=True,
-                shell=(platform.system() == 'Windows')
+            offset = geotag.parse_offset(self.geotag_offset_entry.get())
+            max_gap = float(self.geotag_gap_entry.get().strip())
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid matching options: {e}")
+            return
+        
+        # Snapshot the selection so changes made while the job runs don't affect it
+        files = list(self.selected_files)
+        track = self.geotrack
+        
+        # Read dates, match and check which files already hold the position
+        self.run_preflight(
+            lambda: geotag.plan(files, track, offset, max_gap),
+            self._confirm_geotag
+        )
+    
+    def _confirm_geotag(self, plan):
+        """Confirm and start a geotag job for the matched files."""
+        tasks, unchanged, unmatched = plan
+        
+        if not tasks:
+            messagebox.showinfo(
+                "Nothing to Change",
+                f"No files to geotag.\n\n"
+                f"Already tagged: {len(unchanged)}\n"
+                f"No match (no date, or too far from the track): {len(unmatched)}"
+            )
+            return
+        
+        preview = "".join(
+            f"• {Path(file_path).name}: {lat:.6f}, {lon:.6f}\n"
+            for file_path, lat, lon in tasks[:5]
+        )
+        if len(tasks) > 5:
+            preview += f"... and {len(tasks) - 5} more\n"
+        
+        confirm = messagebox.askyesno(
+            "Confirm Geotag",
+            f"Geotag {len(tasks)} files from the track?\n\n"
+            f"{preview}\n"
+            f"✏️ {len(tasks)} to change, {len(unchanged)} unchanged (skipped)\n"
+            f"❔ {len(unmatched)} without a match (skipped)\n"
+            f"🚀 Processing with {min(jobs.DEFAULT_WORKERS, len(tasks))} parallel workers"
+            + self._immich_confirm_note(self.immich_mode())
+        )
+        
+        if not confirm:
+            return
+        
+        self.start_gps_job('geotag', tasks)
+    
+    def infer_gps(self):
+        """Propose GPS for untagged selected files from photos nearby in time."""
+        import geotag
+        
+        if not self.selected_files:
+            messagebox.showwarning("No Selection", "Please select files first")
+            return
+        
+        try:
+            window = float(self.infer_window_entry.get().strip()) * 60
+        except ValueError:
+            messagebox.showerror("Error", "Invalid time window")
+            return
+        
+        # Snapshot the selection so changes made while the job runs don't affect it
+        files = list(self.selected_files)
+        directory = self.current_directory
+        
+        self.run_preflight(
+            lambda: geotag.plan_infer(files, exif_ops.walk_image_files(directory), window),
+            self._preview_infer_gps
+        )
+    
+    def _preview_infer_gps(self, plan):
+        """Show the proposed matches and start the job if accepted."""
+        matches, already_tagged, unmatched = plan
+        
+        if not matches:
+            messagebox.showinfo(
+                "Nothing to Change",
+                f"No locations to infer.\n\n"
+                f"Already tagged: {len(already_tagged)}\n"
+                f"No geotagged photo within the time window: {len(unmatched)}"
+            )
+            return
+        
+        window = tk.Toplevel(self)
+        window.title("Inferred GPS - Preview")
+        window.geometry("900x500")
+        window.transient(self)
+        
+        tk.Label(
+            window,
+            text=f"{len(matches)} file(s) to tag, {len(already_tagged)} already tagged, "
+                 f"{len(unmatched)} without a match",
+            font=('Segoe UI', 11, 'bold'),
+            anchor='w'
+        ).pack(fill='x', padx=15, pady=(15, 5))
+        
+        columns = ('source', 'apart', 'lat', 'lon')
+        table = ttk.Treeview(window, columns=columns, height=15)
+        table.heading('#0', text='File')
+        table.column('#0', width=220)
+        for column, title, width in (('source', 'Location from', 220), ('apart', 'Time apart', 100),
+                                     ('lat', 'Latitude', 120), ('lon', 'Longitude', 120)):
+            table.heading(column, text=title)
+            table.column(column, width=width, anchor='w' if column == 'source' else 'e')
+        
+        for file_path, lat, lon, source, apart in matches:
+            table.insert('', 'end', text=Path(file_path).name, values=(
+                Path(source).name, f"{apart / 60:.1f} min", f"{lat:.6f}", f"{lon:.6f}"
+            ))
+        table.pack(fill='both', expand=True, padx=15, pady=5)
+        
+        def apply():
+            window.destroy()
+            self.start_gps_job('infer_gps', [(file_path, lat, lon)
+                                             for file_path, lat, lon, _, _ in matches])
+        
+        buttons = tk.Frame(window)
+        buttons.pack(fill='x', padx=15, pady=10)
+        ttk.Button(buttons, text="Cancel", command=window.destroy).pack(side='right', padx=5)
+        ttk.Button(buttons, text=f"Apply to {len(matches)} file(s)", command=apply).pack(side='right', padx=5)
+    
+    def create_duplicates_tab(self):
+        """Create the tab for copying metadata between near-duplicate photos."""
+        tab = self.tabview.add("👯 Duplicates")
+        tab.grid_columnconfigure(0, weight=1)
+        
+        # Instructions
+        ctk.CTkLabel(
+            tab,
+            text="Fill in metadata from duplicate copies",
+            font=ctk.CTkFont(size=16, weight="bold")
+        ).pack(pady=15, padx=10)
+        
+        ctk.CTkLabel(
+            tab,
+            text="Finds copies of the same picture (original, edited export, messenger\n"
+                 "copy...) in the current folder and its subfolders by comparing\n"
+                 "thumbnails. Copies missing a date or location get it from the copy\n"
+                 "with the most metadata.",
+            text_color="gray",
+            font=ctk.CTkFont(size=11),
+            justify="left"
+        ).pack(pady=5, padx=10)
+        
+        settings_frame = ctk.CTkFrame(tab)
+        settings_frame.pack(pady=15, padx=20, fill="x")
+        settings_frame.grid_columnconfigure(1, weight=1)
+        
+        ctk.CTkLabel(settings_frame, text="Max difference (bits of 64):", font=ctk.CTkFont(size=12)).grid(
+            row=0, column=0, padx=10, pady=8, sticky="w"
+        )
+        self.duplicate_distance_entry = ctk.CTkEntry(settings_frame, height=35)
+        self.duplicate_distance_entry.grid(row=0, column=1, padx=10, pady=8, sticky="ew")
+        
+        ctk.CTkLabel(
+            settings_frame,
+            text="0 finds only identical pictures; above 8 unrelated photos start to match.",
+            text_color="gray",
+            font=ctk.CTkFont(size=11)
+        ).grid(row=1, column=0, columnspan=2, padx=10, pady=(0, 8), sticky="w")
+        
+        ctk.CTkButton(
+            tab,
+            text="🔎 Find Duplicates in Folder",
+            command=self.find_duplicates,
+            fg_color="green",
+            hover_color="darkgreen",
+            height=50,
+            font=ctk.CTkFont(size=14, weight="bold")
+        ).pack(pady=20, padx=20, fill="x")
+    
+    def find_duplicates(self):
+        """Find near-duplicate clusters in the current folder tree."""
+        import duplicates
+        
+        if not self.current_directory:
+            messagebox.showwarning("No Folder", "Please open a folder first")
+            return
+        
+        try:
+            max_distance = int(self.duplicate_distance_entry.get().strip())
+            if not 0 <= max_distance <= 16:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("Error", "Max difference must be a whole number from 0 to 16")
+            return
+        
+        directory = self.current_directory
+        
+        def on_progress(hashed, total):
+            self.ui_call(lambda: self.selection_label.configure(
+                text=f"🔍 Comparing pictures... {hashed}/{total}"))
+        
+        self.run_preflight(
+            lambda: duplicates.plan(exif_ops.walk_image_files(directory), max_distance, on_progress),
+            self._preview_duplicates
+        )
+    
+    def _preview_duplicates(self, plan):
+        """Show what each duplicate gets from its cluster and start the job if accepted."""
+        to_change, clusters = plan
+        
+        if not to_change:
+            messagebox.showinfo(
+                "Nothing to Change",
+                f"Found {len(clusters)} group(s) of duplicates.\n\n"
+                f"No copy is missing a date or location that another copy has."
             )
+            return
+        
+        window = tk.Toplevel(self)
+        window.title("Duplicates - Preview")
+        window.geometry("900x500")
+        window.transient(self)
+        
+        tk.Label(
+            window,
+            text=f"{len(to_change)} file(s) to fill in, from {len(clusters)} group(s) of duplicates",
+            font=('Segoe UI', 11, 'bold'),
+            anchor='w'
+        ).pack(fill='x', padx=15, pady=(15, 5))
+        
+        columns = ('source', 'date', 'lat', 'lon')
+        table = ttk.Treeview(window, columns=columns, height=15)
+        table.heading('#0', text='File')
+        table.column('#0', width=220)
+        for column, title, width in (('source', 'Copied from', 220), ('date', 'Date/Time', 150),
+                                     ('lat', 'Latitude', 110), ('lon', 'Longitude', 110)):
+            table.heading(column, text=title)
+            table.column(column, width=width, anchor='w' if column == 'source' else 'e')
+        
+        for file_path, source, dt, lat, lon in to_change:
+            table.insert('', 'end', text=Path(file_path).name, values=(
+                Path(source).name,
+                dt.strftime("%Y-%m-%d %H:%M:%S") if dt else "—",
+                f"{lat:.6f}" if lat is not None else "—",
+                f"{lon:.6f}" if lon is not None else "—"
+            ))
+        table.pack(fill='both', expand=True, padx=15, pady=5)
+        
+        def apply():
+            window.destroy()
+            self.start_duplicates_job([(file_path, dt, lat, lon)
+                                       for file_path, _, dt, lat, lon in to_change])
+        
+        buttons = tk.Frame(window)
+        buttons.pack(fill='x', padx=15, pady=10)
+        ttk.Button(buttons, text="Cancel", command=window.destroy).pack(side='right', padx=5)
+        ttk.Button(buttons, text=f"Apply to {len(to_change)} file(s)", command=apply).pack(side='right', padx=5)
+    
+    def start_duplicates_job(self, tasks):
+        """Write the dates and locations copied from duplicates in one batched job.
+        
+        Args:
+            tasks: List of (file path, datetime or None, latitude or None, longitude or None)
+        """
+        import duplicates
+        
+        immich_mode = self.immich_mode()
+        sidecars = self.sidecar_mode()
+        job_name = 'copy_duplicates_xmp' if sidecars else 'copy_duplicates'
+        
+        def immich_fields(task):
+            _, dt, lat, lon = task
+            fields = immich_sync.datetime_fields(dt) if dt is not None else {}
+            if lat is not None and lon is not None:
+                fields.update(immich_sync.gps_fields(lat, lon))
+            return fields
+        
+        def process_files():
+            progress, on_progress = self.open_progress("Copying Metadata", len(tasks))
             
-            if result.returncode == 0 and result.stdout.strip():
-                # Parse the datetime (format: 2024:01:17 14:30:25)
-                dt_str = result.stdout.strip()
-                dt = datetime.strptime(dt_str, "%Y:%m:%d %H:%M:%S")
-                
+            def write_files():
+                job_journal = journal.Journal(job_name, duplicates.DATE_FIELDS + preflight.GPS_TAGS,
+                                              sidecars=sidecars)
+                job_manifest = manifest.Manifest.create(job_name, tasks, job_journal.path)
+                return self.run_queued(
+                    job_manifest,
+                    progress,
+                    self.copy_sidecar_metadata if sidecars else self.copy_metadata,
+                    on_progress=on_progress,
+                    name=job_name,
+                    journal=job_journal,
+                    atomic_writes=True,
+                    checksum_log=None if sidecars else checksums.start(job_name),
+                    stage=not sidecars
+                )
+            
+            completed, errors = self.run_with_immich(immich_mode, tasks, immich_fields, write_files)
+            
+            self.ui_call(lambda: self._finish_apply_gps(completed, errors, progress.get('window')))
+        
+        threading.Thread(target=process_files, daemon=True).start()
+    
+    def copy_metadata(self, file_path, dt, lat, lon, output=None):
+        """Write a date copied from a duplicate and/or its location in one ExifTool call."""
+        import duplicates
+        exif_ops.write_metadata(file_path, dt, duplicates.DATE_FIELDS, lat, lon, output)
+    
+    def copy_sidecar_metadata(self, file_path, dt, lat, lon, output=None):
+        """Write a date and/or location copied from a duplicate to the XMP sidecar."""
+        import duplicates
+        if dt is not None:
+            xmp_sidecar.write_datetime(file_path, dt, duplicates.DATE_FIELDS)
+        if lat is not None and lon is not None:
+            xmp_sidecar.write_gps(file_path, lat, lon)
+    
+    def create_sanitise_tab(self):
+        """Create the sanitise for sharing tab."""
+        tab = self.tabview.add("🧹 Sanitise")
+        tab.grid_columnconfigure(0, weight=1)
+        
+        # Instructions
+        ctk.CTkLabel(
+            tab,
+            text="Remove sensitive EXIF data before sharing",
+            font=ctk.CTkFont(size=14, weight="bold")
+        ).pack(pady=20, padx=10)
+        
+        # Policy selection
+        self.sanitise_policy_var = ctk.StringVar(value=sanitise_policies.DEFAULT_POLICY)
+        ctk.CTkSegmentedButton(
+            tab,
+            values=[policy["name"] for policy in sanitise_policies.SANITISE_POLICIES],
+            variable=self.sanitise_policy_var,
+            command=lambda name: self.show_sanitise_policy()
+        ).pack(pady=(0, 10), padx=10, fill="x")
+        
+        # What will be removed
+        self.sanitise_info_frame = ctk.CTkFrame(tab)
+        self.sanitise_info_frame.pack(pady=10, padx=10, fill="both", expand=True)
+        self.show_sanitise_policy()
+        
+        # Warning
+        warning_frame = ctk.CTkFrame(tab, fg_color="darkred")
+        warning_frame.pack(pady=10, padx=10, fill="x")
+        
+        ctk.CTkLabel(
+            warning_frame,
+            text="⚠️ Warning: Files are changed in place.\nUse ↩️ Undo Last Job to restore the metadata.",
+            font=ctk.CTkFont(size=12, weight="bold"),
+            text_color="white"
+        ).pack(pady=10, padx=10)
+        
+        # Apply button
+        ctk.CTkButton(
+            tab,
+            text="🧹 Sanitise Selected Files",
+            command=self.sanitise_files,
+            fg_color="orange",
+            hover_color="darkorange",
+            height=40
+        ).pack(pady=20, padx=10, fill="x")
+    
+    def show_sanitise_policy(self):
+        """List what the selected sanitise policy removes and keeps."""
+        for widget in self.sanitise_info_frame.winfo_children():
+            widget.destroy()
+        
+        removed, kept = sanitise_policies.describe(self.sanitise_policy_var.get())
+        
+        sections = [("This will remove:", removed)]
+        if kept:
+            sections.append(("This will keep:", kept))
+        
+        for title, items in sections:
+            ctk.CTkLabel(
+                self.sanitise_info_frame,
+                text=title,
+                font=ctk.CTkFont(size=12, weight="bold"),
+                anchor="w"
+            ).pack(pady=10, padx=10, anchor="w")
+            
+            for item in items:
+                ctk.CTkLabel(
+                    self.sanitise_info_frame,
+                    text=f"• {item}",
+                    anchor="w",
+                    text_color="gray"
+                ).pack(pady=2, padx=20, anchor="w")
+    
+    def set_today(self):
+        """Set date to today."""
+        today = datetime.now()
+        self.date_entry.delete(0, 'end')
+        self.date_entry.insert(0, today.strftime("%d/%m/%Y"))
+        self.time_entry.delete(0, 'end')
+        self.time_entry.insert(0, today.strftime("%H:%M"))
+    
+    def use_file_datetime(self):
+        """Extract DateTimeOriginal from first selected file and populate fields."""
+        if not self.selected_files:
+            messagebox.showwarning("No Selection", "Please select at least one file first")
+            return
+        
+        # Get first selected file
+        file_path = self.selected_files[0]
+        
+        try:
+            dt = exif_ops.read_datetime_original(file_path)
+            
+            if dt:
                 # Populate fields
                 self.date_entry.delete(0, 'end')
                 self.date_entry.insert(0, dt.strftime("%d/%m/%Y"))
@@ -1480,6 +2786,8 @@ class ExifEditor(ctk.CTk):
     
     def show_date_picker(self):
         """Show calendar popup to pick a date."""
+        from tkcalendar import Calendar
+        
         picker_window = tk.Toplevel(self)
         picker_window.title("Select Date")
         picker_window.geometry("400x400")
@@ -1700,14 +3008,38 @@ class ExifEditor(ctk.CTk):
             for i, file_path in enumerate(sorted_files)
         ]
         
-        # Confirm
+        # Check which files already hold these values, then confirm
+        sidecars = self.sidecar_mode()
+        self.run_preflight(
+            lambda: preflight.plan_datetime(file_datetime_pairs, selected_fields, sidecars),
+            lambda plan: self._confirm_apply_datetime(plan, base_dt, increment, selected_fields, sidecars)
+        )
+    
+    def _confirm_apply_datetime(self, plan, base_dt, increment, selected_fields, sidecars=False):
+        """Confirm and start a date/time job for the files that need changing."""
+        file_datetime_pairs, unchanged = plan
+        job_name = 'apply_datetime_xmp' if sidecars else 'apply_datetime'
+        # Immich only keeps one capture date, so Windows timestamps alone aren't pushed
+        immich_mode = self.immich_mode() if any(
+            f not in exif_ops.WINDOWS_TIMESTAMP_FIELDS for f in selected_fields) else 'off'
+        
+        if not file_datetime_pairs:
+            messagebox.showinfo(
+                "Nothing to Change",
+                f"All {len(unchanged)} selected files already have these date/time values."
+            )
+            return
+        
         confirm = messagebox.askyesno(
             "Confirm",
-            f"Apply date/time to {len(sorted_files)} files?\n\n"
+            f"Apply date/time to {len(file_datetime_pairs)} files?\n\n"
             f"Starting: {base_dt.strftime('%d/%m/%Y %H:%M:%S')}\n"
             f"Increment: {increment} seconds\n"
-            f"Fields: {len(selected_fields)} selected\n\n"
-            f"🚀 Processing with {min(8, len(sorted_files))} parallel workers"
+            f"Fields: {len(selected_fields)} selected\n"
+            f"{'📝 Written to XMP sidecars' if sidecars else '💾 Written to the files'}\n\n"
+            f"✏️ {len(file_datetime_pairs)} to change, {len(unchanged)} unchanged (skipped)\n"
+            f"🚀 Processing with {min(jobs.DEFAULT_WORKERS, len(file_datetime_pairs))} parallel workers"
+            + self._immich_confirm_note(immich_mode)
         )
         
         if not confirm:
@@ -1716,111 +3048,99 @@ class ExifEditor(ctk.CTk):
         # Run in background thread
         def process_files():
             # Show progress dialog
-            self.after(0, lambda: setattr(self, '_progress_window', 
-                                         self.show_progress_dialog("Processing Files", len(file_datetime_pairs))))
+            progress, on_progress = self.open_progress("Processing Files", len(file_datetime_pairs))
             
-            completed = 0
-            errors = []
+            tasks = [(file_path, dt, selected_fields) for file_path, dt in file_datetime_pairs]
             
-            # Use ThreadPoolExecutor for parallel processing
-            # 8 workers = sweet spot for I/O-bound ExifTool processes
-            max_workers = min(8, len(file_datetime_pairs))
+            def write_files():
+                job_journal = journal.Journal(
+                    job_name,
+                    [f for f in selected_fields if f not in exif_ops.WINDOWS_TIMESTAMP_FIELDS],
+                    sidecars=sidecars
+                )
+                job_manifest = manifest.Manifest.create(job_name, tasks, job_journal.path)
+                return self.run_queued(
+                    job_manifest,
+                    progress,
+                    self.set_sidecar_datetime if sidecars else self.set_file_datetime,
+                    on_progress=on_progress,
+                    name=job_name,
+                    journal=job_journal,
+                    atomic_writes=True,
+                    checksum_log=None if sidecars else checksums.start(job_name),
+                    stage=not sidecars
+                )
             
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                # Submit all tasks
-                future_to_file = {
-                    executor.submit(self.set_file_datetime, file_path, dt, selected_fields): (file_path, dt)
-                    for file_path, dt in file_datetime_pairs
-                }
-                
-                # Process completed tasks as they finish
-                for future in as_completed(future_to_file):
-                    file_path, dt = future_to_file[future]
-                    try:
-                        future.result()  # Raises exception if task failed
-                        completed += 1
-                    except Exception as e:
-                        errors.append((file_path.name, str(e)))
-                    
-                    # Update progress on main thread
-                    self.after(0, lambda c=completed, f=file_path.name: 
-                              self.update_progress(getattr(self, '_progress_window', None), 
-                                                  c, len(file_datetime_pairs), f))
+            completed, errors = self.run_with_immich(
+                immich_mode, tasks, lambda task: immich_sync.datetime_fields(task[1]), write_files)
             
             # Close progress dialog and show result
-            self.after(0, lambda: self._finish_apply_datetime(completed, errors))
+            self.ui_call(lambda: self._finish_apply_datetime(completed, errors, progress.get('window')))
         
         # Start background thread
         threading.Thread(target=process_files, daemon=True).start()
     
-    def _finish_apply_datetime(self, success_count, errors):
+    def _finish_apply_datetime(self, success_count, errors, progress_window=None):
         """Finish datetime application and show results."""
         # Close progress window
-        if hasattr(self, '_progress_window') and self._progress_window:
+        if progress_window:
             try:
-                self._progress_window.destroy()
+                progress_window.destroy()
             except:
                 pass
         
+        self.refresh_file_view()
+        
         # Show results
         if errors:
             error_msg = f"Updated {success_count} file(s)\n\n"
             error_msg += f"Failed {len(errors)} file(s):\n"
             for name, error in errors[:5]:  # Show first 5 errors
-                error_msg += f"• {name}: {error}\n"
+                error_msg += f"• {Path(name).name}: {error}\n"
             if len(errors) > 5:
                 error_msg += f"... and {len(errors) - 5} more"
             messagebox.showwarning("Partial Success", error_msg)
         else:
             self.show_auto_close_message("Success", f"Updated {success_count} file(s) 🚀")
 
-    def apply_datetime(self):
-        """Apply date/time to selected files with parallel processing."""
+    
+    def shift_datetime(self):
+        """Shift the selected files' existing date/time fields by a delta."""
         if not self.selected_files:
             messagebox.showwarning("No Selection", "Please select files first")
             return
         
-        # Parse date and time
-        date_str = self.date_entry.get().strip()
-        time_str = self.time_entry.get().strip()
-        increment_str = self.increment_entry.get().strip()
-        
-        if not date_str or not time_str:
-            messagebox.showerror("Error", "Please enter both date and time")
-            return
-        
         try:
-            # Add :00 for seconds if only HH:MM provided
-            if len(time_str.split(':')) == 2:
-                time_str += ":00"
-            base_dt = datetime.strptime(f"{date_str} {time_str}", "%d/%m/%Y %H:%M:%S")
-            increment = int(increment_str)
+            seconds = exif_ops.parse_time_shift(self.shift_entry.get())
         except ValueError as e:
-            messagebox.showerror("Error", f"Invalid date/time format: {e}")
+            messagebox.showerror("Error", str(e))
             return
         
-        # Get selected fields
-        selected_fields = [field for field, var in self.field_vars.items() if var.get()]
+        if not seconds:
+            messagebox.showinfo("Nothing to Change", "A shift of zero doesn't change any dates.")
+            return
         
+        selected_fields = [field for field, var in self.field_vars.items() if var.get()]
         if not selected_fields:
             messagebox.showwarning("No Fields", "Please select at least one field to update")
             return
         
-        # Sort files by name and assign timestamps
-        sorted_files = sorted(self.selected_files, key=lambda p: p.name)
-        file_datetime_pairs = [
-            (file_path, base_dt + timedelta(seconds=i * increment))
-            for i, file_path in enumerate(sorted_files)
-        ]
+        files = list(self.selected_files)
+        sidecars = self.sidecar_mode()
+        job_name = 'shift_datetime_xmp' if sidecars else 'shift_datetime'
+        exif_fields = [f for f in selected_fields if f not in exif_ops.WINDOWS_TIMESTAMP_FIELDS]
+        # Immich only keeps one capture date, so Windows timestamps alone aren't pushed
+        immich_mode = self.immich_mode() if exif_fields else 'off'
         
         # Confirm
         confirm = messagebox.askyesno(
             "Confirm",
-            f"Apply date/time to {len(sorted_files)} files?\n\n"
-            f"Starting: {base_dt.strftime('%d/%m/%Y %H:%M:%S')}\n"
-            f"Increment: {increment} seconds\n"
-            f"Fields: {len(selected_fields)} selected\n\n"
-            f"🚀 Processing with {min(8, len(sorted_files))} parallel workers"
+            f"Shift the date/time of {len(files)} files by {self.shift_entry.get().strip()}?\n\n"
+            f"Each file keeps its own time, so the spacing between shots is unchanged.\n"
+            f"Fields: {len(selected_fields)} selected\n"
+            f"{'📝 Written to XMP sidecars' if sidecars else '💾 Written to the files'}\n\n"
+            f"🚀 Processing with {min(jobs.DEFAULT_WORKERS, len(files))} parallel workers"
+            + self._immich_confirm_note(immich_mode)
         )
         
         if not confirm:
@@ -1829,126 +3149,99 @@ class ExifEditor(ctk.CTk):
         # Run in background thread
         def process_files():
             # Show progress dialog
-            self.after(0, lambda: setattr(self, '_progress_window', 
-                                         self.show_progress_dialog("Processing Files", len(file_datetime_pairs))))
+            progress, on_progress = self.open_progress("Shifting Date/Time", len(files))
             
-            completed = 0
-            errors = []
+            tasks = [(file_path, seconds, selected_fields) for file_path in files]
             
-            # Use ThreadPoolExecutor for parallel processing
-            # 8 workers = sweet spot for I/O-bound ExifTool processes
-            max_workers = min(8, len(file_datetime_pairs))
+            # Immich gets each file's capture date plus the shift, read before the files change
+            shifted = {}
+            if immich_mode != 'off':
+                try:
+                    current = exif_ops.read_tags(files, exif_fields)
+                except Exception:
+                    current = {}
+                for key, tags in current.items():
+                    for field in ['DateTimeOriginal'] + exif_fields:
+                        dt = preflight.parse_exif_datetime(tags.get(field, ''))
+                        if dt is not None:
+                            shifted[key] = dt + timedelta(seconds=seconds)
+                            break
             
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                # Submit all tasks
-                future_to_file = {
-                    executor.submit(self.set_file_datetime, file_path, dt, selected_fields): (file_path, dt)
-                    for file_path, dt in file_datetime_pairs
-                }
-                
-                # Process completed tasks as they finish
-                for future in as_completed(future_to_file):
-                    file_path, dt = future_to_file[future]
-                    try:
-                        future.result()  # Raises exception if task failed
-                        completed += 1
-                    except Exception as e:
-                        errors.append((file_path.name, str(e)))
-                    
-                    # Update progress on main thread
-                    self.after(0, lambda c=completed, f=file_path.name: 
-                              self.update_progress(getattr(self, '_progress_window', None), 
-                                                  c, len(file_datetime_pairs), f))
+            def immich_fields(task):
+                dt = shifted.get(exif_ops.path_key(task[0]))
+                return None if dt is None else immich_sync.datetime_fields(dt)
+            
+            def write_files():
+                job_journal = journal.Journal(job_name, exif_fields, sidecars=sidecars)
+                job_manifest = manifest.Manifest.create(job_name, tasks, job_journal.path)
+                return self.run_queued(
+                    job_manifest,
+                    progress,
+                    self.shift_sidecar_datetime if sidecars else self.shift_file_datetime,
+                    on_progress=on_progress,
+                    name=job_name,
+                    journal=job_journal,
+                    atomic_writes=True,
+                    checksum_log=None if sidecars else checksums.start(job_name),
+                    stage=not sidecars
+                )
+            
+            completed, errors = self.run_with_immich(immich_mode, tasks, immich_fields, write_files)
             
             # Close progress dialog and show result
-            self.after(0, lambda: self._finish_apply_datetime(completed, errors))
+            self.ui_call(lambda: self._finish_apply_datetime(completed, errors, progress.get('window')))
         
         # Start background thread
         threading.Thread(target=process_files, daemon=True).start()
     
-    def _finish_apply_datetime(self, success_count, errors):
-        """Finish datetime application and show results."""
-        # Close progress window
-        if hasattr(self, '_progress_window') and self._progress_window:
-            try:
-                self._progress_window.destroy()
-            except:
-                pass
-        
-        # Show results
-        if errors:
-            error_msg = f"Updated {success_count} file(s)\n\n"
-            error_msg += f"Failed {len(errors)} file(s):\n"
-            for name, error in errors[:5]:  # Show first 5 errors
-                error_msg += f"• {name}: {error}\n"
-            if len(errors) > 5:
-                error_msg += f"... and {len(errors) - 5} more"
-            messagebox.showwarning("Partial Success", error_msg)
-        else:
-            self.show_auto_close_message("Success", f"Updated {success_count} file(s) 🚀")
-
+    def shift_file_datetime(self, file_path, seconds, fields, output=None):
+        """Shift date/time fields, and the file's own timestamps, by a delta."""
+        exif_ops.shift_datetime(file_path, seconds, fields, output)
     
-    def set_file_datetime(self, file_path, dt, fields):
-        """Set date/time fields using ExifTool and Windows API."""
-        # Handle EXIF fields
-        exif_fields = [f for f in fields if f not in ['WindowsCreated', 'WindowsModified']]
-        
-        if exif_fields:
-            cmd = 'exiftool.exe' if platform.system() == 'Windows' else 'exiftool'
-            args = [cmd, '-overwrite_original']
-            
-            # Format datetime for EXIF
-            dt_str = dt.strftime("%Y:%m:%d %H:%M:%S")
-            
-            for field in exif_fields:
-                args.append(f"-{field}={dt_str}")
-            
-            args.append(str(file_path))
-            
-            result = subprocess.run(
-                args,
-                capture_output=True,
-                text=True,
-                shell=(platform.system() == 'Windows')
-            )
-            
-            if result.returncode != 0:
-                raise Exception(result.stderr)
-        
-        # Handle Windows file timestamps
-        if 'WindowsCreated' in fields or 'WindowsModified' in fields:
-            self.set_windows_timestamps(file_path, dt, fields)
+    def set_file_datetime(self, file_path, dt, fields, output=None):
+        """Set date/time fields, and the file's own timestamps, in one pass."""
+        exif_ops.write_datetime(file_path, dt, fields, output)
     
-    def set_windows_timestamps(self, file_path, dt, fields):
-        """Set Windows file Created and Modified timestamps."""
-        try:
-            # Convert datetime to Windows FILETIME (must convert to timestamp first)
-            timestamp = pywintypes.Time(dt.timestamp())
-            
-            # Open file handle with write access
-            handle = win32file.CreateFile(
-                str(file_path),
-                win32con.GENERIC_WRITE,
-                win32con.FILE_SHARE_READ | win32con.FILE_SHARE_WRITE,
-                None,
-                win32con.OPEN_EXISTING,
-                win32con.FILE_ATTRIBUTE_NORMAL,
-                None
-            )
-            
+    def set_sidecar_datetime(self, file_path, dt, fields, output=None):
+        """Set date/time fields in the file's XMP sidecar; the original's content isn't touched.
+        
+        ``output`` is accepted for the job runner and ignored, so nothing is
+        committed over the original.
+        """
+        xmp_sidecar.write_datetime(file_path, dt, fields)
+        
+        # File system times are still set on the original itself
+        self.set_file_times(
+            file_path,
+            created=dt.timestamp() if 'WindowsCreated' in fields else None,
+            modified=dt.timestamp() if 'WindowsModified' in fields or 'FileModifyDate' in fields else None
+        )
+    
+    def shift_sidecar_datetime(self, file_path, seconds, fields, output=None):
+        """Shift date/time fields in the file's XMP sidecar (see ``set_sidecar_datetime``)."""
+        stat = os.stat(file_path)
+        xmp_fields = [f for f in fields if f in xmp_sidecar.DATETIME_PROPERTIES]
+        if xmp_fields:
+            current = exif_ops.read_tags([file_path], xmp_fields).get(exif_ops.path_key(file_path), {})
+            xmp_sidecar.shift_datetime(file_path, seconds, xmp_fields, current)
+        
+        created = filetimes.created_time(stat)
+        self.set_file_times(
+            file_path,
+            created=created + seconds if 'WindowsCreated' in fields and created is not None else None,
+            modified=stat.st_mtime + seconds
+            if 'WindowsModified' in fields or 'FileModifyDate' in fields else None
+        )
+    
+    def set_file_times(self, file_path, created=None, modified=None):
+        """Set a file's created and/or modified times (see ``filetimes``)."""
+        if not filetimes.CAN_SET_CREATED:
+            created = None
+        with timing.span('os.set_timestamps'):
             try:
-                # Set timestamps
-                # SetFileTime(handle, CreationTime, LastAccessTime, LastWriteTime)
-                created_time = timestamp if 'WindowsCreated' in fields else None
-                modified_time = timestamp if 'WindowsModified' in fields else None
-                
-                # Pass times in correct order: creation, access, modified
-                win32file.SetFileTime(handle, created_time, None, modified_time)
-            finally:
-                handle.Close()
-                
-        except Exception as e:
-            raise Exception(f"Failed to set Windows timestamps: {e}")
+                filetimes.set_times(file_path, created, modified)
+            except OSError as e:
+                raise Exception(f"Failed to set file timestamps: {e}")
     
     def apply_gps_preset(self, preset):
         """Apply a GPS preset to the coordinate fields."""
@@ -2008,109 +3301,113 @@ class ExifEditor(ctk.CTk):
             messagebox.showerror("Error", "Invalid coordinates format")
             return
         
-        # Confirm
+        # Snapshot the selection so changes made while the job runs don't affect it
+        files = list(self.selected_files)
+        
+        # Check which files already hold these coordinates, then confirm
+        sidecars = self.sidecar_mode()
+        self.run_preflight(
+            lambda: preflight.plan_gps(files, lat, lon, sidecars),
+            lambda plan: self._confirm_apply_gps(plan, lat, lon)
+        )
+    
+    def _confirm_apply_gps(self, plan, lat, lon):
+        """Confirm and start a GPS job for the files that need changing."""
+        files, unchanged = plan
+        
+        if not files:
+            messagebox.showinfo(
+                "Nothing to Change",
+                f"All {len(unchanged)} selected files already have these coordinates."
+            )
+            return
+        
         confirm = messagebox.askyesno(
             "Confirm",
-            f"Apply GPS coordinates to {len(self.selected_files)} files?\n\n"
+            f"Apply GPS coordinates to {len(files)} files?\n\n"
             f"Latitude: {lat}\n"
             f"Longitude: {lon}\n\n"
-            f"🚀 Processing with {min(8, len(self.selected_files))} parallel workers"
+            f"✏️ {len(files)} to change, {len(unchanged)} unchanged (skipped)\n"
+            f"🚀 Processing with {min(jobs.DEFAULT_WORKERS, len(files))} parallel workers"
+            + self._immich_confirm_note(self.immich_mode())
         )
         
         if not confirm:
             return
         
+        self.start_gps_job('apply_gps', [(file_path, lat, lon) for file_path in files])
+    
+    def start_gps_job(self, job_name, tasks):
+        """Write per-file GPS coordinates in the background.
+        
+        Args:
+            job_name: Job name for the journal, manifest and diagnostics
+            tasks: List of (file path, latitude, longitude)
+        """
+        immich_mode = self.immich_mode()
+        sidecars = self.sidecar_mode()
+        if sidecars:
+            job_name += '_xmp'
+        
         # Run in background thread
         def process_files():
             # Show progress dialog
-            self.after(0, lambda: setattr(self, '_gps_progress_window', 
-                                         self.show_progress_dialog("Applying GPS Coordinates", len(self.selected_files))))
+            progress, on_progress = self.open_progress("Applying GPS Coordinates", len(tasks))
             
-            completed = 0
-            errors = []
-            
-            # Use ThreadPoolExecutor for parallel processing
-            max_workers = min(8, len(self.selected_files))
+            def write_files():
+                job_journal = journal.Journal(job_name, preflight.GPS_TAGS, sidecars=sidecars)
+                job_manifest = manifest.Manifest.create(job_name, tasks, job_journal.path)
+                return self.run_queued(
+                    job_manifest,
+                    progress,
+                    self.set_sidecar_gps if sidecars else self.set_exif_gps,
+                    on_progress=on_progress,
+                    name=job_name,
+                    journal=job_journal,
+                    atomic_writes=True,
+                    checksum_log=None if sidecars else checksums.start(job_name),
+                    stage=not sidecars
+                )
             
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                # Submit all tasks
-                future_to_file = {
-                    executor.submit(self.set_exif_gps, file_path, lat, lon): file_path
-                    for file_path in self.selected_files
-                }
-                
-                # Process completed tasks as they finish
-                for future in as_completed(future_to_file):
-                    file_path = future_to_file[future]
-                    try:
-                        future.result()  # Raises exception if task failed
-                        completed += 1
-                    except Exception as e:
-                        errors.append((file_path.name, str(e)))
-                    
-                    # Update progress on main thread
-                    self.after(0, lambda c=completed, f=file_path.name: 
-                              self.update_progress(getattr(self, '_gps_progress_window', None), 
-                                                  c, len(self.selected_files), f))
+            completed, errors = self.run_with_immich(
+                immich_mode, tasks, lambda task: immich_sync.gps_fields(task[1], task[2]), write_files)
             
             # Close progress dialog and show result
-            self.after(0, lambda: self._finish_apply_gps(completed, errors))
+            self.ui_call(lambda: self._finish_apply_gps(completed, errors, progress.get('window')))
         
         # Start background thread
         threading.Thread(target=process_files, daemon=True).start()
 
-    def _finish_apply_gps(self, success_count, errors):
+    def _finish_apply_gps(self, success_count, errors, progress_window=None):
             """Finish GPS application and show results."""
             # Close progress window
-            if hasattr(self, '_gps_progress_window') and self._gps_progress_window:
+            if progress_window:
                 try:
-                    self._gps_progress_window.destroy()
+                    progress_window.destroy()
                 except:
                     pass
             
+            self.refresh_file_view()
+            
             # Show results
             if errors:
                 error_msg = f"Updated {success_count} file(s)\n\n"
                 error_msg += f"Failed {len(errors)} file(s):\n"
                 for name, error in errors[:5]:  # Show first 5 errors
-                    error_msg += f"• {name}: {error}\n"
+                    error_msg += f"• {Path(name).name}: {error}\n"
                 if len(errors) > 5:
                     error_msg += f"... and {len(errors) - 5} more"
                 messagebox.showwarning("Partial Success", error_msg)
             else:
                 self.show_auto_close_message("Success", f"Updated {success_count} file(s) 🚀")
     
-    def set_exif_gps(self, file_path, lat, lon):
+    def set_exif_gps(self, file_path, lat, lon, output=None):
         """Set GPS coordinates using ExifTool."""
-        cmd = 'exiftool.exe' if platform.system() == 'Windows' else 'exiftool'
-        
-        # Determine GPS reference directions
-        lat_ref = 'N' if lat >= 0 else 'S'
-        lon_ref = 'E' if lon >= 0 else 'W'
-        
-        # Use absolute values for the coordinates
-        abs_lat = abs(lat)
-        abs_lon = abs(lon)
-        
-        args = [
-            cmd,
-            '-overwrite_original',
-            f"-GPSLatitude={abs_lat}",
-            f"-GPSLatitudeRef={lat_ref}",
-            f"-GPSLongitude={abs_lon}",
-            f"-GPSLongitudeRef={lon_ref}",
-            str(file_path)
-        ]
-        
-        result = subprocess.run(
-            args,
-            capture_output=True,
-            text=True,
-            shell=(platform.system() == 'Windows')
-        )
-        
-        if result.returncode != 0:
-            raise Exception(result.stderr)
+        exif_ops.write_gps(file_path, lat, lon, output)
+    
+    def set_sidecar_gps(self, file_path, lat, lon, output=None):
+        """Set GPS coordinates in the file's XMP sidecar (``output`` is ignored)."""
+        xmp_sidecar.write_gps(file_path, lat, lon)
     
     def sanitise_files(self):
         """Remove sensitive EXIF data from selected files with parallel processing."""
@@ -2118,102 +3415,245 @@ class ExifEditor(ctk.CTk):
             messagebox.showwarning("No Selection", "Please select files first")
             return
         
+        policy_name = self.sanitise_policy_var.get()
+        removed, kept = sanitise_policies.describe(policy_name)
+        
         # Confirm
         confirm = messagebox.askyesno(
             "Confirm Sanitisation",
-            f"⚠️ Remove all sensitive EXIF data from {len(self.selected_files)} files?\n\n"
+            f"⚠️ Sanitise {len(self.selected_files)} files with '{policy_name}'?\n\n"
             "This will remove:\n"
-            "• All GPS data\n"
-            "• Camera information\n"
-            "• Copyright/Author data\n"
-            "• And more...\n\n"
-            "This cannot be undone!\n\n"
-            f"🚀 Processing with {min(8, len(self.selected_files))} parallel workers"
+            + "".join(f"• {item}\n" for item in removed)
+            + (f"\nKept: {', '.join(kept)}\n" if kept else "")
+            + "\nUse ↩️ Undo Last Job to restore the metadata.\n\n"
+            f"🚀 Processing with {min(jobs.DEFAULT_WORKERS, len(self.selected_files))} parallel workers"
         )
         
         if not confirm:
             return
         
+        # Snapshot the selection so changes made while the job runs don't affect it
+        files = list(self.selected_files)
+        
         # Run in background thread
         def process_files():
             # Show progress dialog
-            self.after(0, lambda: setattr(self, '_sanitise_progress_window', 
-                                         self.show_progress_dialog("Sanitising Files", len(self.selected_files))))
-            
-            completed = 0
-            errors = []
+            progress, on_progress = self.open_progress("Sanitising Files", len(files))
             
-            # Use ThreadPoolExecutor for parallel processing
-            max_workers = min(8, len(self.selected_files))
-            
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                # Submit all tasks
-                future_to_file = {
-                    executor.submit(self.sanitise_exif, file_path): file_path
-                    for file_path in self.selected_files
-                }
-                
-                # Process completed tasks as they finish
-                for future in as_completed(future_to_file):
-                    file_path = future_to_file[future]
-                    try:
-                        future.result()  # Raises exception if task failed
-                        completed += 1
-                    except Exception as e:
-                        errors.append((file_path.name, str(e)))
-                    
-                    # Update progress on main thread
-                    self.after(0, lambda c=completed, f=file_path.name: 
-                              self.update_progress(getattr(self, '_sanitise_progress_window', None), 
-                                                  c, len(self.selected_files), f))
+            job_journal = journal.Journal('sanitise_files')
+            job_manifest = manifest.Manifest.create(
+                'sanitise_files',
+                [(file_path, policy_name) for file_path in files],
+                job_journal.path
+            )
+            completed, errors = self.run_queued(
+                job_manifest,
+                progress,
+                self.sanitise_exif,
+                on_progress=on_progress,
+                name='sanitise_files',
+                journal=job_journal,
+                atomic_writes=True,
+                checksum_log=checksums.start('sanitise_files'),
+                stage=True
+            )
             
             # Close progress dialog and show result
-            self.after(0, lambda: self._finish_sanitise(completed, errors))
+            self.ui_call(lambda: self._finish_sanitise(completed, errors, progress.get('window')))
         
         # Start background thread
         threading.Thread(target=process_files, daemon=True).start()
     
-    def sanitise_exif(self, file_path):
-        """Remove all EXIF data except essential info using ExifTool."""
-        cmd = 'exiftool.exe' if platform.system() == 'Windows' else 'exiftool'
+    def sanitise_exif(self, file_path, policy_name=sanitise_policies.DEFAULT_POLICY, output=None):
+        """Remove EXIF data according to a sanitise policy."""
+        exif_ops.sanitise(file_path, output, sanitise_policies.compile_policy(policy_name))
+
+    def _finish_sanitise(self, success_count, errors, progress_window=None):
+        """Finish sanitisation and show results."""
+        # Close progress window
+        if progress_window:
+            try:
+                progress_window.destroy()
+            except:
+                pass
+        
+        self.refresh_file_view()
+        
+        # Show results
+        if errors:
+            error_msg = f"Sanitised {success_count} file(s)\n\n"
+            error_msg += f"Failed {len(errors)} file(s):\n"
+            for name, error in errors[:5]:  # Show first 5 errors
+                error_msg += f"• {Path(name).name}: {error}\n"
+            if len(errors) > 5:
+                error_msg += f"... and {len(errors) - 5} more"
+            messagebox.showwarning("Partial Success", error_msg)
+        else:
+            self.show_auto_close_message("Success", f"Sanitised {success_count} file(s) 🚀")
+
+    def resume_interrupted_jobs(self):
+        """Offer to continue jobs that didn't finish (app closed, crash, power loss)."""
+        job_functions = {
+            'apply_datetime': self.set_file_datetime,
+            'shift_datetime': self.shift_file_datetime,
+            'apply_gps': self.set_exif_gps,
+            'geotag': self.set_exif_gps,
+            'infer_gps': self.set_exif_gps,
+            'apply_datetime_xmp': self.set_sidecar_datetime,
+            'shift_datetime_xmp': self.shift_sidecar_datetime,
+            'apply_gps_xmp': self.set_sidecar_gps,
+            'geotag_xmp': self.set_sidecar_gps,
+            'infer_gps_xmp': self.set_sidecar_gps,
+            'copy_duplicates': self.copy_metadata,
+            'copy_duplicates_xmp': self.copy_sidecar_metadata,
+            'sanitise_files': self.sanitise_exif
+        }
+        
+        manifest.prune_finished()
+        to_resume = []
+        for path in manifest.interrupted():
+            job = manifest.Manifest.load(path)
+            if job.job_name not in job_functions or not job.tasks:
+                job.close()
+                manifest.discard(path)
+                continue
+            to_resume.append(job)
+        
+        if not to_resume:
+            return
         
-        args = [
-            cmd,
-            '-overwrite_original',
-            '-all=',
-            str(file_path)
+        lines = [
+            f"• {job.job_name} (started {job.info.get('started', '').replace('T', ' ')}): "
+            f"{len(job.tasks)} of {job.total} file(s) to do"
+            f"{', paused' if job.info.get('paused') else ''}"
+            for job in to_resume
         ]
+        resume = messagebox.askyesno(
+            "Resume Unfinished Jobs",
+            f"{len(to_resume)} job(s) didn't finish:\n\n" + "\n".join(lines) + "\n\n"
+            "Continue them now? Files already done aren't redone. (No discards them)"
+        )
+        if not resume:
+            for job in to_resume:
+                job.close()
+                atomic.remove_temp_files(task[0] for task in job.tasks)
+                manifest.discard(job.path)
+            return
+        
+        # Each job goes back in the queue, in order, with its priority and pause state
+        def process_job(job, queued):
+            progress, on_progress = self.open_progress(f"Resuming {job.job_name}", len(job.tasks))
+            journal_path = job.info.get('journal')
+            completed, errors = self.run_queued(
+                job,
+                progress,
+                job_functions[job.job_name],
+                on_progress=on_progress,
+                name=job.job_name,
+                journal=journal.Journal(job.job_name, path=journal_path) if journal_path else None,
+                atomic_writes=True,
+                checksum_log=None if job.job_name.endswith('_xmp') else checksums.start(job.job_name),
+                stage=not job.job_name.endswith('_xmp'),
+                job=queued
+            )
+            
+            # Close progress dialog and show result
+            self.ui_call(lambda: self._finish_resume(completed, errors, progress.get('window')))
+        
+        for job in to_resume:
+            threading.Thread(target=process_job, args=(job, self.job_queue.add(job)), daemon=True).start()
+    
+    def _finish_resume(self, success_count, errors, progress_window=None):
+        """Finish a resumed job and show results."""
+        # Close progress window
+        if progress_window:
+            try:
+                progress_window.destroy()
+            except:
+                pass
         
-        result = subprocess.run(
-            args,
-            capture_output=True,
-            text=True,
-            shell=(platform.system() == 'Windows')
+        self.refresh_file_view()
+        
+        # Show results
+        if errors:
+            error_msg = f"Updated {success_count} file(s)\n\n"
+            error_msg += f"Failed {len(errors)} file(s):\n"
+            for name, error in errors[:5]:  # Show first 5 errors
+                error_msg += f"• {Path(name).name}: {error}\n"
+            if len(errors) > 5:
+                error_msg += f"... and {len(errors) - 5} more"
+            messagebox.showwarning("Partial Success", error_msg)
+        else:
+            self.show_auto_close_message("Success", f"Resumed job finished - updated {success_count} file(s) 🚀")
+    
+    def undo_last_job(self):
+        """Restore the metadata overwritten by the most recent job."""
+        journal_path = journal.latest_journal()
+        if journal_path is None:
+            messagebox.showinfo("Undo", "There is no job to undo.")
+            return
+        
+        info, index = journal.read_index(journal_path)
+        if not index:
+            journal.mark_undone(journal_path)
+            messagebox.showinfo("Undo", "The last job didn't change any files.")
+            return
+        
+        confirm = messagebox.askyesno(
+            "Confirm Undo",
+            f"Undo '{info.get('job')}' from {info.get('started', '').replace('T', ' ')}?\n\n"
+            f"This restores the original metadata of {len(index)} file(s)."
         )
         
-        if result.returncode != 0:
-            raise Exception(result.stderr)
-
-    def _finish_sanitise(self, success_count, errors):
-        """Finish sanitisation and show results."""
+        if not confirm:
+            return
+        
+        tags = info.get('tags')
+        
+        # Run in background thread, through the queue so it never overlaps a write job
+        def process_files():
+            progress, on_progress = self.open_progress("Undoing Last Job", len(index))
+            
+            completed, errors = self.run_queued(
+                manifest.Manifest.create('undo', index),
+                progress,
+                lambda file_path, offset: journal.restore(journal_path, offset, tags),
+                on_progress=on_progress,
+                name='undo',
+                checksum_log=None if info.get('sidecars') else checksums.start('undo')
+            )
+            if not errors:
+                journal.mark_undone(journal_path)
+            
+            # Close progress dialog and show result
+            self.ui_call(lambda: self._finish_undo(completed, errors, progress.get('window')))
+        
+        # Start background thread
+        threading.Thread(target=process_files, daemon=True).start()
+    
+    def _finish_undo(self, success_count, errors, progress_window=None):
+        """Finish an undo, reload the file list and show results."""
         # Close progress window
-        if hasattr(self, '_sanitise_progress_window') and self._sanitise_progress_window:
+        if progress_window:
             try:
-                self._sanitise_progress_window.destroy()
+                progress_window.destroy()
             except:
                 pass
         
+        self.load_directory()
+        
         # Show results
         if errors:
-            error_msg = f"Sanitised {success_count} file(s)\n\n"
+            error_msg = f"Restored {success_count} file(s)\n\n"
             error_msg += f"Failed {len(errors)} file(s):\n"
             for name, error in errors[:5]:  # Show first 5 errors
-                error_msg += f"• {name}: {error}\n"
+                error_msg += f"• {Path(name).name}: {error}\n"
             if len(errors) > 5:
                 error_msg += f"... and {len(errors) - 5} more"
+            error_msg += "\n\nRun Undo Last Job again to retry."
             messagebox.showwarning("Partial Success", error_msg)
         else:
-            self.show_auto_close_message("Success", f"Sanitised {success_count} file(s) 🚀")
+            self.show_auto_close_message("Success", f"Restored {success_count} file(s) ↩️")
 
 def main():
     """Main entry point."""
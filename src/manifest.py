@@ -0,0 +1,198 @@
+"""Job Manifest - durable record of a batch job's tasks and progress
+
+A manifest is a JSON Lines file in ``<data dir>/jobs``: a header line with the
+job name and journal, one line per task, then a ``done`` line for every
+committed group of tasks and a final ``finished`` line. ``state`` lines
+record changes to the job's queue state (priority, paused; see
+``job_queue``). A manifest without the ``finished`` line belongs to an
+interrupted job, which can be resumed exactly where it stopped; a cancelled
+job is finished.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import config
+
+
+def manifest_dir():
+    path = config.data_dir() / 'jobs'
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _encode(value):
+    if isinstance(value, Path):
+        return str(value)
+    if isinstance(value, datetime):
+        return {'datetime': value.isoformat()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict) and 'datetime' in value:
+        return datetime.fromisoformat(value['datetime'])
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+def _decode_task(task):
+    # The first item of a task is always the file path
+    return (Path(task[0]),) + tuple(_decode(v) for v in task[1:])
+
+
+class Manifest:
+    """The manifest of one job.
+
+    Use ``create`` for a new job or ``load`` to resume one. ``tasks`` holds
+    the tasks still to run, in order; pass positions in that list to
+    ``mark_done``.
+    """
+
+    def __init__(self, path, info, tasks, indices):
+        self.path = Path(path)
+        self.info = info
+        self.tasks = tasks
+        self._indices = indices
+        self.total = info.get('tasks', len(tasks))
+        self._lock = threading.Lock()
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    @property
+    def job_name(self):
+        return self.info.get('job')
+
+    @classmethod
+    def create(cls, job_name, tasks, journal_path=None):
+        started = datetime.now()
+        stem = re.sub(r'[^\w.-]+', '_', f"{started:%Y%m%d-%H%M%S}-{job_name}")
+        path = manifest_dir() / f"{stem}.jsonl"
+        info = {'job': job_name, 'started': started.isoformat(timespec='seconds'),
+                'tasks': len(tasks), 'journal': str(journal_path) if journal_path else None}
+
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(info) + '\n')
+            for task in tasks:
+                f.write(json.dumps({'task': _encode(task)}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+        return cls(path, info, list(tasks), list(range(len(tasks))))
+
+    @classmethod
+    def load(cls, path):
+        """Load a manifest, keeping only the tasks that haven't been committed."""
+        info = None
+        tasks = []
+        done = set()
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # Torn final line from a crash
+                if info is None:
+                    info = entry
+                elif 'task' in entry:
+                    tasks.append(entry['task'])
+                elif 'done' in entry:
+                    done.update(entry['done'])
+                elif 'state' in entry and info is not None:
+                    info.update(entry['state'])
+
+        indices = [i for i in range(len(tasks)) if i not in done]
+        return cls(path, info or {}, [_decode_task(tasks[i]) for i in indices], indices)
+
+    def mark_done(self, positions):
+        """Durably record tasks (positions in ``tasks``) as committed."""
+        if not positions:
+            return
+        done = sorted(self._indices[p] for p in positions)
+        with self._lock:
+            self._file.write(json.dumps({'done': done}) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def set_state(self, **values):
+        """Durably record queue state (e.g. ``priority``, ``paused``), kept in ``info``."""
+        with self._lock:
+            self.info.update(values)
+            if self._file.closed:
+                return
+            self._file.write(json.dumps({'state': values}) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def cancel(self):
+        """Mark a cancelled job finished, so it isn't resumed."""
+        with self._lock:
+            if self._file.closed:
+                if is_finished(self.path):
+                    return
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(json.dumps({'finished': datetime.now().isoformat(timespec='seconds'),
+                                         'cancelled': True}) + '\n')
+            self._file.close()
+
+    def finish(self):
+        """Mark the job complete and close the manifest."""
+        with self._lock:
+            self._file.write(json.dumps({'finished': datetime.now().isoformat(timespec='seconds')}) + '\n')
+            self._file.close()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+def is_finished(path):
+    """True if a manifest ends with its ``finished`` line."""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - 200))
+        return b'"finished"' in f.read()
+
+
+def interrupted():
+    """Return the manifests of interrupted jobs, oldest first."""
+    return [path for path in sorted(manifest_dir().glob('*.jsonl')) if not is_finished(path)]
+
+
+def recently_active(seconds=120):
+    """True if an unfinished manifest was written in the last ``seconds``.
+
+    A running job (in this or another process) appends to its manifest as
+    files are committed, so this tells other processes a write job is busy.
+    """
+    cutoff = time.time() - seconds
+    for path in manifest_dir().glob('*.jsonl'):
+        try:
+            if path.stat().st_mtime >= cutoff and not is_finished(path):
+                return True
+        except OSError:
+            continue
+    return False
+
+
+def discard(path):
+    """Delete a manifest whose job won't be resumed."""
+    Path(path).unlink()
+
+
+def prune_finished():
+    """Delete the manifests of finished jobs."""
+    for path in manifest_dir().glob('*.jsonl'):
+        if is_finished(path):
+            try:
+                path.unlink()
+            except OSError:
+                pass
@@ -0,0 +1,165 @@
+"""Preflight - skip files that already hold the values a job would write
+
+Before a date or GPS job, the current values of every selected file are read
+in a few batched ExifTool commands and compared with the target values.
+Files that already match (within tolerance) are dropped from the job, so
+re-applying a preset to a mixed selection only rewrites the files that need
+it.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import exif_ops
+import filetimes
+import jobs
+import timing
+
+
+# Files per ExifTool read command
+READ_CHUNK = 100
+
+# Differences at or below these are treated as "already set"
+DATETIME_TOLERANCE_S = 1
+GPS_TOLERANCE_DEG = 1e-6  # ~0.1 m
+
+GPS_TAGS = ('GPSLatitude', 'GPSLatitudeRef', 'GPSLongitude', 'GPSLongitudeRef')
+
+
+def read_current(files, tags, max_workers=jobs.DEFAULT_WORKERS, sidecars=True):
+    """Read tags from many files in parallel batches.
+
+    Args:
+        sidecars: Merge values from XMP sidecars (see ``exif_ops.read_tags``)
+
+    Returns:
+        {path_key(file): {tag: value}}; files that couldn't be read are missing
+    """
+    chunks = [files[i:i + READ_CHUNK] for i in range(0, len(files), READ_CHUNK)]
+    if not chunks:
+        return {}
+
+    def read_chunk(chunk):
+        try:
+            return exif_ops.read_tags(chunk, tags, sidecars)
+        except Exception:
+            # Unknown values - those files are simply written
+            return {}
+
+    current = {}
+    pool = exif_ops.ExifToolPool()
+    try:
+        with timing.span('preflight.read', files=len(files)):
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks)),
+                                    initializer=pool.bind) as executor:
+                for values in executor.map(read_chunk, chunks):
+                    current.update(values)
+    finally:
+        pool.close()
+    return current
+
+
+def parse_exif_datetime(value):
+    try:
+        return datetime.strptime(str(value)[:19], exif_ops.EXIF_DATETIME_FORMAT)
+    except ValueError:
+        return None
+
+
+def _file_timestamp(file_path, field):
+    """Return the OS timestamp behind a Windows timestamp field, or None."""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    if field == 'WindowsModified':
+        return stat.st_mtime
+    return filetimes.created_time(stat)
+
+
+def datetime_matches(file_path, dt, fields, tags):
+    """True if every field of a file already holds ``dt``."""
+    for field in fields:
+        if field == 'WindowsCreated' and not filetimes.CAN_SET_CREATED:
+            continue  # Can't be set here, so nothing to change
+        if field in exif_ops.WINDOWS_TIMESTAMP_FIELDS:
+            current = _file_timestamp(file_path, field)
+            if current is None or abs(current - dt.timestamp()) > DATETIME_TOLERANCE_S:
+                return False
+        else:
+            current = parse_exif_datetime(tags.get(field, ''))
+            if current is None or abs((current - dt).total_seconds()) > DATETIME_TOLERANCE_S:
+                return False
+    return True
+
+
+def signed_gps(tags):
+    """Return signed (lat, lon) from read ``GPS_TAGS``, or None if there's no position.
+
+    Values are unsigned (``-n``) with S/W in the Ref tags; a value that is
+    already negative stays negative.
+    """
+    try:
+        lat = float(tags['GPSLatitude'])
+        lon = float(tags['GPSLongitude'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if tags.get('GPSLatitudeRef') == 'S':
+        lat = -abs(lat)
+    if tags.get('GPSLongitudeRef') == 'W':
+        lon = -abs(lon)
+    return lat, lon
+
+
+def gps_matches(lat, lon, tags):
+    """True if the GPS tags already hold the coordinates."""
+    current = signed_gps(tags)
+    if current is None:
+        return False
+    current_lat, current_lon = current
+    return (abs(current_lat - lat) <= GPS_TOLERANCE_DEG
+            and abs(current_lon - lon) <= GPS_TOLERANCE_DEG)
+
+
+def plan_datetime(file_datetime_pairs, fields, sidecars=False):
+    """Split (file, datetime) pairs into those to write and those already set.
+
+    With ``sidecars``, values are compared with the XMP sidecars (sidecar
+    write mode) rather than with the files themselves.
+
+    Returns:
+        (to_change, unchanged) - lists of (file, datetime) pairs
+    """
+    exif_fields = [f for f in fields if f not in exif_ops.WINDOWS_TIMESTAMP_FIELDS]
+    files = [file_path for file_path, _ in file_datetime_pairs]
+    current = read_current(files, exif_fields, sidecars=sidecars) if exif_fields else {}
+
+    to_change, unchanged = [], []
+    for file_path, dt in file_datetime_pairs:
+        tags = current.get(exif_ops.path_key(file_path), {})
+        if datetime_matches(file_path, dt, fields, tags):
+            unchanged.append((file_path, dt))
+        else:
+            to_change.append((file_path, dt))
+    return to_change, unchanged
+
+
+def plan_gps(files, lat, lon, sidecars=False):
+    """Split files into those to write and those that already hold lat/lon.
+
+    ``sidecars`` is as for ``plan_datetime``.
+
+    Returns:
+        (to_change, unchanged) - lists of file paths
+    """
+    current = read_current(files, GPS_TAGS, sidecars=sidecars)
+
+    to_change, unchanged = [], []
+    for file_path in files:
+        tags = current.get(exif_ops.path_key(file_path))
+        if tags is not None and gps_matches(lat, lon, tags):
+            unchanged.append(file_path)
+        else:
+            to_change.append(file_path)
+    return to_change, unchanged
@@ -0,0 +1,193 @@
+"""Profiling - opt-in profiler for batch jobs
+
+A job is profiled when ``IMMICH_EXIF_PROFILE`` is set (every job) or when the
+Diagnostics window has armed profiling for the next job. Two modes:
+
+    collapsed  A sampling profiler that walks every thread's stack every few
+               milliseconds and writes collapsed stacks ("a;b;c 42" lines),
+               ready for flamegraph.pl, speedscope or inferno.
+    pstats     Deterministic cProfile of every call made through ``wrap``,
+               one profiler per thread, merged into one .pstats file
+               (snakeviz, pstats).
+
+Output goes to ``IMMICH_EXIF_PROFILE_DIR`` or ``<data dir>/profiles``.
+"""
+
+import cProfile
+import os
+import pstats
+import re
+import sys
+import threading
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+import config
+
+
+MODES = ('collapsed', 'pstats')
+
+# Seconds between stack samples in collapsed mode
+DEFAULT_INTERVAL = 0.005
+
+_armed_mode = None
+_armed_lock = threading.Lock()
+
+# Path of the most recent profile, shown in the Diagnostics window
+last_output = None
+
+
+def arm(mode='collapsed'):
+    """Profile the next job only."""
+    global _armed_mode
+    if mode not in MODES:
+        raise ValueError(f"Unknown profile mode: {mode}")
+    with _armed_lock:
+        _armed_mode = mode
+
+
+def disarm():
+    global _armed_mode
+    with _armed_lock:
+        _armed_mode = None
+
+
+def armed_mode():
+    return _armed_mode
+
+
+def _requested_mode():
+    """Return the mode for the job about to start, consuming a one-shot arm."""
+    global _armed_mode
+    with _armed_lock:
+        if _armed_mode:
+            mode, _armed_mode = _armed_mode, None
+            return mode
+
+    value = os.getenv('IMMICH_EXIF_PROFILE', '').strip().lower()
+    if not value or value in ('0', 'false', 'off'):
+        return None
+    return value if value in MODES else 'collapsed'
+
+
+def output_dir():
+    value = os.getenv('IMMICH_EXIF_PROFILE_DIR', '').strip()
+    path = Path(value) if value else config.data_dir() / 'profiles'
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+def _thread_label(name):
+    # Group pool workers ("ThreadPoolExecutor-3_7") into one root frame
+    return re.sub(r'[-_]\d+', '', name)
+
+
+class ProfileSession:
+    """Profiles one job. Use ``wrap`` on functions run by worker threads."""
+
+    def __init__(self, job_name, mode):
+        self.job_name = job_name
+        self.mode = mode
+        self.started = datetime.now()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._samples = Counter()
+        self._profiles = []
+        self._local = threading.local()
+        self._sampler = None
+
+    def start(self):
+        if self.mode == 'collapsed':
+            self._sampler = threading.Thread(target=self._sample, name='profiler', daemon=True)
+            self._sampler.start()
+        return self
+
+    def wrap(self, func):
+        """Return func, profiled on whichever thread calls it in pstats mode."""
+        if self.mode != 'pstats':
+            return func
+
+        def profiled(*args, **kwargs):
+            local = self._local
+            if getattr(local, 'depth', 0):
+                # Already profiling on this thread
+                return func(*args, **kwargs)
+
+            profile = getattr(local, 'profile', None)
+            if profile is None:
+                profile = local.profile = cProfile.Profile()
+                with self._lock:
+                    self._profiles.append(profile)
+            try:
+                profile.enable()
+            except ValueError:
+                # Python 3.12+ allows one active cProfile at a time
+                return func(*args, **kwargs)
+
+            local.depth = 1
+            try:
+                return func(*args, **kwargs)
+            finally:
+                local.depth = 0
+                profile.disable()
+
+        return profiled
+
+    def _sample(self):
+        interval = float(os.getenv('IMMICH_EXIF_PROFILE_INTERVAL', DEFAULT_INTERVAL))
+        me = threading.get_ident()
+        while not self._stop.wait(interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(_thread_label(names.get(ident, str(ident))))
+                self._samples[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        """Stop profiling and write the output file. Returns its path."""
+        global last_output
+        stem = re.sub(r'[^\w.-]+', '_', f"{self.started:%Y%m%d-%H%M%S}-{self.job_name}")
+
+        if self.mode == 'collapsed':
+            self._stop.set()
+            self._sampler.join()
+            path = output_dir() / f"{stem}.collapsed.txt"
+            with open(path, 'w', encoding='utf-8') as f:
+                for stack, count in self._samples.most_common():
+                    f.write(f"{stack} {count}\n")
+        else:
+            path = output_dir() / f"{stem}.pstats"
+            stats = None
+            with self._lock:
+                for profile in self._profiles:
+                    profile.create_stats()
+                    if not profile.stats:
+                        continue
+                    if stats is None:
+                        stats = pstats.Stats(profile)
+                    else:
+                        stats.add(profile)
+            if stats is None:
+                return None
+            stats.dump_stats(str(path))
+
+        last_output = path
+        return path
+
+
+def start_session(job_name):
+    """Start profiling a job if requested, otherwise return None."""
+    mode = _requested_mode()
+    if not mode:
+        return None
+    return ProfileSession(job_name, mode).start()
@@ -0,0 +1,104 @@
+"""Sanitise policies - what the Sanitise tab removes
+
+Each policy drops some tag groups and may keep a few tags that change how
+the image looks. Edit or add policies here; restart the app to see them.
+
+A policy is compiled once per job into a SanitisePlan: the ExifTool
+arguments for the whole batch, plus the native JPEG stripper settings when
+the policy removes everything (see ``jpeg.strip_metadata``).
+"""
+
+import functools
+from collections import namedtuple
+
+
+# Tag groups a policy can drop, as ExifTool tag names (wildcards allowed)
+TAG_GROUPS = {
+    "gps": {
+        "label": "GPS location data",
+        "tags": ["GPS:all", "XMP-exif:GPS*"],
+    },
+    "location": {
+        "label": "Place names (city, state, country)",
+        "tags": ["IPTC:City", "IPTC:Sub-location", "IPTC:Province-State",
+                 "IPTC:Country-PrimaryLocationName", "IPTC:Country-PrimaryLocationCode",
+                 "XMP-photoshop:City", "XMP-photoshop:State", "XMP-photoshop:Country",
+                 "XMP-iptcCore:Location", "XMP-iptcCore:CountryCode"],
+    },
+    "camera": {
+        "label": "Camera and lens make, model and serial numbers",
+        "tags": ["Make", "Model", "SerialNumber", "BodySerialNumber", "InternalSerialNumber",
+                 "LensMake", "LensModel", "LensSerialNumber", "MakerNotes:all"],
+    },
+    "owner": {
+        "label": "Owner, author, artist and copyright",
+        "tags": ["Artist", "Copyright", "OwnerName", "CameraOwnerName",
+                 "XMP-dc:Creator", "XMP-dc:Rights", "IPTC:By-line", "IPTC:CopyrightNotice"],
+    },
+    "all": {
+        "label": "All other metadata (dates, software, comments...)",
+        "tags": ["all"],
+    },
+}
+
+# Tags a policy can keep when it drops "all"
+KEEP_TAGS = {
+    "icc": {"label": "Colour profile", "tags": ["ICC_Profile"]},
+    "orientation": {"label": "Orientation", "tags": ["Orientation"]},
+}
+
+SANITISE_POLICIES = [
+    {
+        "name": "📍 GPS only",
+        "drop": ["gps", "location"],
+    },
+    {
+        "name": "📷 Camera identity",
+        "drop": ["gps", "location", "camera", "owner"],
+    },
+    {
+        "name": "🧹 Full",
+        "drop": ["gps", "location", "camera", "owner", "all"],
+        "keep": ["icc", "orientation"],
+    },
+]
+
+DEFAULT_POLICY = "🧹 Full"
+
+# ExifTool arguments, and jpeg.strip_metadata keyword arguments or None
+SanitisePlan = namedtuple('SanitisePlan', ['name', 'exiftool_args', 'native'])
+
+
+def get_policy(name):
+    for policy in SANITISE_POLICIES:
+        if policy["name"] == name:
+            return policy
+    raise KeyError(f"Unknown sanitise policy: {name}")
+
+
+def describe(name):
+    """Return (removed labels, kept labels) for showing a policy to the user."""
+    policy = get_policy(name)
+    removed = [TAG_GROUPS[group]["label"] for group in policy["drop"]]
+    kept = [KEEP_TAGS[tag]["label"] for tag in policy.get("keep", [])]
+    return removed, kept
+
+
+@functools.lru_cache(maxsize=None)
+def compile_policy(name=DEFAULT_POLICY):
+    """Compile a policy into a SanitisePlan (cached, so once per policy)."""
+    policy = get_policy(name)
+    drop = policy["drop"]
+    keep = policy.get("keep", [])
+
+    if "all" in drop:
+        args = ['-all=']
+        keep_tags = [tag for key in keep for tag in KEEP_TAGS[key]["tags"]]
+        if keep_tags:
+            args += ['-tagsFromFile', '@'] + [f"-{tag}" for tag in keep_tags]
+        native = {'keep_icc': 'icc' in keep, 'keep_orientation': 'orientation' in keep}
+        return SanitisePlan(name, tuple(args), native)
+
+    # Tag-level edits inside Exif/XMP need ExifTool
+    args = [f"-{tag}=" for group in drop for tag in TAG_GROUPS[group]["tags"]]
+    return SanitisePlan(name, tuple(args), None)
@@ -0,0 +1,244 @@
+"""Staging - edit local copies of files on a network share
+
+ExifTool rewriting a file on an SMB share makes many small reads and writes,
+each a network round trip. With staging (``IMMICH_EXIF_STAGING``), a job
+instead:
+
+    download  one thread copies the job's files, in job order, to a local
+              folder with large sequential reads, running up to
+              ``IMMICH_EXIF_STAGING_MB`` ahead of the edits
+    edit      the workers run the job on the local copies
+    upload    each worker copies its new file back to the share (to the
+              temp file ``atomic`` commits) with large sequential writes,
+              checks the size and SHA-1 of what landed, and copies the
+              file times across
+
+so downloads, edits and uploads of different files overlap and the job is
+limited by bandwidth rather than latency. A file changed on the share while
+it was staged fails rather than being overwritten.
+
+Only files ExifTool writes in place are staged; sidecar edits (and formats
+that fall back to sidecars) write next to the original directly.
+"""
+
+import functools
+import hashlib
+import os
+import platform
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+import atomic
+import checksums
+import config
+import filetimes
+import formats
+import timing
+
+
+# Read/write size for copies to and from the share
+COPY_BUFFER = 4 * 1024 * 1024
+
+# File systems treated as network shares (/proc/mounts types)
+NETWORK_FILESYSTEMS = ('cifs', 'smb3', 'smbfs', 'nfs', 'nfs4', 'fuse.sshfs', 'afpfs', 'webdav', 'davfs')
+
+# GetDriveTypeW result for network drives
+_DRIVE_REMOTE = 4
+
+
+class StagingError(Exception):
+    """A staged copy couldn't be made or written back intact."""
+
+
+def wanted(file_path):
+    """True if ``file_path`` should be staged under ``config.staging_mode``."""
+    mode = config.staging_mode()
+    if mode == 'off' or not formats.handler_for(file_path).writable:
+        return False
+    return mode == 'always' or is_network_path(file_path)
+
+
+def is_network_path(file_path):
+    """True if a file is on a network share (UNC path, mapped drive or network mount)."""
+    path = os.path.abspath(file_path)
+    if platform.system() == 'Windows':
+        if path.startswith('\\\\'):
+            return True
+        return _windows_drive_remote(os.path.splitdrive(path)[0].upper())
+    # The deepest mount point containing the file
+    mount = max((m for m in _mounts() if path == m[0] or path.startswith(m[0].rstrip('/') + '/')),
+                key=lambda m: len(m[0]), default=None)
+    return mount is not None and mount[1] in NETWORK_FILESYSTEMS
+
+
+@functools.lru_cache(maxsize=None)
+def _windows_drive_remote(drive):
+    import ctypes
+    return ctypes.windll.kernel32.GetDriveTypeW(drive + '\\') == _DRIVE_REMOTE
+
+
+@functools.lru_cache(maxsize=1)
+def _mounts():
+    """Return [(mount point, file system type)] from /proc/mounts (empty elsewhere)."""
+    try:
+        with open('/proc/mounts', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return []
+    mounts = []
+    for line in lines:
+        parts = line.split()
+        if len(parts) >= 3:
+            # Spaces in mount points are escaped as \040
+            mounts.append((parts[1].replace('\\040', ' '), parts[2]))
+    return mounts
+
+
+def _copy(source, target):
+    """Copy a file with large sequential reads and writes.
+
+    Returns:
+        (size, SHA-1 hex) of the data copied
+    """
+    digest = hashlib.sha1()
+    size = 0
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        while True:
+            chunk = src.read(COPY_BUFFER)
+            if not chunk:
+                break
+            digest.update(chunk)
+            dst.write(chunk)
+            size += len(chunk)
+    return size, digest.hexdigest()
+
+
+def _copy_times(stat, target, created=None):
+    filetimes.set_times(target, created if filetimes.CAN_SET_CREATED else None,
+                        stat.st_mtime, stat.st_atime)
+
+
+class Stager:
+    """Downloads a job's files ahead of the workers and uploads the results.
+
+    Args:
+        files: The files to stage, in the order the job runs them
+        ahead_bytes: How much may be downloaded but not yet uploaded
+            (default ``config.staging_mb``)
+    """
+
+    def __init__(self, files, ahead_bytes=None):
+        self.files = list(files)
+        self._keys = {str(file_path) for file_path in self.files}
+        self.ahead_bytes = config.staging_mb() * 1024 * 1024 if ahead_bytes is None else ahead_bytes
+        self.folder = Path(tempfile.mkdtemp(prefix='job-', dir=config.staging_dir()))
+        self._staged = {}  # original -> (local copy, stat at download) or exception
+        self._bytes = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._download_all, name='staging', daemon=True)
+        self._thread.start()
+
+    def __contains__(self, file_path):
+        return str(file_path) in self._keys
+
+    def _download_all(self):
+        for i, file_path in enumerate(self.files):
+            with self._cond:
+                while self._bytes > self.ahead_bytes and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+            try:
+                result = self._download(i, file_path)
+                size = result[1].st_size
+            except Exception as e:
+                result, size = e, 0
+            with self._cond:
+                self._staged[str(file_path)] = result
+                self._bytes += size
+                self._cond.notify_all()
+
+    def _download(self, i, file_path):
+        local = self.folder / f"{i:06d}-{Path(file_path).name}"
+        with timing.span('staging.download'):
+            stat = os.stat(file_path)
+            size, _ = _copy(file_path, local)
+            if size != stat.st_size:
+                raise StagingError(f"Download incomplete ({size} of {stat.st_size} bytes)")
+            # The copy stands in for the original: same times, so ExifTool's
+            # writes and the journal see the original's
+            _copy_times(stat, local, filetimes.created_time(stat))
+        return local, stat
+
+    def fetch(self, file_path):
+        """Wait for a file's local copy and return its path.
+
+        Raises:
+            StagingError: If the download failed
+        """
+        key = str(file_path)
+        with timing.span('staging.wait'):
+            with self._cond:
+                while key not in self._staged:
+                    self._cond.wait()
+                result = self._staged[key]
+        if isinstance(result, Exception):
+            self.release(file_path)
+            raise StagingError(f"Couldn't stage {Path(file_path).name}: {result}")
+        return result[0]
+
+    def upload(self, file_path):
+        """Write a staged file's edit back next to the original, as its ``atomic`` temp file.
+
+        If the edit wrote no new file (e.g. only file times changed), the
+        copy's times are set on the original instead.
+
+        Raises:
+            StagingError: If the original changed meanwhile, or the upload
+                doesn't match the local file
+        """
+        local, before = self._staged[str(file_path)]
+        local_output = atomic.temp_path(local)
+        with timing.span('staging.upload'):
+            current = os.stat(file_path)
+            if (current.st_size, current.st_mtime) != (before.st_size, before.st_mtime):
+                raise StagingError(f"{Path(file_path).name} changed on the share while it was being edited")
+
+            if not local_output.exists():
+                stat = os.stat(local)
+                created = filetimes.created_time(stat)
+                if (stat.st_mtime, created) != (before.st_mtime, filetimes.created_time(before)):
+                    _copy_times(stat, file_path, created)
+                return
+
+            output = atomic.temp_path(file_path)
+            size, sha1 = _copy(local_output, output)
+            stat = os.stat(local_output)
+            _copy_times(stat, output, filetimes.created_time(stat))
+            with timing.span('staging.verify'):
+                if os.path.getsize(output) != size or checksums.sha1_file(output) != sha1:
+                    output.unlink(missing_ok=True)
+                    raise StagingError(f"Upload of {Path(file_path).name} didn't verify")
+
+    def release(self, file_path):
+        """Delete a file's local copies, making room for more downloads."""
+        with self._cond:
+            result = self._staged.pop(str(file_path), None)
+            if result is None or isinstance(result, Exception):
+                return
+            local, stat = result
+            self._bytes -= stat.st_size
+            self._cond.notify_all()
+        atomic.temp_path(local).unlink(missing_ok=True)
+        local.unlink(missing_ok=True)
+
+    def close(self):
+        """Stop downloading and delete the staging folder."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        shutil.rmtree(self.folder, ignore_errors=True)
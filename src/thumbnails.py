@@ -0,0 +1,178 @@
+"""Thumbnails - bounded memory for file list thumbnails
+
+Two LRU tiers, each with a byte budget:
+
+    ThumbnailCache  encoded thumbnails (JPEG/PNG bytes, a few KB each) for
+                    every file seen, so a thumbnail can be shown again
+                    without reading the file
+    PhotoBudget     the decoded images (Tk PhotoImages) shown in the list,
+                    about 25 KB each; rows far from the viewport lose
+                    theirs first and get it back from the cache on
+                    scroll-back
+
+``IMMICH_EXIF_THUMBNAIL_MB`` sets the total (default 192 MB: two thirds for
+shown images, one third for the cache).
+"""
+
+import io
+import os
+import platform
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+import config
+import timing
+
+
+def budgets():
+    """Return (photo bytes, cache bytes) from ``config.thumbnail_memory_mb``."""
+    total = config.thumbnail_memory_mb() * 1024 * 1024
+    return total * 2 // 3, total // 3
+
+
+def encode(img):
+    """Encode a thumbnail compactly: JPEG, or PNG if it has transparency."""
+    buffer = io.BytesIO()
+    if img.mode in ('RGBA', 'LA', 'P'):
+        img.save(buffer, 'PNG', optimize=False)
+    else:
+        img.convert('RGB').save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def decode(data):
+    with timing.span('thumbnail.cached'):
+        img = Image.open(io.BytesIO(data))
+        img.load()
+    return img
+
+
+class ThumbnailCache:
+    """LRU cache of encoded thumbnails, bounded in bytes. Thread-safe."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        """Return the cached thumbnail as a Pillow image, or None."""
+        with self._lock:
+            data = self._items.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+        return decode(data)
+
+    def put(self, key, img):
+        data = encode(img)
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old)
+            self._items[key] = data
+            self.bytes += len(data)
+            while self.bytes > self.max_bytes and self._items:
+                _, evicted = self._items.popitem(last=False)
+                self.bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.bytes = 0
+
+
+class PhotoBudget:
+    """Which rows hold a decoded image, least recently visible first.
+
+    Only used from the UI thread. ``evict`` returns the rows to clear; the
+    caller drops their images.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._sizes = OrderedDict()
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def __contains__(self, key):
+        return key in self._sizes
+
+    def add(self, key, width, height):
+        """Record a shown image (Tk keeps 4 bytes per pixel)."""
+        self.remove(key)
+        size = width * height * 4
+        self._sizes[key] = size
+        self.bytes += size
+
+    def touch(self, keys):
+        """Mark rows as just visible."""
+        for key in keys:
+            if key in self._sizes:
+                self._sizes.move_to_end(key)
+
+    def remove(self, key):
+        size = self._sizes.pop(key, None)
+        if size is not None:
+            self.bytes -= size
+
+    def evict(self, keep=()):
+        """Return the least recently visible rows to clear to get under budget.
+
+        Args:
+            keep: Rows that must keep their image (on or near the screen)
+        """
+        keep = set(keep)
+        victims = []
+        for key in list(self._sizes):
+            if self.bytes <= self.max_bytes:
+                break
+            if key in keep:
+                continue
+            self.remove(key)
+            victims.append(key)
+        self.evicted += len(victims)
+        return victims
+
+    def clear(self):
+        self._sizes.clear()
+        self.bytes = 0
+
+
+def process_memory():
+    """Return the process's resident memory in bytes, or None if unknown."""
+    try:
+        if platform.system() == 'Windows':
+            import ctypes
+            from ctypes import wintypes
+
+            class Counters(ctypes.Structure):
+                _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                            ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                            ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                            ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                            ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+            counters = Counters()
+            counters.cb = ctypes.sizeof(counters)
+            process = ctypes.windll.kernel32.GetCurrentProcess()
+            if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+                return counters.WorkingSetSize
+            return None
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, AttributeError, ValueError):
+        return None
@@ -0,0 +1,179 @@
+"""Timing - lightweight spans and per-operation latency histograms
+
+Hot paths wrap their work in ``span('operation')``. Every span is added to a
+latency histogram for its operation and kept (up to a limit) so the last job
+can be exported as JSON or as a Chrome trace (chrome://tracing, Perfetto).
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+
+# Histogram bucket upper bounds in milliseconds; the last bucket is open-ended
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500,
+              1000, 2500, 5000, 10000)
+
+# Spans kept for trace export; histograms keep counting beyond this
+MAX_SPANS = 200_000
+
+
+class Histogram:
+    """Latency histogram with exact count/total/max and bucketed percentiles."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, duration_ms):
+        self.count += 1
+        self.total += duration_ms
+        self.max = max(self.max, duration_ms)
+        for i, bound in enumerate(BUCKETS_MS):
+            if duration_ms <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def percentile(self, fraction):
+        """Approximate percentile: the upper bound of the bucket containing it."""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= target:
+                return BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total_ms': self.total,
+            'mean_ms': self.total / self.count if self.count else 0.0,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'max_ms': self.max,
+            'buckets_ms': list(BUCKETS_MS),
+            'bucket_counts': list(self.buckets)
+        }
+
+
+class Recorder:
+    """Thread-safe store of spans and histograms for the current job."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self.reset()
+
+    def reset(self, job_name=None):
+        with self._lock:
+            self.job_name = job_name
+            self.job_started = datetime.now()
+            self.spans = []
+            self.dropped = 0
+            self.histograms = {}
+            self.thread_names = {}
+
+    def begin_job(self, job_name):
+        """Start recording a new job, discarding the previous one."""
+        self.reset(job_name)
+
+    def end_job(self):
+        """Export the finished job if ``IMMICH_EXIF_TRACE_DIR`` is set."""
+        trace_dir = os.getenv('IMMICH_EXIF_TRACE_DIR')
+        if not trace_dir:
+            return None
+        trace_dir = Path(trace_dir)
+        trace_dir.mkdir(parents=True, exist_ok=True)
+        safe_name = re.sub(r'[^\w.-]+', '_', self.job_name or 'job')
+        stem = f"{self.job_started:%Y%m%d-%H%M%S}-{safe_name}"
+        self.export_json(trace_dir / f"{stem}.json")
+        self.export_chrome_trace(trace_dir / f"{stem}.trace.json")
+        return trace_dir / stem
+
+    def record(self, name, start, duration, args=None):
+        """Record a span that started at ``start`` (perf_counter) and took ``duration`` seconds."""
+        thread = threading.current_thread()
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(duration * 1000)
+
+            if len(self.spans) < MAX_SPANS:
+                self.spans.append((name, start, duration, thread.ident, args))
+                self.thread_names[thread.ident] = thread.name
+            else:
+                self.dropped += 1
+
+    def summary(self):
+        """Return {operation: histogram dict}, slowest total first."""
+        with self._lock:
+            items = [(name, h.to_dict()) for name, h in self.histograms.items()]
+        return dict(sorted(items, key=lambda item: item[1]['total_ms'], reverse=True))
+
+    def to_json(self):
+        return {
+            'job': self.job_name,
+            'started': self.job_started.isoformat(timespec='seconds'),
+            'spans_recorded': len(self.spans),
+            'spans_dropped': self.dropped,
+            'operations': self.summary()
+        }
+
+    def to_chrome_trace(self):
+        """Return the spans in Chrome trace event format."""
+        pid = os.getpid()
+        with self._lock:
+            spans = list(self.spans)
+            thread_names = dict(self.thread_names)
+
+        events = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+            for tid, name in thread_names.items()
+        ]
+        for name, start, duration, tid, args in spans:
+            event = {
+                'name': name,
+                'cat': name.split('.')[0],
+                'ph': 'X',
+                'ts': (start - self._origin) * 1_000_000,
+                'dur': duration * 1_000_000,
+                'pid': pid,
+                'tid': tid
+            }
+            if args:
+                event['args'] = args
+            events.append(event)
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_json(), f, indent=2)
+
+    def export_chrome_trace(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_chrome_trace(), f)
+
+
+recorder = Recorder()
+
+
+@contextmanager
+def span(name, **args):
+    """Time the enclosed block as operation ``name``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder.record(name, start, time.perf_counter() - start, args or None)
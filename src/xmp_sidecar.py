@@ -0,0 +1,298 @@
+"""XMP Sidecars - write date and GPS edits next to the original
+
+In sidecar mode the original is never rewritten; its new values go into an
+XMP sidecar the way Immich reads them:
+
+    photo.jpg.xmp   preferred (Immich's own naming)
+    photo.xmp       used instead if it already exists
+
+An existing sidecar is updated in place, keeping every other property (for
+example from darktable or Lightroom). Packets are serialised here rather than
+by ExifTool, so a bulk edit writes a few KB per file without starting a
+process. ``read_values`` turns a sidecar back into ExifTool-style values so
+reads can merge them over the original's tags.
+"""
+
+import os
+import tempfile
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import atomic
+
+
+SUFFIX = '.xmp'
+
+NAMESPACES = {
+    'x': 'adobe:ns:meta/',
+    'rdf': 'http://www.w3.org/1999/02/22-rdf-syntax-ns#',
+    'exif': 'http://ns.adobe.com/exif/1.0/',
+    'xmp': 'http://ns.adobe.com/xap/1.0/',
+}
+
+# App date fields -> XMP property; the others (Windows/file times) aren't XMP
+DATETIME_PROPERTIES = {
+    'DateTimeOriginal': ('exif', 'DateTimeOriginal'),
+    'CreateDate': ('xmp', 'CreateDate'),
+    'ModifyDate': ('xmp', 'ModifyDate'),
+    'GPSDateStamp': ('exif', 'GPSTimeStamp'),
+}
+
+GPS_PROPERTIES = {
+    'GPSLatitude': ('exif', 'GPSLatitude'),
+    'GPSLongitude': ('exif', 'GPSLongitude'),
+}
+
+XMP_DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+_PACKET_START = "<?xpacket begin='\ufeff' id='W5M0MpCehiHzreSzNTczkc9d'?>\n"
+_PACKET_END = "\n<?xpacket end='w'?>\n"
+
+for _prefix, _uri in NAMESPACES.items():
+    ET.register_namespace(_prefix, _uri)
+
+
+def _qname(prefix, name):
+    return f"{{{NAMESPACES[prefix]}}}{name}"
+
+
+def candidates(file_path):
+    """Sidecar names Immich looks for, in order: photo.jpg.xmp, photo.xmp."""
+    file_path = Path(file_path)
+    return [file_path.with_name(file_path.name + SUFFIX), file_path.with_suffix(SUFFIX)]
+
+
+def sidecar_path(file_path):
+    """Return the existing sidecar of a file, or the one to create."""
+    names = candidates(file_path)
+    for path in names:
+        if path.exists():
+            return path
+    return names[0]
+
+
+def find_sidecars(files):
+    """Return {file: sidecar path} for the files that have a sidecar.
+
+    Each folder is listed once, so this costs one directory read per folder
+    rather than two ``stat`` calls per file.
+    """
+    listings = {}
+    found = {}
+    for file_path in files:
+        parent = Path(file_path).parent
+        if parent not in listings:
+            try:
+                listings[parent] = {name.lower() for name in os.listdir(parent)
+                                    if name.lower().endswith(SUFFIX)}
+            except OSError:
+                listings[parent] = set()
+        names = listings[parent]
+        if not names:
+            continue
+        for path in candidates(file_path):
+            if path.name.lower() in names:
+                found[file_path] = path
+                break
+    return found
+
+
+def format_gps(value, positive, negative):
+    """Format a coordinate the XMP way: 'DDD,MM.mmmmmmK'."""
+    ref = positive if value >= 0 else negative
+    degrees, minutes = divmod(abs(value) * 60, 60)
+    return f"{int(degrees)},{minutes:.6f}{ref}"
+
+
+def parse_gps(text):
+    """Parse an XMP coordinate ('DDD,MM.mmK', 'DDD,MM,SSK' or decimal) to signed degrees."""
+    text = str(text).strip()
+    sign = 1
+    if text and text[-1].upper() in 'NSEW':
+        sign = -1 if text[-1].upper() in 'SW' else 1
+        text = text[:-1]
+    parts = [float(p) for p in text.split(',')]
+    value = parts[0] + sum(p / 60 ** i for i, p in enumerate(parts[1:], 1))
+    return sign * value
+
+
+def parse_datetime(text):
+    """Parse an XMP date ('2024-01-17T14:30:25[.fff][+01:00]') to a naive datetime."""
+    text = str(text).strip()
+    try:
+        return datetime.strptime(text[:19], XMP_DATETIME_FORMAT)
+    except ValueError:
+        return None
+
+
+def _register_prefix(prefix, uri):
+    """Keep other tools' namespace prefixes (darktable:, lr:...) when rewriting."""
+    try:
+        if prefix and prefix not in NAMESPACES:
+            ET.register_namespace(prefix, uri)
+    except ValueError:
+        pass
+
+
+def _load(path):
+    """Return the x:xmpmeta root of a sidecar, or a new empty one."""
+    if path.exists():
+        try:
+            root = None
+            for event, item in ET.iterparse(path, events=('start-ns', 'start')):
+                if event == 'start-ns':
+                    _register_prefix(*item)
+                elif root is None:
+                    root = item
+        except ET.ParseError as e:
+            raise Exception(f"Unreadable sidecar {path.name}: {e}")
+        if root.tag == _qname('rdf', 'RDF'):
+            wrapper = ET.Element(_qname('x', 'xmpmeta'))
+            wrapper.append(root)
+            root = wrapper
+        return root
+    root = ET.Element(_qname('x', 'xmpmeta'))
+    ET.SubElement(root, _qname('rdf', 'RDF'))
+    return root
+
+
+def _descriptions(root):
+    rdf = root.find(_qname('rdf', 'RDF'))
+    if rdf is None:
+        rdf = ET.SubElement(root, _qname('rdf', 'RDF'))
+    descriptions = rdf.findall(_qname('rdf', 'Description'))
+    if not descriptions:
+        description = ET.SubElement(rdf, _qname('rdf', 'Description'))
+        description.set(_qname('rdf', 'about'), '')
+        descriptions = [description]
+    return descriptions
+
+
+def _get(descriptions, prefix, name):
+    key = _qname(prefix, name)
+    for description in descriptions:
+        if key in description.attrib:
+            return description.get(key)
+        element = description.find(key)
+        if element is not None and element.text:
+            return element.text
+    return None
+
+
+def update(file_path, properties):
+    """Set XMP properties in a file's sidecar, creating it if needed.
+
+    Args:
+        file_path: The original (not the sidecar)
+        properties: {(prefix, name): text value}
+
+    Returns:
+        Path of the sidecar written
+    """
+    path = sidecar_path(file_path)
+    root = _load(path)
+    descriptions = _descriptions(root)
+
+    for (prefix, name), value in properties.items():
+        key = _qname(prefix, name)
+        # A property may be an attribute or an element, in any Description
+        for description in descriptions:
+            description.attrib.pop(key, None)
+            for element in description.findall(key):
+                description.remove(element)
+        descriptions[0].set(key, value)
+
+    data = _PACKET_START + ET.tostring(root, encoding='unicode') + _PACKET_END
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix='.', suffix='.xmp.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(data)
+        atomic.copy_mode(path, temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    return path
+
+
+def read_values(path):
+    """Read a sidecar's date and GPS values in ``exif_ops.read_tags`` form.
+
+    Dates come back as 'YYYY:MM:DD HH:MM:SS' and coordinates as unsigned
+    degrees with a ``...Ref`` tag, like ExifTool's ``-n`` output.
+
+    Returns:
+        {tag: value}; empty if the sidecar can't be read
+    """
+    try:
+        descriptions = _descriptions(_load(Path(path)))
+    except Exception:
+        return {}
+
+    values = {}
+    for field, (prefix, name) in DATETIME_PROPERTIES.items():
+        dt = parse_datetime(_get(descriptions, prefix, name) or '')
+        if dt is not None:
+            values[field] = dt.strftime("%Y:%m:%d %H:%M:%S")
+
+    refs = {'GPSLatitude': ('N', 'S'), 'GPSLongitude': ('E', 'W')}
+    for field, (prefix, name) in GPS_PROPERTIES.items():
+        text = _get(descriptions, prefix, name)
+        if not text:
+            continue
+        try:
+            value = parse_gps(text)
+        except ValueError:
+            continue
+        values[field] = abs(value)
+        values[field + 'Ref'] = refs[field][0] if value >= 0 else refs[field][1]
+    return values
+
+
+def write_datetime(file_path, dt, fields):
+    """Write a date/time to the XMP equivalents of the given fields.
+
+    Returns:
+        Path of the sidecar, or None if none of the fields are XMP fields
+    """
+    properties = {DATETIME_PROPERTIES[f]: dt.strftime(XMP_DATETIME_FORMAT)
+                  for f in fields if f in DATETIME_PROPERTIES}
+    if not properties:
+        return None
+    return update(file_path, properties)
+
+
+def shift_datetime(file_path, seconds, fields, current):
+    """Shift the XMP equivalents of the given fields.
+
+    Args:
+        file_path: The original
+        seconds: Shift; negative moves dates earlier
+        fields: Field names
+        current: The fields' current values in ``exif_ops.read_tags`` form
+            (sidecar merged over the original); fields without a value are
+            left alone
+    """
+    properties = {}
+    for field in fields:
+        if field not in DATETIME_PROPERTIES or not current.get(field):
+            continue
+        try:
+            dt = datetime.strptime(str(current[field])[:19], "%Y:%m:%d %H:%M:%S")
+        except ValueError:
+            continue
+        properties[DATETIME_PROPERTIES[field]] = (dt + timedelta(seconds=seconds)).strftime(XMP_DATETIME_FORMAT)
+    if properties:
+        update(file_path, properties)
+
+
+def write_gps(file_path, lat, lon):
+    """Write GPS coordinates to a file's sidecar."""
+    return update(file_path, {
+        GPS_PROPERTIES['GPSLatitude']: format_gps(lat, 'N', 'S'),
+        GPS_PROPERTIES['GPSLongitude']: format_gps(lon, 'E', 'W'),
+    })